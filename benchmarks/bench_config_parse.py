@@ -0,0 +1,65 @@
+"""
+Times df_final parsing with the vectorized `p` parser against the per-row path.
+
+    python benchmarks/bench_config_parse.py [--rows 100000] [--factors 500]
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from quanttrading import config_manager
+
+
+def synthetic_df_final(n_rows: int, n_factors: int, seed: int = 0) -> pd.DataFrame:
+    """df_final-like frame: 2-4 numeric params per row, a few non-numeric cells."""
+    rng = np.random.default_rng(seed)
+    factor = rng.integers(0, n_factors, n_rows)
+    n_params = rng.integers(2, 5, n_rows)
+    p = []
+    for k in n_params:
+        values = [int(rng.integers(1, 500)) for _ in range(k - 1)] + [round(float(rng.uniform(-3, 3)), 2)]
+        p.append(str(values))
+    # the fallback path: quoted numbers and a malformed cell
+    for i in rng.choice(n_rows, size=max(n_rows // 1000, 1), replace=False):
+        p[i] = "['12', 3.5]" if i % 2 else '[1, 2'
+    return pd.DataFrame({
+        'factor_id': [f'bttp_s{f}' for f in factor],
+        'sym': [f's{f}' for f in factor],
+        'res': '1h',
+        'dir': np.where(factor % 2 == 0, 'M', 'R'),
+        'strategy': 'ma_diff',
+        'm': 'zscore',
+        'p': p,
+        'weight': (factor % 7 + 1).astype(float),
+    })
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=100_000)
+    parser.add_argument('--factors', type=int, default=500)
+    args = parser.parse_args()
+
+    df = synthetic_df_final(args.rows, args.factors)
+    timings = {}
+    results = {}
+    for vectorized in (False, True):
+        start = time.perf_counter()
+        results[vectorized] = config_manager.create_config_from_df(df, vectorized=vectorized)
+        timings[vectorized] = time.perf_counter() - start
+
+    if results[True] != results[False]:
+        raise SystemExit('vectorized and per-row configs differ')
+    print(f'{args.rows} rows, {len(results[True])} configs')
+    print(f'per-row:    {timings[False]:.3f}s')
+    print(f'vectorized: {timings[True]:.3f}s ({timings[False] / timings[True]:.1f}x)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+"""
+Times the rolling percentile-rank kernel against pandas' rolling rank.
+
+    python benchmarks/bench_rolling_rank.py [--bars 10000] [--windows 24 96 192 720]
+
+Each window is timed on its own and as one batch, on a factor-like series
+(a rolling mean of a random walk) and on a rounded copy with many ties.
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from quanttrading.signal_engine import rolling_rank, rolling_rank_pct
+
+
+def best_of(fn, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--bars', type=int, default=10_000)
+    parser.add_argument('--windows', type=int, nargs='+', default=[24, 96, 192, 720])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    walk = pd.Series(np.cumsum(rng.normal(size=args.bars))).rolling(6).mean()
+    series = {'distinct': walk, 'ties': walk.round(1)}
+
+    for name, x in series.items():
+        values = x.to_numpy()
+        print(f'{name}: {args.bars} bars')
+        pandas_total = 0.0
+        for w in args.windows:
+            expected = x.rolling(w).rank(pct=True).to_numpy()
+            if not np.array_equal(rolling_rank(values, w), expected, equal_nan=True):
+                raise SystemExit(f'kernel differs from pandas at window {w}')
+            t_pandas = best_of(lambda: x.rolling(w).rank(pct=True), args.repeat)
+            t_kernel = best_of(lambda: rolling_rank(values, w), args.repeat)
+            pandas_total += t_pandas
+            print(f'  w={w:<5} pandas {t_pandas * 1e3:7.2f}ms  kernel {t_kernel * 1e3:7.2f}ms ({t_pandas / t_kernel:.1f}x)')
+
+        batch = rolling_rank_pct(values, args.windows)
+        for w in args.windows:
+            if not np.array_equal(batch[w], x.rolling(w).rank(pct=True).to_numpy(), equal_nan=True):
+                raise SystemExit(f'batched kernel differs from pandas at window {w}')
+        t_batch = best_of(lambda: rolling_rank_pct(values, args.windows), args.repeat)
+        print(f'  batch    pandas {pandas_total * 1e3:7.2f}ms  kernel {t_batch * 1e3:7.2f}ms ({pandas_total / t_batch:.1f}x)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,313 @@
+"""
+Benchmark suite for the signal, config, sizing, logging and series-loading hot paths.
+
+    python benchmarks/run_benchmarks.py [--quick] [--repeat 3] [--only signals config] [--output out.json]
+    python benchmarks/run_benchmarks.py compare base.json new.json [--threshold 0.2] [--min-ms 1]
+
+Every input is synthetic and seeded: factor series of 1k-100k hourly bars
+ending at the last closed hour, and df_final frames of 10-10k parameter
+rows. Everything runs in a temporary directory, so user_data/ is left
+alone. Results (best and median of --repeat runs, plus the commit and
+library versions) go to benchmarks/results/<time>-<commit>.json by
+default; `compare` prints the ratio of every case found in both files
+and exits with 1 when one that takes at least --min-ms got slower than
+--threshold.
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from quanttrading import config_manager, position_engine, registry
+from quanttrading.binance_fetcher import BinanceFetcher
+from quanttrading.config_manager import StratConfig, StratParams
+from quanttrading.csv_log import CsvLogFile
+from quanttrading.factor_store import FactorSeries, FactorStore
+from quanttrading.monitor import Monitor
+from quanttrading.symbol_manager import SymbolInfo
+from bench_config_parse import synthetic_df_final
+
+
+BAR_SIZES = [1_000, 10_000, 100_000]
+CONFIG_ROWS = [10, 100, 1_000, 10_000]
+N_STRATEGIES = [50, 500, 5_000]
+LOG_ROWS = [1_000, 10_000, 100_000]
+QUICK = {'bars': [1_000, 10_000], 'rows': [10, 1_000], 'strategies': [50, 500], 'log_rows': [1_000, 10_000]}
+
+# (window1, window2, threshold) grids in the range df_final uses; few window1
+# values, like a real strategy, so RollingStats sharing is exercised
+WINDOWS1 = [24, 48, 96]
+WINDOWS2 = [168, 336, 720]
+THRESHOLDS = {'B': [1.0, 1.5], 'R': [0.7, 0.9]}
+
+
+def timeit(fn, repeat: int, setup=None) -> dict:
+    timings = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return {'min_s': min(timings), 'median_s': statistics.median(timings), 'repeat': repeat}
+
+
+def last_closed_hour() -> int:
+    now = int(time.time())
+    return now - now % 3600 - 3600
+
+
+def synthetic_series(n_bars: int, seed: int = 0) -> FactorSeries:
+    """Positive random walk of hourly bars ending at the last closed hour (so loads never refresh)."""
+    rng = np.random.default_rng(seed)
+    t = last_closed_hour() - 3600 * np.arange(n_bars - 1, -1, -1, dtype=np.int64)
+    value = np.exp(np.cumsum(rng.normal(0, 0.01, n_bars)))
+    return FactorSeries(t, value)
+
+
+def strategy_classes() -> dict[str, type]:
+    """One (first registered) factor prefix per strategy class."""
+    registry.load_user_strategies()
+    classes = {}
+    for prefix, cls in registry.STRATEGY_REGISTRY.items():
+        classes.setdefault(cls.__name__, (prefix, cls))
+    return classes
+
+
+def bench_config(model: str, prefix: str, cls: type) -> StratConfig:
+    params = [
+        StratParams(strategy_id='bench', model=model, param=cls.pack_params(w1, w2, th))
+        for w1 in WINDOWS1 for w2 in WINDOWS2 for th in THRESHOLDS[model]
+    ]
+    return StratConfig(
+        id=1, name=f'{prefix}_bench{model}', type='reversal', symbol='BENCH', timeframe='1h', side='long',
+        final_weight=1.0, params=params, order_type='limit', mdd_limit=0.3,
+    )
+
+
+def bench_signals(args, results: list) -> None:
+    """BaseStrat.calculate_agg_signal_df per strategy class and model, signal history up to date."""
+    fetcher = BinanceFetcher(folder='bench_data', store=FactorStore())
+    for class_name, (prefix, cls) in strategy_classes().items():
+        for model in ('B', 'R'):
+            strat = cls(bench_config(model, prefix, cls), fetcher)
+            strat.csv_folder = 'bench_data'
+            strat._send_signal_update = lambda *a: None
+            for n_bars in args.bars:
+                df = synthetic_series(n_bars).to_frame()
+                strat.calculate_agg_signal_df(df)
+                timing = timeit(lambda: strat.calculate_agg_signal_df(df), args.repeat)
+                results.append({'name': 'calculate_agg_signal_df', 'case': {'class': class_name, 'model': model, 'bars': n_bars, 'param_sets': len(strat.param_sets)}, **timing})
+
+
+def bench_config_parse(args, results: list) -> None:
+    """config_manager.create_config_from_df on synthetic df_final frames."""
+    for n_rows in args.rows:
+        df = synthetic_df_final(n_rows, max(n_rows // 20, 1))
+        timing = timeit(lambda: config_manager.create_config_from_df(df), args.repeat)
+        results.append({'name': 'create_config_from_df', 'case': {'rows': n_rows}, **timing})
+
+
+def bench_positions(args, results: list) -> None:
+    """The position_engine sizing functions for many strategies over 50 symbols."""
+    rng = np.random.default_rng(1)
+    symbols = [f'S{i}' for i in range(50)]
+    symbols_info = {
+        s: SymbolInfo(coin=s, coin_full_name=s, unit='USD', unit_full_name='US Dollar', can_trade=True,
+                      price_precision=4, amount_precision=3, mini_order=1, anchor_price=float(rng.uniform(1, 1000)))
+        for s in symbols
+    }
+    for n in args.strategies:
+        strats = [
+            SimpleNamespace(strat_key=(i, f'bench_{i}', symbols[i % len(symbols)], '1h'), symbol=symbols[i % len(symbols)], final_weight=1.0 / n)
+            for i in range(n)
+        ]
+        signals = {s.strat_key: float(rng.uniform()) for s in strats}
+        by_strat = position_engine.calculate_target_amount_by_strat(strats, signals, 100_000, symbols_info)
+        by_symbol = position_engine.aggregate_target_amount_by_symbol(by_strat)
+        positions = {s: float(rng.uniform(0, 10)) for s in symbols}
+        cases = {
+            'calculate_target_amount_by_strat': lambda: position_engine.calculate_target_amount_by_strat(strats, signals, 100_000, symbols_info),
+            'aggregate_target_amount_by_symbol': lambda: position_engine.aggregate_target_amount_by_symbol(by_strat),
+            'calculate_leverage_ref': lambda: position_engine.calculate_leverage_ref(by_symbol, symbols_info, 100_000),
+            'deleverage': lambda: position_engine.deleverage(by_symbol, 1.5, 0.99, symbols_info),
+            'calculate_delta_amount': lambda: position_engine.calculate_delta_amount(by_symbol, positions),
+        }
+        for name, fn in cases.items():
+            results.append({'name': name, 'case': {'strategies': n}, **timeit(fn, args.repeat)})
+
+    for n_bars in args.bars:
+        signals = rng.uniform(size=n_bars)
+        timing = timeit(lambda: position_engine.calculate_target_amounts(signals, 100_000, 0.01, 123.4, 3), args.repeat)
+        results.append({'name': 'calculate_target_amounts', 'case': {'bars': n_bars}, **timing})
+
+
+def bench_monitor(args, results: list) -> None:
+    """Monitor._log_to_csv appending one row to logs that already hold many rows."""
+    columns = [f'{i:03d}_bench_S{i}_1h' for i in range(30)]
+    for n_rows in args.log_rows:
+        folder = f'bench_monitor_{n_rows}'
+        os.makedirs(folder, exist_ok=True)
+        path = f'{folder}/signals.csv'
+        rng = np.random.default_rng(2)
+        index = pd.date_range('2020-01-01', periods=n_rows, freq='5min').strftime('%Y-%m-%d %H:%M:%S')
+        CsvLogFile(path).append(pd.DataFrame(rng.uniform(size=(n_rows, len(columns))), index=index, columns=columns))
+        counter = iter(range(10 ** 9))
+
+        def row() -> pd.DataFrame:
+            return pd.DataFrame([rng.uniform(size=len(columns))], index=[f'2030-01-01 00:{next(counter):06d}'], columns=columns)
+
+        def cold() -> None:
+            monitor = Monitor()
+            monitor.csv_folder = folder
+            monitor._log_to_csv(row(), path)
+
+        monitor = Monitor()
+        monitor.csv_folder = folder
+        results.append({'name': 'monitor_log_to_csv', 'case': {'rows': n_rows, 'state': 'cold'}, **timeit(cold, args.repeat)})
+        results.append({'name': 'monitor_log_to_csv', 'case': {'rows': n_rows, 'state': 'warm'}, **timeit(lambda: monitor._log_to_csv(row(), path), args.repeat)})
+
+
+def bench_load_series(args, results: list) -> None:
+    """BinanceFetcher._load_series on cached files: first load (CSV migration), cold .bin and factor-store hit."""
+    for n_bars in args.bars:
+        fetcher = BinanceFetcher(folder=f'bench_series_{n_bars}', store=FactorStore())
+        csv_path = fetcher._get_series_path('ttp', 'BENCH', '1h')
+        df = synthetic_series(n_bars).to_frame()
+
+        def write_csv() -> None:
+            for path in (csv_path, f'{os.path.splitext(csv_path)[0]}.bin'):
+                if os.path.exists(path):
+                    os.remove(path)
+            df.to_csv(csv_path)
+            fetcher.factor_store = FactorStore()
+
+        def load() -> pd.DataFrame:
+            return fetcher._load_series('BENCH', '1h', 'ttp', fetcher.series_fetchers['ttp'], None)
+
+        def new_store() -> None:
+            fetcher.factor_store = FactorStore()
+
+        results.append({'name': 'load_series', 'case': {'bars': n_bars, 'source': 'csv'}, **timeit(load, args.repeat, setup=write_csv)})
+        results.append({'name': 'load_series', 'case': {'bars': n_bars, 'source': 'bin'}, **timeit(load, args.repeat, setup=new_store)})
+        results.append({'name': 'load_series', 'case': {'bars': n_bars, 'source': 'store'}, **timeit(load, args.repeat)})
+
+
+SUITES = {
+    'signals': bench_signals,
+    'config': bench_config_parse,
+    'positions': bench_positions,
+    'monitor': bench_monitor,
+    'series': bench_load_series,
+}
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def case_id(result: dict) -> str:
+    return result['name'] + ' ' + ' '.join(f'{k}={v}' for k, v in sorted(result['case'].items()))
+
+
+def run(args) -> None:
+    if args.quick:
+        args.bars, args.rows, args.strategies, args.log_rows = QUICK['bars'], QUICK['rows'], QUICK['strategies'], QUICK['log_rows']
+    commit = git_commit()
+    output = args.output or os.path.join(
+        ROOT, 'benchmarks', 'results', f'{datetime.now(timezone.utc):%Y%m%d-%H%M%S}-{commit}.json')
+    output = os.path.abspath(output)
+
+    results: list[dict] = []
+    workdir = tempfile.mkdtemp(prefix='qt_bench_')
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        for name in args.only or SUITES:
+            start = time.perf_counter()
+            n_before = len(results)
+            SUITES[name](args, results)
+            print(f'{name}: {len(results) - n_before} cases in {time.perf_counter() - start:.1f}s')
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    for result in results:
+        print(f'{case_id(result):<80} {result["min_s"] * 1e3:10.3f}ms (median {result["median_s"] * 1e3:.3f}ms)')
+
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump({
+            'commit': commit,
+            'time': datetime.now(timezone.utc).isoformat(),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'pandas': pd.__version__,
+            'machine': platform.machine(),
+            'cpus': os.cpu_count(),
+            'results': results,
+        }, f, indent=1)
+    print(f'Results written to {output}')
+
+
+def compare(args) -> None:
+    with open(args.base) as f:
+        base = {case_id(r): r for r in json.load(f)['results']}
+    with open(args.new) as f:
+        new = {case_id(r): r for r in json.load(f)['results']}
+
+    regressions = []
+    for key in [k for k in new if k in base]:
+        ratio = new[key]['min_s'] / base[key]['min_s'] if base[key]['min_s'] > 0 else float('inf')
+        flag = ''
+        # sub-millisecond cases are mostly timer noise
+        if ratio > 1 + args.threshold and new[key]['min_s'] * 1e3 >= args.min_ms:
+            flag = '  REGRESSION'
+            regressions.append(key)
+        print(f'{key:<80} {base[key]["min_s"] * 1e3:10.3f}ms -> {new[key]["min_s"] * 1e3:10.3f}ms ({ratio:5.2f}x){flag}')
+    print(f'{len(regressions)} regressions above {args.threshold:.0%}')
+    sys.exit(1 if regressions else 0)
+
+
+def main() -> None:
+    if len(sys.argv) > 1 and sys.argv[1] == 'compare':
+        parser = argparse.ArgumentParser(prog='run_benchmarks.py compare')
+        parser.add_argument('base')
+        parser.add_argument('new')
+        parser.add_argument('--threshold', type=float, default=0.2, help='relative slowdown flagged as a regression')
+        parser.add_argument('--min-ms', type=float, default=1.0, help='cases faster than this are never flagged')
+        compare(parser.parse_args(sys.argv[2:]))
+        return
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--only', nargs='+', choices=list(SUITES))
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--quick', action='store_true', help='smaller sizes, for a fast check')
+    parser.add_argument('--bars', type=int, nargs='+', default=BAR_SIZES)
+    parser.add_argument('--rows', type=int, nargs='+', default=CONFIG_ROWS)
+    parser.add_argument('--strategies', type=int, nargs='+', default=N_STRATEGIES)
+    parser.add_argument('--log-rows', type=int, nargs='+', default=LOG_ROWS)
+    parser.add_argument('--output')
+    run(parser.parse_args())
+
+
+if __name__ == '__main__':
+    main()
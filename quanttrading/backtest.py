@@ -0,0 +1,353 @@
+import argparse
+import os
+import time
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from quanttrading import config_manager, position_engine, registry
+from quanttrading.binance_fetcher import BinanceFetcher
+from quanttrading.helper import resolution_to_seconds
+from quanttrading.signal_engine import RollingStats, SignalSpec, compute_signal_matrix
+from quanttrading.strategies import BaseStrat
+from quanttrading.symbol_manager import ANCHOR_START, SymbolInfo
+from quanttrading.log import init_logger
+
+
+logger = init_logger('backtest')
+
+# taker commission of a Roostoo order (CommissionPercent)
+FEE_RATE = 0.001
+# parameter sets evaluated together; peak memory is about 4 * bars * CHUNK_SIZE * 8 bytes
+CHUNK_SIZE = 512
+# close prices are stored like the factor series: close_{SYMBOL}_{timeframe}.csv with {t, ts, value}
+CLOSE_PREFIX = 'close'
+
+
+def load_close_prices(binance_fetcher: BinanceFetcher, symbol: str, timeframe: str = '1h') -> pd.Series:
+    """Local close prices indexed by bar timestamp `t`."""
+    df = binance_fetcher.load_cached_series(CLOSE_PREFIX, symbol, timeframe)
+    return pd.Series(df['value'].to_numpy(), index=df['t'].to_numpy())
+
+
+def populate_close_prices(binance_fetcher: BinanceFetcher, strats: list[BaseStrat]) -> dict[tuple[str, str], int]:
+    """Fills the close series of every strategy's symbol and timeframe from Binance.
+
+    A missing series is fetched from the first bar of the strategies' factor
+    histories, an existing one from its last bar. Returns the number of new
+    bars per (symbol, timeframe).
+    """
+    since: dict[tuple[str, str], int] = {}
+    for strat in strats:
+        key = (strat.symbol, strat.timeframe)
+        try:
+            since[key] = int(load_close_prices(binance_fetcher, *key).index[-1])
+            continue
+        except FileNotFoundError:
+            pass
+        first_t = int(binance_fetcher.load_cached_series(*strat.get_factor_key())['t'].iloc[0])
+        since[key] = min(since.get(key, first_t), first_t)
+
+    changed = {}
+    for (symbol, timeframe), t in since.items():
+        changed[(symbol, timeframe)] = binance_fetcher.populate_series(CLOSE_PREFIX, symbol, timeframe, t * 1000)
+    logger.info(f'Close prices: {sum(1 for n in changed.values() if n)} of {len(changed)} series updated')
+    return changed
+
+
+def align_closes(t: np.ndarray, closes: pd.Series) -> np.ndarray:
+    """Last close at or before each timestamp of t; NaN before the first close."""
+    pos = np.searchsorted(closes.index.to_numpy(), t, side='right') - 1
+    aligned = np.full(len(t), np.nan)
+    found = pos >= 0
+    aligned[found] = closes.to_numpy()[pos[found]]
+    return aligned
+
+
+def _sharpe(returns: np.ndarray, periods_per_year: float) -> np.ndarray:
+    mean = returns.mean(axis=0)
+    std = returns.std(axis=0)
+    return np.divide(mean, std, out=np.zeros_like(mean), where=std > 0) * np.sqrt(periods_per_year)
+
+
+def param_set_metrics(signals: np.ndarray, close: np.ndarray, anchor_price: float, fee: float, periods_per_year: float) -> dict[str, np.ndarray]:
+    """Per-column metrics of a 0/1 signal matrix (rows = bars, columns = parameter sets).
+
+    Returns are in units of the capital allocated to the strategy: a signal
+    of 1 holds capital / anchor_price coins, as position_engine sizes it,
+    from the close of its bar to the next close. Every change of position
+    pays `fee` on the traded notional.
+    """
+    price = close / anchor_price
+    held = signals.astype(np.float64)
+
+    traded = np.abs(np.diff(held, axis=0, prepend=0.0))
+    traded *= price[:, None]
+    returns = np.zeros_like(held)
+    returns[1:] = held[:-1] * np.diff(price)[:, None]
+    returns -= fee * traded
+    turnover = traded.sum(axis=0)
+    del traded
+
+    exposure = held.mean(axis=0)
+    del held
+    sharpe = _sharpe(returns, periods_per_year)
+    # the weaker half: a parameter set has to work in both periods to score well
+    half = len(returns) // 2
+    sharpe_min_half = np.minimum(_sharpe(returns[:half], periods_per_year), _sharpe(returns[half:], periods_per_year))
+
+    equity = np.cumsum(returns, axis=0, out=returns)
+    equity += 1.0
+    peak = np.maximum.accumulate(equity, axis=0)
+    np.maximum(peak, 1.0, out=peak)
+    max_drawdown = np.max(1.0 - equity / peak, axis=0)
+
+    return {
+        'total_return': equity[-1] - 1.0,
+        'max_drawdown': max_drawdown,
+        'sharpe': sharpe,
+        'sharpe_min_half': sharpe_min_half,
+        'turnover': turnover,
+        'n_trades': np.count_nonzero(np.diff(signals, axis=0, prepend=0), axis=0),
+        'exposure': exposure,
+    }
+
+
+@dataclass
+class StrategyBacktest:
+    strat_key: tuple
+    final_weight: float
+    mdd_limit: float
+    params: pd.DataFrame  # one row per parameter set, returns on the allocated capital
+    pnl: pd.Series        # USD pnl per bar of the averaged signal, sized like the live loop
+
+    def summary(self, balance: float) -> dict:
+        capital = balance * self.final_weight
+        equity = capital + self.pnl.cumsum()
+        if capital > 0:
+            max_drawdown = float((1 - equity / np.maximum(equity.cummax(), capital)).max())
+        else:
+            max_drawdown = np.nan
+        return {
+            'id': self.strat_key[0],
+            'factor_id': self.strat_key[1],
+            'symbol': self.strat_key[2],
+            'final_weight': self.final_weight,
+            'n_params': len(self.params),
+            'pnl': float(self.pnl.sum()),
+            'return': float(self.pnl.sum() / capital) if capital > 0 else np.nan,
+            'max_drawdown': max_drawdown,
+            'mdd_limit': self.mdd_limit,
+            'mdd_breach': bool(max_drawdown > self.mdd_limit),
+            'param_mdd_breaches': int(self.params['mdd_breach'].sum()),
+        }
+
+
+@dataclass
+class BacktestResult:
+    balance: float
+    strategies: list[StrategyBacktest]
+
+    def params(self) -> pd.DataFrame:
+        return pd.concat([s.params for s in self.strategies], ignore_index=True)
+
+    def pnl(self) -> pd.DataFrame:
+        """USD pnl per bar, one column per strategy, on the union of their bars."""
+        pnl = pd.DataFrame({f'{s.strat_key[0]:03d}-{s.strat_key[1]}': s.pnl for s in self.strategies})
+        return pnl.sort_index().fillna(0.0)
+
+    def equity(self) -> pd.Series:
+        return self.balance + self.pnl().sum(axis=1).cumsum()
+
+    def summary(self) -> pd.DataFrame:
+        return pd.DataFrame([s.summary(self.balance) for s in self.strategies])
+
+    def max_drawdown(self) -> float:
+        equity = self.equity()
+        return float((1 - equity / np.maximum(equity.cummax(), self.balance)).max())
+
+
+def _anchor(close: np.ndarray, t: np.ndarray, symbol_info: SymbolInfo | None) -> tuple[float, int | None]:
+    """Anchor price and amount precision: the live ones if given, else the close at ANCHOR_START (or the first close)."""
+    if symbol_info is not None:
+        return symbol_info.anchor_price, symbol_info.amount_precision
+    pos = int(np.searchsorted(t, int(pd.Timestamp(ANCHOR_START).timestamp()), side='right')) - 1
+    return float(close[max(pos, 0)]), None
+
+
+def backtest_strategy(
+    strat: BaseStrat,
+    binance_fetcher: BinanceFetcher,
+    closes: pd.Series,
+    balance: float,
+    symbol_info: SymbolInfo | None = None,
+    fee: float = FEE_RATE,
+    chunk_size: int = CHUNK_SIZE,
+) -> StrategyBacktest | None:
+    """Backtests every parameter set of one strategy over its full local history."""
+    df = binance_fetcher.load_cached_series(*strat.get_factor_key())
+    t = df['t'].to_numpy()
+    return backtest_series(strat, t, df['value'].to_numpy(dtype=float), align_closes(t, closes), balance, symbol_info, fee, chunk_size)
+
+
+def _chunks(specs: list[SignalSpec], chunk_size: int) -> list[list[int]]:
+    """Column indices sorted by (model, window1, window2), cut only between window pairs.
+
+    Each pair's z-score/rank is then needed by a single chunk, so it is
+    computed once even though the pair caches are freed between chunks.
+    """
+    def pair(j: int) -> tuple[str, int, int]:
+        return specs[j].model, specs[j].window1, specs[j].window2
+
+    order = sorted(range(len(specs)), key=pair)
+    chunks: list[list[int]] = []
+    current: list[int] = []
+    for k, j in enumerate(order):
+        current.append(j)
+        last_of_pair = k + 1 == len(order) or pair(order[k + 1]) != pair(j)
+        if last_of_pair and len(current) >= chunk_size:
+            chunks.append(current)
+            current = []
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def backtest_series(
+    strat: BaseStrat,
+    t: np.ndarray,
+    values: np.ndarray,
+    close: np.ndarray,
+    balance: float,
+    symbol_info: SymbolInfo | None = None,
+    fee: float = FEE_RATE,
+    chunk_size: int = CHUNK_SIZE,
+) -> StrategyBacktest | None:
+    """Backtests every parameter set of a strategy on given factor values and aligned closes (NaN = no close).
+
+    Signals come from the strategy's own transform_alpha/conditions through
+    compute_signal_matrix, i.e. the same matrix as calculate_signal_matrix.
+    Parameter sets are evaluated about chunk_size at a time, sorted by windows
+    so that the per-window rolling statistics are computed once per series;
+    the per-pair caches are freed after each chunk to keep memory bounded.
+    """
+    x = strat.transform_alpha(values)
+    valid = ~np.isnan(close)
+    if not valid.any():
+        logger.warning(f'{strat.strat_name}: no close prices over the factor history, skipped')
+        return None
+    close, t_valid = close[valid], t[valid]
+    anchor_price, amount_precision = _anchor(close, t_valid, symbol_info)
+    periods_per_year = 365 * 86400 / resolution_to_seconds(strat.timeframe)
+
+    # one column per signal column name, like _build_signals_df
+    unique: dict[str, int] = {}
+    for j, p in enumerate(strat.param_sets):
+        unique.setdefault(strat.get_signal_col_name(p), j)
+    all_specs = strat.get_signal_specs()
+    params = [strat.param_sets[j] for j in unique.values()]
+    specs = [all_specs[j] for j in unique.values()]
+
+    metrics: dict[str, np.ndarray] = {}
+    signal_sum = np.zeros(len(close))
+    stats = RollingStats(x)
+    for cols in _chunks(specs, chunk_size):
+        matrix = compute_signal_matrix(x, [specs[j] for j in cols], strat.b_condition, strat.r_condition, stats)[valid]
+        for name, column_values in param_set_metrics(matrix, close, anchor_price, fee, periods_per_year).items():
+            metrics.setdefault(name, np.zeros(len(specs), dtype=column_values.dtype))[cols] = column_values
+        signal_sum += matrix.sum(axis=1)
+        stats.drop_pairs()
+
+    params_df = pd.DataFrame({
+        'id': strat.id,
+        'factor_id': strat.name,
+        'symbol': strat.symbol,
+        'm': [p.model for p in params],
+        'p': [str(p.param) for p in params],
+        **metrics,
+    })
+    params_df['mdd_breach'] = params_df['max_drawdown'] > strat.config.mdd_limit
+
+    # the live signal is the mean over parameter sets, sized by position_engine
+    amount = position_engine.calculate_target_amounts(signal_sum / len(specs), balance, strat.final_weight, anchor_price, amount_precision)
+    pnl = np.zeros(len(close))
+    pnl[1:] = amount[:-1] * np.diff(close)
+    pnl -= fee * np.abs(np.diff(amount, prepend=0.0)) * close
+
+    return StrategyBacktest(
+        strat_key=strat.strat_key,
+        final_weight=strat.final_weight,
+        mdd_limit=strat.config.mdd_limit,
+        params=params_df,
+        pnl=pd.Series(pnl, index=pd.to_datetime(t_valid, unit='s'), name=strat.strat_name),
+    )
+
+
+def run_backtest(
+    strats: list[BaseStrat],
+    binance_fetcher: BinanceFetcher,
+    balance: float,
+    symbols_info: dict[str, SymbolInfo] | None = None,
+    fee: float = FEE_RATE,
+    chunk_size: int = CHUNK_SIZE,
+) -> BacktestResult:
+    """Backtests all strategies; ones without local close prices are skipped with a warning.
+
+    Without symbols_info the anchor price is the close at ANCHOR_START and
+    amounts are not rounded. The live deleveraging step is not applied.
+    """
+    start = time.perf_counter()
+    results = []
+    n_evaluations = 0
+    for strat in strats:
+        try:
+            closes = load_close_prices(binance_fetcher, strat.symbol, strat.timeframe)
+        except FileNotFoundError as e:
+            logger.warning(f'{strat.strat_name}: {e} (fill it with --fetch-closes), skipped')
+            continue
+        symbol_info = symbols_info.get(strat.symbol) if symbols_info else None
+        result = backtest_strategy(strat, binance_fetcher, closes, balance, symbol_info, fee, chunk_size)
+        if result is not None:
+            results.append(result)
+            n_evaluations += len(result.params) * len(result.pnl)
+    elapsed = time.perf_counter() - start
+    logger.info(f'Backtested {len(results)} strategies, {n_evaluations / 1e6:.1f}M parameter-bars in {elapsed:.2f}s')
+    return BacktestResult(balance=balance, strategies=results)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Backtest every factor and parameter set of a df_final-style file.')
+    parser.add_argument('--config', default='user_data/data/df_final.csv')
+    parser.add_argument('--balance', type=float, default=100000)
+    parser.add_argument('--fee', type=float, default=FEE_RATE)
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+    parser.add_argument('--include-zero-weight', action='store_true', help='also evaluate the parameter sets of zero-weight factors')
+    parser.add_argument('--fetch-closes', action='store_true', help='fill the close_{SYMBOL}_1h series from Binance first')
+    parser.add_argument('--out', default='user_data/backtest')
+    args = parser.parse_args()
+
+    drop_zero_weight = not args.include_zero_weight
+    registry.load_user_strategies()
+    configs, report = config_manager.compile_configs(config_manager.create_config_from_df(pd.read_csv(args.config)), drop_zero_weight=drop_zero_weight)
+    binance_fetcher = BinanceFetcher()
+    strats = registry.build_strategies(configs, binance_fetcher, drop_zero_weight=drop_zero_weight)
+    if args.fetch_closes:
+        populate_close_prices(binance_fetcher, strats)
+
+    result = run_backtest(strats, binance_fetcher, args.balance, fee=args.fee, chunk_size=args.chunk_size)
+    if not result.strategies:
+        logger.error('Nothing to backtest: no strategy has local close prices; run with --fetch-closes to fill them from Binance')
+        return
+
+    os.makedirs(args.out, exist_ok=True)
+    result.params().to_csv(f'{args.out}/params.csv', index=False)
+    result.summary().to_csv(f'{args.out}/summary.csv', index=False)
+    equity = result.pnl().cumsum()
+    equity.insert(0, 'portfolio', result.equity())
+    equity.to_csv(f'{args.out}/equity.csv')
+    logger.info(f'Portfolio: pnl {result.equity().iloc[-1] - args.balance:.2f}, max drawdown {result.max_drawdown():.2%}; results in {args.out}/')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,81 +1,257 @@
 import pandas as pd
 import os
+import json
 from dotenv import load_dotenv
 import requests
+from requests.adapters import HTTPAdapter
+from concurrent.futures import ThreadPoolExecutor
 from quanttrading.log import init_logger
 from quanttrading import tg
-from quanttrading.helper import is_last_bar_closed, is_data_latest
+from quanttrading import metrics
+from quanttrading.helper import current_time, is_last_bar_closed, is_timestamp_latest
+from quanttrading.factor_store import FactorSeries, FactorStore, factor_store
+from quanttrading.series_storage import RecordFile, binary_path, migrate_csv, to_records
 import time
 
+try:
+    import ccxt
+except ImportError:
+    ccxt = None
+
 load_dotenv()
 logger = init_logger('binance')
 
+# close_{SYMBOL}_{timeframe} series are Binance spot candles of {SYMBOL}/{CLOSE_QUOTE}
+CLOSE_QUOTE = 'USDT'
+# candles per Binance klines request
+OHLCV_LIMIT = 1000
+
 
 class BinanceFetcher:
-    def __init__(self, folder: str = 'user_data') -> None:
+    def __init__(self, folder: str = 'user_data', store: FactorStore | None = None, max_workers: int = 8) -> None:
         self.user_data_folder = folder
+        self.factor_store = store if store is not None else factor_store
         self.csv_folder = f'{folder}/data'
         os.makedirs(self.csv_folder, exist_ok=True)
         self.remote_base_url = os.getenv('DO_FETCHER_BASE_URL', '').rstrip('/')
         self.remote_api_key = os.getenv('DO_FETCHER_API_KEY', '')
 
-    def _load_series(
-        self,
-        symbol: str,
-        timeframe: str,
-        filename_prefix: str,
-        fetcher_fn,
-        update_msg_title: str,
-    ) -> pd.DataFrame:
-        symbol_short = symbol.split('/')[0]
-        filepath = f'{self.csv_folder}/{filename_prefix}_{symbol_short}_{timeframe}.csv'
-        df_csv: pd.DataFrame | None = None
-        if os.path.exists(filepath):
-            df_csv = pd.read_csv(filepath)
-            df_csv.set_index('ts', inplace=True)
-            df_csv.index = pd.to_datetime(df_csv.index)
-            df_csv.sort_index(ascending=True, inplace=True)
-            df_since = df_csv.index.min()
-            df_until = df_csv.index.max()
-            logger.info(f'{len(df_csv)} rows of data from {df_since.strftime("%Y-%m-%d %H:%M:%S")} to {df_until.strftime("%Y-%m-%d %H:%M:%S")} loaded from {filepath}')
-            if is_data_latest(df_csv, timeframe):
-                logger.info('Data is latest, returning cached data')
-                return df_csv
+        # One keep-alive connection pool shared by all remote fetcher calls,
+        # sized to the concurrency limit of refresh_series
+        self.max_workers = max_workers
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_workers)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        metrics.instrument_session(self.session, 'fetcher')
+
+        self.series_fetchers = {
+            'oi': self._fetch_oi_data,
+            'g_ls': self._fetch_g_ls_data,
+            't_ls': self._fetch_t_ls_data,
+            'ttp': self._fetch_ttp_data,
+            'tsl': self._fetch_tsl_data,
+            'tbl': self._fetch_tbl_data,
+            'close': self._fetch_close_data,
+        }
+        self._exchange = None
+
+    def _read_series(self, filepath: str) -> FactorSeries:
+        """Loads a series from its .bin record file, migrating the CSV on first use."""
+        bin_path = binary_path(filepath)
+        if not os.path.exists(bin_path):
+            if not os.path.exists(filepath):
+                raise FileNotFoundError(f'File {filepath} not found')
+            migrate_csv(filepath)
+        records = RecordFile(bin_path).read()
+        return FactorSeries(records['t'], records['value'])
+
+    def _save_series(self, filepath: str, series: FactorSeries, n_changed: int, rewrite: bool) -> None:
+        record_file = RecordFile(binary_path(filepath))
+        if rewrite:
+            record_file.write(to_records(series.t, series.value))
+            logger.info(f'Rewrote {len(series)} rows of data to {record_file.path}')
         else:
-            raise FileNotFoundError(f'File {filepath} not found')
+            record_file.append(to_records(series.t[-n_changed:], series.value[-n_changed:]))
+            logger.info(f'Appended {n_changed} rows of data to {record_file.path}')
+
+    def _get_series_path(self, filename_prefix: str, symbol_short: str, timeframe: str) -> str:
+        return f'{self.csv_folder}/{filename_prefix}_{symbol_short}_{timeframe}.csv'
 
-        since_dt = pd.to_datetime('now') - pd.Timedelta(days=30)
-        since = int(since_dt.timestamp() * 1000 + 60)
-        logger.info(f'Fetching {filename_prefix} data for {symbol} {timeframe} since {since_dt.strftime("%Y-%m-%d %H:%M:%S")}')
+    def _get_cached_series(self, filename_prefix: str, symbol_short: str, timeframe: str) -> FactorSeries:
+        key = (filename_prefix, symbol_short, timeframe)
+        series = self.factor_store.get(key)
+        if series is None:
+            filepath = self._get_series_path(filename_prefix, symbol_short, timeframe)
+            series = self._read_series(filepath)
+            self.factor_store.put(key, series)
+            if len(series) == 0:
+                logger.info(f'Empty series loaded from {filepath}')
+            else:
+                df_since = series.index.min()
+                df_until = series.index.max()
+                logger.info(f'{len(series)} rows of data from {df_since.strftime("%Y-%m-%d %H:%M:%S")} to {df_until.strftime("%Y-%m-%d %H:%M:%S")} loaded from {filepath}')
+        return series
+
+    @staticmethod
+    def _is_series_latest(series: FactorSeries, timeframe: str, print_info: bool = True) -> bool:
+        """False for an empty series, which needs a full fetch rather than a refresh."""
+        return series.last_t is not None and is_timestamp_latest(series.last_t, timeframe, print_info)
+
+    def _fetch_recent_series(self, symbol: str, timeframe: str, filename_prefix: str, fetcher_fn, full: bool = False) -> pd.DataFrame:
+        """Fetches the last 30 days (all available history with full=True), without the unclosed bar."""
+        if full:
+            since = None
+            logger.info(f'Fetching all {filename_prefix} data for {symbol} {timeframe}')
+        else:
+            since_dt = pd.to_datetime(current_time(), unit='s') - pd.Timedelta(days=30)
+            since = int(since_dt.timestamp() * 1000 + 60)
+            logger.info(f'Fetching {filename_prefix} data for {symbol} {timeframe} since {since_dt.strftime("%Y-%m-%d %H:%M:%S")}')
         df = fetcher_fn(symbol, timeframe, since)
         if df.empty:
-            return df_csv if df_csv is not None else pd.DataFrame()
+            return df
         if not is_last_bar_closed(df, timeframe):
             logger.info('Last bar is not closed, removing last bar')
             df = df[:-1].copy()
+        if df.empty:
+            return df
         df_since = df.index.min()
         df_until = df.index.max()
         logger.info(f'{len(df)} rows of data from {df_since.strftime("%Y-%m-%d %H:%M:%S")} to {df_until.strftime("%Y-%m-%d %H:%M:%S")}')
+        return df
 
-        df_all = pd.concat([df_csv, df]) if df_csv is not None else df
-        df_all = df_all.sort_values(by='t', ascending=True)
-        df_all = df_all.drop_duplicates(subset=['t'], keep='last')
-
-        logger.info(f'Concatenated {len(df_all)} rows of data from {df_since.strftime("%Y-%m-%d %H:%M:%S")} to {df_until.strftime("%Y-%m-%d %H:%M:%S")}')
+    def _merge_series(
+        self,
+        series: FactorSeries,
+        df: pd.DataFrame,
+        symbol: str,
+        timeframe: str,
+        filename_prefix: str,
+        update_msg_title: str | None,
+    ) -> int:
+        """Merges fetched bars into the cached series and persists them; returns the number of changed bars."""
+        with self.factor_store.lock:
+            revision = series.revision
+            n_changed = series.extend(df['t'].to_numpy(), df['value'].to_numpy())
+            rewrite = series.revision != revision
 
-        last_timestamp = df_all.index.max()
-        last_value = df_all.iloc[-1]['value']
+        logger.info(f'Merged {n_changed} new rows, {len(series)} rows of data for {filename_prefix} {symbol} {timeframe}')
+        if n_changed == 0:
+            return 0
 
         if update_msg_title is not None:
             msg = f'{update_msg_title}\n'
             msg += f'{symbol} {timeframe}\n'
-            msg += f'Last timestamp: {last_timestamp} \n'
-            msg += f'Last value: {last_value}'
+            msg += f'Last timestamp: {series.index.max()} \n'
+            msg += f'Last value: {series.value[-1]}'
             tg.send_message(msg)
 
-        df_all.to_csv(filepath)
-        logger.info(f'Saved {len(df_all)} rows of data to {filepath}')
-        return df_all
+        symbol_short = symbol.split('/')[0]
+        filepath = self._get_series_path(filename_prefix, symbol_short, timeframe)
+        self._save_series(filepath, series, n_changed, rewrite=rewrite)
+        return n_changed
+
+    def _load_series(
+        self,
+        symbol: str,
+        timeframe: str,
+        filename_prefix: str,
+        fetcher_fn,
+        update_msg_title: str,
+    ) -> pd.DataFrame:
+        symbol_short = symbol.split('/')[0]
+        series = self._get_cached_series(filename_prefix, symbol_short, timeframe)
+        if self._is_series_latest(series, timeframe):
+            logger.info('Data is latest, returning cached data')
+            return series.to_frame()
+
+        df = self._fetch_recent_series(symbol, timeframe, filename_prefix, fetcher_fn, full=series.last_t is None)
+        if not df.empty:
+            self._merge_series(series, df, symbol, timeframe, filename_prefix, update_msg_title)
+        return series.to_frame()
+
+    def load_cached_series(self, filename_prefix: str, symbol: str, timeframe: str = '1h') -> pd.DataFrame:
+        """The series as stored locally, without the freshness check or a remote refresh (backtests)."""
+        return self._get_cached_series(filename_prefix, symbol.split('/')[0], timeframe).to_frame()
+
+    def populate_series(self, filename_prefix: str, symbol: str, timeframe: str, since: int) -> int:
+        """Fetches the closed bars since `since` (ms) into the local series, creating it if missing.
+
+        Unlike refresh_series this is not limited to the last 30 days, so it can
+        fill a series from scratch. Returns the number of new or changed bars.
+        """
+        symbol_short = symbol.split('/')[0]
+        key = (filename_prefix, symbol_short, timeframe)
+        filepath = self._get_series_path(filename_prefix, symbol_short, timeframe)
+        logger.info(f'Populating {filename_prefix} {symbol_short} {timeframe} since {pd.to_datetime(since, unit="ms")}')
+        df = self.series_fetchers[filename_prefix](symbol_short, timeframe, since)
+        if not df.empty and not is_last_bar_closed(df, timeframe):
+            df = df[:-1]
+        if df.empty:
+            return 0
+
+        if self.factor_store.get(key) is None and not os.path.exists(binary_path(filepath)) and not os.path.exists(filepath):
+            series = FactorSeries(df['t'].to_numpy(), df['value'].to_numpy())
+            RecordFile(binary_path(filepath)).write(to_records(series.t, series.value))
+            self.factor_store.put(key, series)
+            logger.info(f'Wrote {len(series)} rows of data to {binary_path(filepath)}')
+            return len(series)
+        series = self._get_cached_series(filename_prefix, symbol_short, timeframe)
+        return self._merge_series(series, df, symbol_short, timeframe, filename_prefix, update_msg_title=None)
+
+    def stale_series(self, keys: list[tuple[str, str, str]]) -> list[tuple[str, str, str]]:
+        """The (prefix, symbol, timeframe) keys whose cached series is empty or missing the latest closed bar."""
+        stale = []
+        for key in dict.fromkeys(keys):
+            filename_prefix, symbol_short, timeframe = key
+            series = self._get_cached_series(filename_prefix, symbol_short, timeframe)
+            if not self._is_series_latest(series, timeframe, print_info=False):
+                stale.append(key)
+        return stale
+
+    def series_versions(self, keys: list[tuple[str, str, str]]) -> dict[tuple[str, str, str], tuple[int, int | None, int]]:
+        """(length, last_t, revision) of every cached series; changes whenever a series gets new or revised bars."""
+        versions = {}
+        for key in dict.fromkeys(keys):
+            series = self._get_cached_series(*key)
+            versions[key] = (len(series), series.last_t, series.revision)
+        return versions
+
+    def refresh_series(self, keys: list[tuple[str, str, str]], max_workers: int | None = None) -> dict[tuple[str, str, str], int]:
+        """Refreshes every stale (prefix, symbol, timeframe) series concurrently.
+
+        Only the remote fetches run on the thread pool (bounded by max_workers and
+        sharing self.session); merges and disk writes happen afterwards on the
+        calling thread. Returns the number of changed bars per refreshed key.
+        """
+        stale = self.stale_series(keys)
+        if not stale:
+            logger.info(f'All {len(keys)} series are latest')
+            return {}
+
+        workers = min(max_workers or self.max_workers, len(stale))
+        logger.info(f'Refreshing {len(stale)} stale series with {workers} workers')
+        start = time.time()
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {
+                key: executor.submit(self._fetch_recent_series, key[1], key[2], key[0], self.series_fetchers[key[0]],
+                                     full=self._get_cached_series(*key).last_t is None)
+                for key in stale
+            }
+        changed = {}
+        for key, future in futures.items():
+            try:
+                df = future.result()
+            except Exception as e:
+                logger.error(f'Failed to refresh {key}: {e}')
+                continue
+            if df.empty:
+                changed[key] = 0
+                continue
+            series = self._get_cached_series(*key)
+            changed[key] = self._merge_series(series, df, key[1], key[2], key[0], update_msg_title=None)
+        logger.info(f'Refreshed {len(stale)} series in {time.time() - start:.2f}s, {sum(1 for n in changed.values() if n)} updated')
+        return changed
 
 
     def load_oi_data(self, symbol: str, timeframe: str = '1h') -> pd.DataFrame:
@@ -139,7 +315,7 @@ class BinanceFetcher:
         try:
             url = f'{self.remote_base_url}{endpoint}'
             headers = {'X-API-Key': self.remote_api_key}
-            response = requests.get(url, params=params, headers=headers, timeout=20)
+            response = self.session.get(url, params=params, headers=headers, timeout=20)
             response.raise_for_status()
             data = response.json()  # [{t, value}]
             if not data:
@@ -211,6 +387,37 @@ class BinanceFetcher:
             params['since_ms'] = since
         return self._fetch_series_remote(endpoint='/tbl', params=params, alert_prefix='tbl')
         
+    def _fetch_close_data(self, symbol: str, timeframe: str = '1h', since: int | None = None) -> pd.DataFrame:
+        """Bar closes of {symbol}/USDT on Binance spot through ccxt, paged forward from `since` (ms)."""
+        base = symbol.split('/')[0].strip()
+        if ccxt is None:
+            logger.error('Fetching close prices needs ccxt: pip install ccxt')
+            return pd.DataFrame()
+        try:
+            if self._exchange is None:
+                self._exchange = ccxt.binance({'enableRateLimit': True})
+            rows = []
+            while True:
+                candles = self._exchange.fetch_ohlcv(f'{base}/{CLOSE_QUOTE}', timeframe, since=since, limit=OHLCV_LIMIT)
+                rows.extend(candles)
+                if len(candles) < OHLCV_LIMIT:
+                    break
+                since = candles[-1][0] + 1
+            if not rows:
+                logger.error(f'No close prices for {base}/{CLOSE_QUOTE} {timeframe} on Binance')
+                return pd.DataFrame()
+            # [open time ms, open, high, low, close, volume]; t is the bar open time like the factor series
+            df = pd.DataFrame({'t': [row[0] // 1000 for row in rows], 'value': [float(row[4]) for row in rows]})
+            df = df.drop_duplicates('t', keep='last')
+            df['ts'] = pd.to_datetime(df['t'], unit='s')
+            df.set_index('ts', inplace=True)
+            df.sort_index(ascending=True, inplace=True)
+            return df
+        except Exception as e:
+            logger.error(f'Binance close fetch error for {base}: {e}')
+            tg.send_message(f'Binance close fetch error for {base}: {e}')
+            return pd.DataFrame()
+
     def fetch_anchor_close_price(self, symbol: str, start: str) -> float:
         since = int(pd.to_datetime(start).timestamp() * 1000)
         timeframe = '1h'
@@ -220,7 +427,7 @@ class BinanceFetcher:
             url = f'{self.remote_base_url}/ohlcv-close'
             headers = {'X-API-Key': self.remote_api_key}
             logger.info(f'Fetching anchor close via remote {url} params={params}')
-            response = requests.get(url, params=params, headers=headers, timeout=20)
+            response = self.session.get(url, params=params, headers=headers, timeout=20)
             response.raise_for_status()
             data = response.json()  # {'close': float}
             if 'close' not in data:
@@ -231,6 +438,47 @@ class BinanceFetcher:
             raise
         
 
+    def fetch_anchor_close_prices(self, symbols: list[str], start: str) -> dict[str, float]:
+        """
+        Anchor close prices for many symbols, cached on disk by (symbol, start).
+        The close of a past bar never changes, so only cache misses hit the
+        remote fetcher, and those are fetched concurrently.
+        """
+        cache_path = f'{self.user_data_folder}/anchor_prices.json'
+        cache: dict[str, float] = {}
+        if os.path.exists(cache_path):
+            try:
+                with open(cache_path) as f:
+                    cache = json.load(f)
+            except Exception as e:
+                logger.error(f'Failed to read anchor price cache {cache_path}: {e}')
+
+        def cache_key(symbol: str) -> str:
+            return f'{symbol}|{pd.to_datetime(start).strftime("%Y-%m-%d %H:%M:%S")}'
+
+        missing = [symbol for symbol in dict.fromkeys(symbols) if cache_key(symbol) not in cache]
+        if missing:
+            logger.info(f'Fetching {len(missing)} anchor close prices ({len(symbols) - len(missing)} cached)')
+            with ThreadPoolExecutor(max_workers=min(self.max_workers, len(missing))) as executor:
+                futures = {symbol: executor.submit(self.fetch_anchor_close_price, symbol, start) for symbol in missing}
+            errors = []
+            for symbol, future in futures.items():
+                try:
+                    cache[cache_key(symbol)] = future.result()
+                except Exception as e:
+                    errors.append(e)
+
+            tmp_path = f'{cache_path}.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump(cache, f, indent=2)
+            os.replace(tmp_path, cache_path)
+            if errors:
+                raise errors[0]
+        else:
+            logger.info(f'All {len(symbols)} anchor close prices loaded from {cache_path}')
+
+        return {symbol: cache[cache_key(symbol)] for symbol in symbols}
+
     def fetch_last_price(self, symbol: str) -> float:
         try:
             base = symbol.split('/')[0].strip()
@@ -238,7 +486,7 @@ class BinanceFetcher:
             url = f'{self.remote_base_url}/last-price'
             headers = {'X-API-Key': self.remote_api_key}
             logger.info(f'Fetching last price via remote {url} params={params}')
-            response = requests.get(url, params=params, headers=headers, timeout=15)
+            response = self.session.get(url, params=params, headers=headers, timeout=15)
             response.raise_for_status()
             data = response.json()  # {'last': float}
             if 'last' not in data:
@@ -248,51 +496,64 @@ class BinanceFetcher:
             logger.error(f'Error fetching last price via remote for {symbol}: {e}')
             raise
     
-    def fetch_all_last_prices(self, symbols_info: dict) -> dict[str, float]:
+    def _fetch_last_price_with_retry(self, symbol: str, max_retries: int = 2, backoff: float = 0.5) -> float:
+        for attempt in range(max_retries + 1):
+            try:
+                return self.fetch_last_price(symbol)
+            except Exception:
+                if attempt == max_retries:
+                    raise
+                time.sleep(backoff * 2 ** attempt)
+
+    @metrics.timed('fetch_all_last_prices')
+    def fetch_all_last_prices(self, symbols_info: dict, ticker_fn=None, max_retries: int = 2) -> dict[str, float]:
         """
         Fetch last prices for all symbols in symbols_info.
-        On success: saves to CSV with timestamp.
-        On failure: loads from CSV fallback with age validation.
+        First tries ticker_fn (a single multi-symbol request returning symbol -> price,
+        e.g. roostoo.get_last_prices); symbols it does not cover are fetched
+        concurrently from the remote fetcher with per-symbol retries.
+        On success: saves to CSV with a timestamp per symbol.
+        On failure: only the symbols that failed are loaded from the CSV fallback, with age validation.
         
         Returns: dict mapping symbol -> price
-        Raises: Exception if fetching fails and CSV fallback is unavailable or too old
+        Raises: Exception if a symbol fails and its CSV fallback is unavailable or too old
         """
         csv_path = f'{self.user_data_folder}/last_prices.csv'
         max_age_seconds = 30 * 60  # 30 minutes
+        symbols = list(symbols_info.keys())
         
         last_prices = {}
-        fetch_success = True
         
-        # Try to fetch all prices
-        try:
-            logger.info(f'Fetching last prices for {len(symbols_info)} symbols')
-            for symbol in symbols_info.keys():
+        # Try the batch endpoint first
+        if ticker_fn is not None:
+            try:
+                batch_prices = ticker_fn() or {}
+                last_prices = {symbol: float(batch_prices[symbol]) for symbol in symbols if symbol in batch_prices}
+                logger.info(f'Fetched {len(last_prices)}/{len(symbols)} last prices in one batch request')
+            except Exception as e:
+                logger.error(f'Batch last price request failed: {e}')
+        
+        # Fan out over the pooled session for the rest
+        missing = [symbol for symbol in symbols if symbol not in last_prices]
+        failed = []
+        if missing:
+            logger.info(f'Fetching last prices for {len(missing)} symbols')
+            with ThreadPoolExecutor(max_workers=min(self.max_workers, len(missing))) as executor:
+                futures = {symbol: executor.submit(self._fetch_last_price_with_retry, symbol, max_retries) for symbol in missing}
+            for symbol, future in futures.items():
                 try:
-                    price = self.fetch_last_price(symbol)
-                    last_prices[symbol] = price
+                    last_prices[symbol] = future.result()
                 except Exception as e:
                     logger.error(f'Failed to fetch price for {symbol}: {e}')
-                    fetch_success = False
-                    break
-            
-            if fetch_success:
-                # Save to CSV with timestamp
-                now = int(time.time())
-                df = pd.DataFrame([
-                    {'symbol': symbol, 'price': price, 'timestamp': now}
-                    for symbol, price in last_prices.items()
-                ])
-                df.to_csv(csv_path, index=False)
-                logger.info(f'Saved {len(last_prices)} prices to {csv_path}')
-                return last_prices
-        except Exception as e:
-            logger.error(f'Error in fetch_all_last_prices: {e}')
-            fetch_success = False
+                    failed.append(symbol)
+        
+        now = int(current_time())
+        rows = {symbol: {'symbol': symbol, 'price': price, 'timestamp': now} for symbol, price in last_prices.items()}
         
-        # If fetch failed, try CSV fallback
-        if not fetch_success:
-            logger.warning('Price fetch failed, attempting CSV fallback')
-            tg.send_message('⚠️ ALERT: Price fetch failed, using CSV fallback')
+        # Fall back to the CSV cache for the failed symbols only
+        if failed:
+            logger.warning(f'Price fetch failed for {failed}, attempting CSV fallback')
+            tg.send_message(f'⚠️ ALERT: Price fetch failed for {", ".join(failed)}, using CSV fallback')
             
             if not os.path.exists(csv_path):
                 error_msg = 'CSV fallback unavailable: file does not exist'
@@ -304,26 +565,36 @@ class BinanceFetcher:
                 df = pd.read_csv(csv_path)
                 if df.empty or 'symbol' not in df or 'price' not in df or 'timestamp' not in df:
                     raise ValueError('CSV file is empty or missing required columns')
+                cached = df.set_index('symbol')
                 
-                # Check age of data
-                csv_timestamp = int(df['timestamp'].iloc[0])
-                age_seconds = int(time.time()) - csv_timestamp
+                for symbol in failed:
+                    if symbol not in cached.index:
+                        raise ValueError(f'CSV fallback has no price for {symbol}')
+                    
+                    # Check age of data
+                    csv_timestamp = int(cached.loc[symbol, 'timestamp'])
+                    age_seconds = now - csv_timestamp
+                    
+                    if age_seconds > max_age_seconds:
+                        error_msg = f'CSV fallback data for {symbol} too old: {age_seconds/60:.1f} minutes (max {max_age_seconds/60:.0f} minutes)'
+                        logger.error(error_msg)
+                        tg.send_message(f'❌ ERROR: {error_msg}')
+                        raise Exception(error_msg)
+                    
+                    last_prices[symbol] = float(cached.loc[symbol, 'price'])
+                    rows[symbol] = {'symbol': symbol, 'price': last_prices[symbol], 'timestamp': csv_timestamp}
+                    logger.warning(f'Using fallback price for {symbol} from CSV (age: {age_seconds/60:.1f} minutes)')
                 
-                if age_seconds > max_age_seconds:
-                    error_msg = f'CSV fallback data too old: {age_seconds/60:.1f} minutes (max {max_age_seconds/60:.0f} minutes)'
-                    logger.error(error_msg)
-                    tg.send_message(f'❌ ERROR: {error_msg}')
-                    raise Exception(error_msg)
-                
-                # Load prices from CSV
-                fallback_prices = dict(zip(df['symbol'], df['price']))
-                logger.warning(f'Using fallback prices from CSV (age: {age_seconds/60:.1f} minutes)')
-                tg.send_message(f'Using fallback prices (age: {age_seconds/60:.1f} min)')
-                return fallback_prices
+                tg.send_message(f'Using fallback prices for {len(failed)} symbols')
                 
             except Exception as e:
                 error_msg = f'Failed to load CSV fallback: {e}'
                 logger.error(error_msg)
                 tg.send_message(f'❌ ERROR: {error_msg}')
                 raise
-        
\ No newline at end of file
+        
+        # Save to CSV, keeping each symbol's own timestamp so fallback ages stay honest
+        df = pd.DataFrame([rows[symbol] for symbol in symbols])
+        df.to_csv(csv_path, index=False)
+        logger.info(f'Saved {len(last_prices)} prices to {csv_path}')
+        return last_prices
@@ -1,7 +1,11 @@
 import json
-from dataclasses import dataclass
+import hashlib
+import os
+import numpy as np
+from dataclasses import dataclass, asdict
 import pandas as pd
 from quanttrading.log import init_logger
+from quanttrading.helper import current_time
 import ast
 from quanttrading import tg
 
@@ -29,6 +33,11 @@ class StratConfig:
     mdd_limit: float
 
 
+def signal_col_name(p: StratParams) -> str:
+    """Column of p in the signal frames; the aggregate signal is the mean over distinct columns."""
+    return f"{p.model}_" + '-'.join(f'{v}' for v in p.param)
+
+
 def compute_weights(df: pd.DataFrame) -> pd.DataFrame:
     df = df.copy()
     total_weight = df.groupby('factor_id', sort=False)['weight'].mean().sum()
@@ -50,11 +59,93 @@ def send_weights(weights: dict[tuple, float]) -> None:
     tg.send_message(msg)
 
 
-def create_config_from_df(df: pd.DataFrame) -> list[StratConfig]:
-    df = compute_weights(df)
+def _parse_params(raw_params) -> list[float | int]:
+    """Parses one `p` cell, e.g. "[96, 124, 0.6]"; unparseable cells give [] and bad items are skipped."""
+    values: list[float | int] = []
+    if isinstance(raw_params, (list, tuple)):
+        values = list(raw_params)
+    elif isinstance(raw_params, str) and raw_params:
+        try:
+            values = ast.literal_eval(raw_params)
+        except Exception:
+            try:
+                values = json.loads(raw_params)
+            except Exception:
+                values = []
+
+    cleaned_values: list[float | int] = []
+    for v in values:
+        if isinstance(v, (int, float)):
+            cleaned_values.append(v)
+        else:
+            try:
+                cast_v = float(v)
+                cleaned_values.append(int(cast_v) if cast_v.is_integer() else cast_v)
+            except Exception:
+                continue
+    return cleaned_values
+
+
+# a float, or an int without leading zeros: literal_eval rejects 007 (and json too)
+_NUMBER = r'\s*[+-]?(?:\d+\.\d*(?:[eE][+-]?\d+)?|\.\d+(?:[eE][+-]?\d+)?|\d+[eE][+-]?\d+|0+|[1-9]\d*)\s*'
+
+
+def parse_param_column(raw: pd.Series) -> list[list[float | int]]:
+    """Parses a whole `p` column at once, matching _parse_params cell by cell.
+
+    Cells that are a bracketed list of plain number literals are split into
+    one float matrix per list length; tokens written as integers come back
+    as int, like literal_eval would return them. Anything else (quoted
+    values, nested lists, bools, non-string cells) goes through
+    _parse_params.
+    """
+    n = len(raw)
+    result: list[list[float | int] | None] = [None] * n
+    is_str = raw.map(type).to_numpy() == str
+    text = raw.where(is_str, '').astype(str).str.strip()
+    simple = is_str & text.str.fullmatch(rf'\[(?:{_NUMBER}(?:,{_NUMBER})*)?,?\s*\]').to_numpy()
+
+    inner = text[simple].str[1:-1].str.strip().str.rstrip(',')
+    lengths = np.where(inner.str.len().to_numpy() == 0, 0, inner.str.count(',').to_numpy() + 1)
+    positions = np.flatnonzero(simple)
+    fallback = list(np.flatnonzero(~simple))
+    for k in np.unique(lengths):
+        rows = positions[lengths == k]
+        if k == 0:
+            for pos in rows:
+                result[pos] = []
+            continue
+        tokens = inner[lengths == k].str.split(',', expand=True).to_numpy(dtype=str)
+        values = tokens.astype(float)
+        # tokens already matched _NUMBER, so no '.' or exponent means an int literal
+        is_int = (np.char.find(tokens, '.') < 0) & (np.char.find(np.char.lower(tokens), 'e') < 0)
+        # ints beyond float precision are left to the per-row path
+        exact = ~(is_int & (np.abs(values) >= 2 ** 53)).any(axis=1)
+        cells = values.astype(object)
+        cells[is_int] = np.where(np.abs(values) < 2 ** 53, values, 0)[is_int].astype(np.int64).tolist()
+        for pos, cell in zip(rows[exact], cells[exact].tolist()):
+            result[pos] = cell
+        fallback.extend(rows[~exact])
+
+    for pos in fallback:
+        result[pos] = _parse_params(raw.iloc[pos])
+    return result
+
+
+def create_config_from_df(df: pd.DataFrame, vectorized: bool = True) -> list[StratConfig]:
+    """Groups df_final rows into one StratConfig per factor_id.
+
+    vectorized=False parses `p` row by row (reference path for benchmarks).
+    """
+    df = compute_weights(df).reset_index(drop=True)
     strategies: list[StratConfig] = []
     grouped = df.groupby(['factor_id'], dropna=False, sort=False)
 
+    if vectorized:
+        params = parse_param_column(df['p'])
+        strategy_ids = df['strategy'].tolist()
+        models = df['m'].tolist()
+
     for gid, group in grouped:
         try:
             first = group.iloc[0]
@@ -78,32 +169,12 @@ def create_config_from_df(df: pd.DataFrame) -> list[StratConfig]:
 
             params_list_group: list[StratParams] = []
 
-            for _, row in group.iterrows():
-                raw_params = row['p']
-                values: list[float | int] = []
-                if isinstance(raw_params, (list, tuple)):
-                    values = list(raw_params)
-                elif isinstance(raw_params, str) and raw_params:
-                    try:
-                        values = ast.literal_eval(raw_params)
-                    except Exception:
-                        try:
-                            values = json.loads(raw_params)
-                        except Exception:
-                            values = []
-
-                cleaned_values: list[float | int] = []
-                for v in values:
-                    if isinstance(v, (int, float)):
-                        cleaned_values.append(v)
-                    else:
-                        try:
-                            cast_v = float(v)
-                            cleaned_values.append(int(cast_v) if cast_v.is_integer() else cast_v)
-                        except Exception:
-                            continue
-
-                params_list_group.append(StratParams(strategy_id=row['strategy'], model=row['m'], param=cleaned_values))
+            if vectorized:
+                for pos in group.index:  # positions, after reset_index
+                    params_list_group.append(StratParams(strategy_id=strategy_ids[pos], model=models[pos], param=params[pos]))
+            else:
+                for _, row in group.iterrows():
+                    params_list_group.append(StratParams(strategy_id=row['strategy'], model=row['m'], param=_parse_params(row['p'])))
 
             strategies.append(
                 StratConfig(
@@ -124,3 +195,136 @@ def create_config_from_df(df: pd.DataFrame) -> list[StratConfig]:
             continue
 
     return strategies
+
+
+# bump when compile_configs or the cached layout changes, so stale caches are ignored
+CONFIG_CACHE_VERSION = 4
+
+
+@dataclass(frozen=True)
+class CompileReport:
+    n_configs: int
+    n_rows: int
+    zero_weight_removed: int
+    duplicates_removed: int
+
+    @property
+    def n_evaluations(self) -> int:
+        return self.n_rows - self.zero_weight_removed - self.duplicates_removed
+
+    def __str__(self) -> str:
+        return (
+            f'{self.n_configs} configs, {self.n_rows} param rows -> {self.n_evaluations} evaluations '
+            f'({self.zero_weight_removed} zero-weight, {self.duplicates_removed} duplicates removed)'
+        )
+
+
+def compile_configs(configs: list[StratConfig], drop_zero_weight: bool = True) -> tuple[list[StratConfig], CompileReport]:
+    """Removes parameter sets that cannot change any signal or position.
+
+    Zero-weight configs are dropped (ids of the others are kept), and rows
+    of a config with the same signal column name are folded into the first
+    one; the report counts the rows removed. Rows that only differ in how a
+    number is written (60 vs 60.0) get separate columns and so keep their
+    own weight in the aggregated mean; they are not folded.
+    """
+    compiled: list[StratConfig] = []
+    n_rows = zero_weight_removed = duplicates_removed = 0
+    for config in configs:
+        n_rows += len(config.params)
+        if drop_zero_weight and config.final_weight == 0.0:
+            zero_weight_removed += len(config.params)
+            continue
+        folded: dict[str, StratParams] = {}
+        for p in config.params:
+            key = signal_col_name(p)
+            if key in folded:
+                duplicates_removed += 1
+            else:
+                folded[key] = p
+        compiled.append(StratConfig(**{**config.__dict__, 'params': list(folded.values())}))
+
+    report = CompileReport(
+        n_configs=len(configs),
+        n_rows=n_rows,
+        zero_weight_removed=zero_weight_removed,
+        duplicates_removed=duplicates_removed,
+    )
+    logger.info(f'Compiled configs: {report}')
+    return compiled, report
+
+
+def _config_from_dict(d: dict) -> StratConfig:
+    return StratConfig(**{**d, 'params': [StratParams(**p) for p in d['params']]})
+
+
+def load_compiled_configs(file_path: str, cache_folder: str | None = 'user_data/cache') -> tuple[list[StratConfig], CompileReport]:
+    """Reads and compiles a df_final-style CSV, caching the result by the file's content hash.
+
+    With cache_folder=None the CSV is always parsed.
+    """
+    with open(file_path, 'rb') as f:
+        digest = hashlib.sha256(f.read()).hexdigest()[:16]
+    cache_path = f'{cache_folder}/config_v{CONFIG_CACHE_VERSION}_{digest}.json' if cache_folder else None
+
+    if cache_path and os.path.exists(cache_path):
+        try:
+            with open(cache_path) as f:
+                cached = json.load(f)
+            configs = [_config_from_dict(d) for d in cached['configs']]
+            report = CompileReport(**cached['report'])
+            logger.info(f'Compiled configs loaded from {cache_path}: {report}')
+            return configs, report
+        except Exception as e:
+            logger.error(f'Failed to read compiled config cache {cache_path}: {e}')
+
+    configs, report = compile_configs(create_config_from_df(pd.read_csv(file_path)))
+    if cache_path:
+        os.makedirs(cache_folder, exist_ok=True)
+        tmp_path = f'{cache_path}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'configs': [asdict(c) for c in configs], 'report': asdict(report)}, f)
+        os.replace(tmp_path, cache_path)
+    return configs, report
+
+
+class ConfigWatcher:
+    """
+    Detects changes of a config file between trading cycles.
+
+    A stat() per check; the file is read and hashed only when its mtime or
+    size moved, so touching it without changing the content is ignored.
+    Files modified less than `settle` seconds ago are left for the next
+    check, in case they are still being written.
+    """
+
+    def __init__(self, file_path: str, settle: float = 2.0) -> None:
+        self.file_path = file_path
+        self.settle = settle
+        self.stat = self._stat()
+        self.digest = self._digest()
+
+    def _stat(self) -> tuple[float, int]:
+        st = os.stat(self.file_path)
+        return st.st_mtime, st.st_size
+
+    def _digest(self) -> str:
+        with open(self.file_path, 'rb') as f:
+            return hashlib.sha256(f.read()).hexdigest()
+
+    def changed(self) -> bool:
+        """True once per content change since the last call that returned True."""
+        try:
+            stat = self._stat()
+        except OSError as e:
+            logger.error(f'Cannot stat {self.file_path}: {e}')
+            return False
+        if stat == self.stat or current_time() - stat[0] < self.settle:
+            return False
+        self.stat = stat
+        digest = self._digest()
+        if digest == self.digest:
+            return False
+        self.digest = digest
+        logger.info(f'{self.file_path} changed')
+        return True
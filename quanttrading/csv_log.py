@@ -0,0 +1,116 @@
+"""
+Append-only CSV logs.
+
+Rows are only ever appended, so the cost of logging one row does not depend
+on how much history the file already holds. The header line always lists
+every column: when a new column shows up (a rare event, e.g. a new symbol)
+the file is rewritten once under the wider header and swapped in with
+os.replace. Older, shorter rows read back with NaN in the new columns, so a
+plain `pd.read_csv(path, index_col=0)` loads the whole log.
+"""
+
+import io
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+
+class CsvLogFile:
+    def __init__(self, file_path: str) -> None:
+        self.file_path = file_path
+        self.columns: list[str] = []
+        self.last_row: pd.DataFrame | None = None
+        if self._has_data():
+            self._repair()
+            self.columns = self._read_header()
+            self.last_row = self._read_last_row()
+
+    def _has_data(self) -> bool:
+        return os.path.exists(self.file_path) and os.path.getsize(self.file_path) > 0
+
+    def _repair(self) -> None:
+        """Drops a trailing partial line left by an interrupted append."""
+        with open(self.file_path, 'r+b') as f:
+            size = f.seek(0, os.SEEK_END)
+            if size == 0:
+                return
+            f.seek(size - 1)
+            if f.read(1) == b'\n':
+                return
+            end = self._last_newline(f, size)
+            f.truncate(end + 1 if end >= 0 else 0)
+
+    @staticmethod
+    def _last_newline(f, end: int, block: int = 4096) -> int:
+        """Position of the last b'\\n' before `end`, or -1."""
+        pos = end
+        while pos > 0:
+            start = max(0, pos - block)
+            f.seek(start)
+            found = f.read(pos - start).rfind(b'\n')
+            if found >= 0:
+                return start + found
+            pos = start
+        return -1
+
+    def _read_header(self) -> list[str]:
+        return list(pd.read_csv(self.file_path, index_col=0, nrows=0).columns)
+
+    def _rewrite_header(self, columns: list[str]) -> None:
+        """Copies the file under a new header line to a temporary file and swaps it in."""
+        tmp_path = f'{self.file_path}.tmp'
+        with open(self.file_path, 'rb') as src, open(tmp_path, 'wb') as dst:
+            src.readline()
+            dst.write(pd.DataFrame(columns=columns).to_csv().encode('utf-8'))
+            shutil.copyfileobj(src, dst)
+            dst.flush()
+            os.fsync(dst.fileno())
+        os.replace(tmp_path, self.file_path)
+
+    def _read_last_row(self) -> pd.DataFrame | None:
+        """Parses only the last line of the file."""
+        with open(self.file_path, 'rb') as f:
+            size = f.seek(0, os.SEEK_END)
+            start = self._last_newline(f, size - 1) + 1
+            f.seek(start)
+            line = f.read().decode('utf-8')
+        if start == 0:
+            # only the header line is present
+            return None
+        row = pd.read_csv(io.StringIO(line), header=None, names=[''] + self.columns, index_col=0)
+        row.index.name = None
+        return row
+
+    def is_duplicate(self, df: pd.DataFrame) -> bool:
+        """True if the last row of df equals the last logged row (columns aligned, NaN == NaN)."""
+        if self.last_row is None or self.last_row.empty:
+            return False
+        all_cols = sorted(set(self.last_row.columns) | set(df.columns))
+        last_old = self.last_row.reindex(columns=all_cols)
+        new_row = df.tail(1).reindex(columns=all_cols)
+        try:
+            old_vals = last_old.to_numpy(dtype=float)
+            new_vals = new_row.to_numpy(dtype=float)
+            return np.allclose(old_vals, new_vals, rtol=1e-9, atol=1e-12, equal_nan=True)
+        except Exception:
+            return last_old.equals(new_row)
+
+    def append(self, df: pd.DataFrame) -> None:
+        new_columns = [c for c in df.columns if c not in self.columns]
+        exists = self._has_data()
+        if new_columns:
+            self.columns = self.columns + new_columns
+            if exists:
+                self._rewrite_header(self.columns)
+
+        rows = df.reindex(columns=self.columns)
+        text = rows.to_csv(header=not exists)
+        # one write call per batch of rows, fsynced before the in-memory state moves on
+        with open(self.file_path, 'a', newline='') as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        self.last_row = rows.tail(1)
+
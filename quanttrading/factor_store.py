@@ -0,0 +1,137 @@
+import threading
+
+import numpy as np
+import pandas as pd
+
+
+class FactorSeries:
+    """One {t, value} factor series held in contiguous, growable NumPy buffers.
+
+    Readers get read-only views of the filled part of the buffers. Appending
+    new bars writes past the end of the views handed out earlier, so those
+    stay valid; only a merge that rewrites existing bars swaps in new buffers
+    and bumps `revision`.
+    """
+
+    def __init__(self, t: np.ndarray, value: np.ndarray) -> None:
+        t = np.asarray(t, dtype=np.int64)
+        value = np.asarray(value, dtype=np.float64)
+        if not np.all(t[1:] > t[:-1]):
+            order = np.argsort(t, kind='stable')
+            t, value = t[order], value[order]
+            # keep the last value of duplicated timestamps, like drop_duplicates(keep='last')
+            keep = np.append(t[1:] != t[:-1], True)
+            t, value = t[keep], value[keep]
+        self._set_buffers(t, value)
+        self.revision = 0
+        self._index: pd.DatetimeIndex | None = None
+
+    def _set_buffers(self, t: np.ndarray, value: np.ndarray) -> None:
+        capacity = max(16, 2 * len(t))
+        self._t = np.empty(capacity, dtype=np.int64)
+        self._value = np.empty(capacity, dtype=np.float64)
+        self._t[:len(t)] = t
+        self._value[:len(value)] = value
+        self._n = len(t)
+
+    def __len__(self) -> int:
+        return self._n
+
+    @property
+    def t(self) -> np.ndarray:
+        view = self._t[:self._n]
+        view.flags.writeable = False
+        return view
+
+    @property
+    def value(self) -> np.ndarray:
+        view = self._value[:self._n]
+        view.flags.writeable = False
+        return view
+
+    @property
+    def last_t(self) -> int | None:
+        return int(self._t[self._n - 1]) if self._n else None
+
+    @property
+    def index(self) -> pd.DatetimeIndex:
+        if self._index is None or len(self._index) != self._n:
+            self._index = pd.DatetimeIndex(pd.to_datetime(self.t, unit='s'), name='ts')
+        return self._index
+
+    def to_frame(self) -> pd.DataFrame:
+        """DataFrame over the read-only views, indexed by `ts` like the cached CSVs."""
+        return pd.DataFrame({'t': self.t, 'value': self.value}, index=self.index, copy=False)
+
+    def extend(self, t: np.ndarray, value: np.ndarray) -> int:
+        """Merges newly fetched bars; returns how many bars were appended or changed.
+
+        New values win over cached ones for the same timestamp.
+        """
+        t = np.asarray(t, dtype=np.int64)
+        value = np.asarray(value, dtype=np.float64)
+        if len(t) == 0:
+            return 0
+        last_t = self.last_t
+        is_new = t > last_t if last_t is not None else np.ones(len(t), dtype=bool)
+
+        old = ~is_new
+        if old.any():
+            pos = np.searchsorted(self.t, t[old])
+            pos_clipped = np.minimum(pos, self._n - 1)
+            known = self.t[pos_clipped] == t[old]
+            unchanged = known & (self.value[pos_clipped] == value[old])
+            if not unchanged.all():
+                merged = FactorSeries(np.concatenate([self.t, t]), np.concatenate([self.value, value]))
+                changed = int((~unchanged).sum() + is_new.sum())
+                self._set_buffers(merged.t, merged.value)
+                self.revision += 1
+                self._index = None
+                return changed
+
+        t_new, value_new = t[is_new], value[is_new]
+        if len(t_new) == 0:
+            return 0
+        if not np.all(np.diff(t_new) > 0):
+            order = np.argsort(t_new, kind='stable')
+            t_new, value_new = t_new[order], value_new[order]
+            keep = np.append(t_new[1:] != t_new[:-1], True)
+            t_new, value_new = t_new[keep], value_new[keep]
+
+        n_new = self._n + len(t_new)
+        if n_new > len(self._t):
+            capacity = max(2 * len(self._t), n_new)
+            self._t = np.resize(self._t, capacity)
+            self._value = np.resize(self._value, capacity)
+        self._t[self._n:n_new] = t_new
+        self._value[self._n:n_new] = value_new
+        self._n = n_new
+        return len(t_new)
+
+
+class FactorStore:
+    """Process-wide cache of factor series keyed by (prefix, symbol, timeframe)."""
+
+    def __init__(self) -> None:
+        self._series: dict[tuple[str, str, str], FactorSeries] = {}
+        self.lock = threading.RLock()
+
+    def get(self, key: tuple[str, str, str]) -> FactorSeries | None:
+        return self._series.get(key)
+
+    def put(self, key: tuple[str, str, str], series: FactorSeries) -> None:
+        with self.lock:
+            self._series[key] = series
+
+    def __contains__(self, key: tuple[str, str, str]) -> bool:
+        return key in self._series
+
+    def keys(self) -> list[tuple[str, str, str]]:
+        return list(self._series.keys())
+
+    def clear(self) -> None:
+        with self.lock:
+            self._series.clear()
+
+
+factor_store = FactorStore()
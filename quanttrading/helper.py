@@ -1,36 +1,67 @@
 from datetime import datetime, timezone
+import time
+from typing import Callable
 import pandas as pd
 import logging
 
 logger = logging.getLogger('helper')
 
+# Source of "now" for the bar freshness checks; replaced by a virtual clock in replays
+_clock: Callable[[], float] = time.time
+
+RESOLUTION_SEC_MAP = {
+    '1d': 86400,
+    '24h': 86400,
+    '12h': 43200,
+    '8h': 28800,
+    '6h': 21600,
+    '4h': 14400,
+    '2h': 7200,
+    '1h': 3600,
+    '30m': 1800,
+    '15m': 900,
+    '10m': 600,
+    '5m': 300,
+    '3m': 180,
+    '1m': 60,
+}
+
+
+def set_clock(clock: Callable[[], float] | None) -> None:
+    """Makes current_time() read `clock` (epoch seconds); None restores the wall clock."""
+    global _clock
+    _clock = clock if clock is not None else time.time
+
+
+def current_time() -> float:
+    return _clock()
+
+
+def resolution_to_seconds(resolution: str) -> int:
+    resolution_seconds = RESOLUTION_SEC_MAP.get(resolution, 0)
+    if resolution_seconds == 0:
+        raise ValueError(f"Unsupported resolution: {resolution}")
+    return resolution_seconds
+
+
+def last_bar_close(now: float, resolution: str) -> int:
+    """Timestamp of the most recent bar boundary at or before now (bars are aligned to the epoch, UTC)."""
+    resolution_seconds = resolution_to_seconds(resolution)
+    return int(now // resolution_seconds) * resolution_seconds
+
+
+def next_bar_close(now: float, resolution: str) -> int:
+    """Timestamp of the first bar boundary strictly after now."""
+    return last_bar_close(now, resolution) + resolution_to_seconds(resolution)
+
 
 def is_last_bar_closed(df: pd.DataFrame, resolution: str, t_col: str = 't') -> bool:
-    resolution_sec_map = {
-        '1d': 86400,
-        '24h': 86400,
-        '12h': 43200,
-        '8h': 28800,
-        '6h': 21600,
-        '4h': 14400,
-        '2h': 7200,
-        '1h': 3600,
-        '30m': 1800,
-        '15m': 900,
-        '10m': 600,
-        '5m': 300,
-        '3m': 180,
-        '1m': 60,
-    }
-    
     last_timestamp = df[t_col].iloc[-1]
     last_time = datetime.fromtimestamp(last_timestamp, tz=timezone.utc)
-    now = datetime.now(timezone.utc)
+    now = datetime.fromtimestamp(current_time(), tz=timezone.utc)
     diff = now - last_time
     
-    resolution_seconds = resolution_sec_map.get(resolution, 0)
-    if resolution_seconds == 0:
-        raise ValueError(f"Unsupported resolution: {resolution}")
+    resolution_seconds = resolution_to_seconds(resolution)
     
     is_closed = diff.total_seconds() >= resolution_seconds
     
@@ -42,39 +73,22 @@ def is_last_bar_closed(df: pd.DataFrame, resolution: str, t_col: str = 't') -> b
 
 
 def is_data_latest(df: pd.DataFrame, resolution: str, t_col: str = 't', print_info: bool = True) -> bool:
-    df = df.copy()
-    
     # is_closed = is_last_bar_closed(df, resolution, t_col)
     # if not is_closed:
     #     if print_info:
     #         print(f"Last bar is not closed. Cannot check if data is latest.")
     #     return False
     
-    resolution_sec_map = {
-        '1d': 86400,
-        '24h': 86400,
-        '12h': 43200,
-        '8h': 28800,
-        '6h': 21600,
-        '4h': 14400,
-        '2h': 7200,
-        '1h': 3600,
-        '30m': 1800,
-        '15m': 900,
-        '10m': 600,
-        '5m': 300,
-        '3m': 180,
-        '1m': 60,
-    }
-    
     last_timestamp = df[t_col].iloc[-1]
+    return is_timestamp_latest(last_timestamp, resolution, print_info)
+
+
+def is_timestamp_latest(last_timestamp: int, resolution: str, print_info: bool = True) -> bool:
     last_time = datetime.fromtimestamp(last_timestamp, tz=timezone.utc)
-    now = datetime.now(timezone.utc)
+    now = datetime.fromtimestamp(current_time(), tz=timezone.utc)
     diff = now - last_time
     
-    resolution_seconds = resolution_sec_map.get(resolution, 0) * 2
-    if resolution_seconds == 0:
-        raise ValueError(f"Unsupported resolution: {resolution}")
+    resolution_seconds = resolution_to_seconds(resolution) * 2
     
     is_latest = diff.total_seconds() < resolution_seconds
     
@@ -0,0 +1,261 @@
+"""
+Timing spans and HTTP latencies of the trading cycle.
+
+Spans time a named piece of work (a pipeline stage, one strategy's signal,
+a Monitor write) and HTTP calls are timed on the requests sessions of the
+remote fetcher, Roostoo and Telegram. Every observation goes into a
+histogram keyed by name and labels; gauges are read from a callback
+whenever the metrics are written. end_cycle() writes what was observed
+during the cycle as one JSON line and rewrites the Prometheus text file
+with the totals since start; serve() also exposes that text over HTTP.
+
+Usage:
+    from quanttrading import metrics
+
+    with metrics.span('fetch_all_last_prices'):
+        ...
+"""
+
+import functools
+import json
+import os
+import threading
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable
+from urllib.parse import urlsplit
+
+from quanttrading.log import init_logger
+
+
+logger = init_logger('metrics')
+
+# Upper bounds in seconds; a request past the last one lands in +Inf
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SPAN_METRIC = 'qt_span_seconds'
+HTTP_METRIC = 'qt_http_request_seconds'
+
+
+@dataclass
+class Histogram:
+    buckets: tuple[float, ...] = BUCKETS
+    counts: list[int] = field(default_factory=lambda: [0] * len(BUCKETS))
+    count: int = 0
+    total: float = 0.0
+    max: float = 0.0
+
+    def observe(self, seconds: float) -> None:
+        for i, bound in enumerate(self.buckets):
+            if seconds <= bound:
+                self.counts[i] += 1
+                break
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def summary(self) -> dict[str, float]:
+        return {'count': self.count, 'total_ms': round(self.total * 1000, 3), 'max_ms': round(self.max * 1000, 3)}
+
+
+Key = tuple[str, tuple[tuple[str, str], ...]]
+
+
+def _key(name: str, labels: dict) -> Key:
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels: tuple[tuple[str, str], ...], extra: tuple[str, str] | None = None) -> str:
+    pairs = list(labels) + ([extra] if extra else [])
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in pairs) + '}'
+
+
+class Metrics:
+    """
+    Thread-safe histograms of span and HTTP durations.
+
+    `totals` accumulate since start (Prometheus), `cycle` since the last
+    end_cycle() (metrics file), so work between cycles is reported with
+    the next one.
+    """
+
+    def __init__(self, folder: str = 'user_data/metrics') -> None:
+        self.folder = folder
+        self.totals: dict[Key, Histogram] = {}
+        self.cycle: dict[Key, Histogram] = {}
+        self.gauges: dict[Key, Callable[[], float]] = {}
+        self._cycle_start = time.perf_counter()
+        self._lock = threading.Lock()
+        self._server: ThreadingHTTPServer | None = None
+
+    def observe(self, name: str, seconds: float, **labels) -> None:
+        key = _key(name, labels)
+        with self._lock:
+            for histograms in (self.totals, self.cycle):
+                histogram = histograms.get(key)
+                if histogram is None:
+                    histogram = histograms[key] = Histogram()
+                histogram.observe(seconds)
+
+    def gauge(self, name: str, read: Callable[[], float], **labels) -> None:
+        """Registers a gauge whose value is read() each time the metrics are written or served."""
+        with self._lock:
+            self.gauges[_key(name, labels)] = read
+
+    def _read_gauges(self) -> list[tuple[Key, float]]:
+        with self._lock:
+            gauges = sorted(self.gauges.items())
+        values = []
+        for key, read in gauges:
+            try:
+                values.append((key, float(read())))
+            except Exception as e:
+                logger.error(f'Failed to read gauge {key[0]}: {e}')
+        return values
+
+    @contextmanager
+    def span(self, span: str, **labels) -> Iterator[None]:
+        """Times the block as qt_span_seconds{span=...}; exceptions are timed too."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(SPAN_METRIC, time.perf_counter() - start, span=span, **labels)
+
+    def timed(self, span: str) -> Callable:
+        """Decorator form of span()."""
+        def decorator(fn: Callable) -> Callable:
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                with self.span(span):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def instrument_session(self, session, service: str) -> None:
+        """Times every request sent through a requests.Session, tagged by service and endpoint.
+
+        The endpoint is the last path segment only, which keeps ids and the
+        Telegram bot token out of the labels. Failed requests get status="error".
+        """
+        send = session.send
+
+        def timed_send(request, **kwargs):
+            start = time.perf_counter()
+            status = 'error'
+            try:
+                response = send(request, **kwargs)
+                status = str(response.status_code)
+                return response
+            finally:
+                endpoint = '/' + urlsplit(request.url).path.rstrip('/').rsplit('/', 1)[-1]
+                self.observe(HTTP_METRIC, time.perf_counter() - start,
+                             service=service, method=request.method, endpoint=endpoint, status=status)
+
+        session.send = timed_send
+
+    def start_cycle(self) -> None:
+        """Marks the start of a cycle for the elapsed time reported by end_cycle()."""
+        self._cycle_start = time.perf_counter()
+
+    def end_cycle(self, now: int) -> dict:
+        """Appends the spans and HTTP calls since the last call and the gauges to cycles.jsonl and rewrites metrics.prom."""
+        with self._lock:
+            cycle, self.cycle = self.cycle, {}
+        elapsed = time.perf_counter() - self._cycle_start
+
+        record = {'now': now, 'elapsed_ms': round(elapsed * 1000, 3), 'spans': {}, 'http': {}, 'gauges': {}}
+        for (name, labels), histogram in sorted(cycle.items()):
+            section = 'spans' if name == SPAN_METRIC else 'http'
+            label = ','.join(f'{k}={v}' for k, v in labels)
+            record[section][label] = histogram.summary()
+        for (name, labels), value in self._read_gauges():
+            record['gauges'][name + _format_labels(labels)] = value
+
+        try:
+            os.makedirs(self.folder, exist_ok=True)
+            with open(f'{self.folder}/cycles.jsonl', 'a') as f:
+                f.write(json.dumps(record) + '\n')
+            tmp_path = f'{self.folder}/metrics.prom.tmp'
+            with open(tmp_path, 'w') as f:
+                f.write(self.prometheus_text())
+            os.replace(tmp_path, f'{self.folder}/metrics.prom')
+        except OSError as e:
+            logger.error(f'Failed to write metrics: {e}')
+        return record
+
+    def prometheus_text(self) -> str:
+        """Totals since start and current gauge values in the Prometheus text exposition format."""
+        with self._lock:
+            items = sorted((key, Histogram(h.buckets, list(h.counts), h.count, h.total, h.max)) for key, h in self.totals.items())
+        lines = []
+        for metric in (SPAN_METRIC, HTTP_METRIC):
+            lines.append(f'# TYPE {metric} histogram')
+            for (name, labels), histogram in items:
+                if name != metric:
+                    continue
+                cumulative = 0
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    cumulative += count
+                    lines.append(f'{metric}_bucket{_format_labels(labels, ("le", f"{bound:g}"))} {cumulative}')
+                lines.append(f'{metric}_bucket{_format_labels(labels, ("le", "+Inf"))} {histogram.count}')
+                lines.append(f'{metric}_sum{_format_labels(labels)} {histogram.total:.6f}')
+                lines.append(f'{metric}_count{_format_labels(labels)} {histogram.count}')
+        typed = set()
+        for (name, labels), value in self._read_gauges():
+            if name not in typed:
+                typed.add(name)
+                lines.append(f'# TYPE {name} gauge')
+            lines.append(f'{name}{_format_labels(labels)} {value:g}')
+        return '\n'.join(lines) + '\n'
+
+    def serve(self, port: int, host: str = '127.0.0.1') -> ThreadingHTTPServer | None:
+        """Serves prometheus_text() at http://host:port/metrics from a daemon thread.
+
+        Returns None if the port cannot be bound (e.g. a second instance);
+        metrics.prom is still written every cycle.
+        """
+        collector = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self) -> None:
+                if self.path.split('?')[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                body = collector.prometheus_text().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args) -> None:
+                pass
+
+        try:
+            self._server = ThreadingHTTPServer((host, port), Handler)
+        except OSError as e:
+            logger.error(f'Not serving metrics on {host}:{port}: {e}; still writing {self.folder}/metrics.prom')
+            return None
+        threading.Thread(target=self._server.serve_forever, name='metrics-http', daemon=True).start()
+        logger.info(f'Serving metrics at http://{host}:{self._server.server_address[1]}/metrics')
+        return self._server
+
+
+collector = Metrics()
+observe = collector.observe
+gauge = collector.gauge
+span = collector.span
+timed = collector.timed
+instrument_session = collector.instrument_session
+start_cycle = collector.start_cycle
+end_cycle = collector.end_cycle
+serve = collector.serve
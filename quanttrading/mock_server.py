@@ -0,0 +1,499 @@
+"""
+Local stand-in for the Roostoo exchange and the remote factor fetcher.
+
+One HTTP server answers both APIs, so the live loop can run offline:
+
+- Roostoo: /v3/serverTime, /v3/exchangeInfo, /v3/ticker, and the signed
+  /v3/balance, /v3/pending_count, /v3/place_order, /v3/query_order and
+  /v3/cancel_order. Signatures are checked like the exchange does it:
+  HMAC-SHA256 of the sorted `k=v&...` parameters with the API secret.
+  MARKET orders fill at once at the last price, minus CommissionPercent.
+  LIMIT orders stay pending until cancelled.
+- Fetcher: /oi, /g-ls, /t-ls, /ttp, /tsl, /tbl, /last-price and
+  /ohlcv-close, served from the cached series in the data folder. With
+  `extend` the series are continued as a random walk up to the current
+  bar, so the loop keeps seeing new bars.
+
+The listed pairs are the symbols of the config (df_final.csv), of a cached
+exchangeInfo and of the close series. Coins without a close_{COIN}_1h
+series are priced by a seeded random walk from ANCHOR_START to the current
+bar, so the loop runs offline on the factor data alone.
+
+Latency (base + uniform jitter), a token-bucket rate limit (HTTP 429) and
+random errors (HTTP 500) can be configured. /mock/stats reports the request,
+throttle and error counts per endpoint.
+
+Usage:
+    python -m quanttrading.mock_server [--port 8700] [--latency 0.05] [--jitter 0.02]
+        [--error-rate 0.01] [--rate-limit 10] [--burst 20] [--extend]
+
+then point the clients at it:
+    ROOSTOO_BASE_URL=http://127.0.0.1:8700 DO_FETCHER_BASE_URL=http://127.0.0.1:8700 python trade.py
+"""
+
+import argparse
+import hashlib
+import hmac
+import json
+import os
+import random
+import threading
+import time
+import zlib
+from collections import Counter
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+import numpy as np
+import pandas as pd
+from dotenv import load_dotenv
+
+from quanttrading.binance_fetcher import BinanceFetcher
+from quanttrading.factor_store import FactorStore
+from quanttrading.helper import current_time, last_bar_close, resolution_to_seconds
+from quanttrading.log import init_logger
+from quanttrading.symbol_manager import ANCHOR_START
+
+
+logger = init_logger('mock')
+
+load_dotenv()
+
+SERIES_ENDPOINTS = {'/oi': 'oi', '/g-ls': 'g_ls', '/t-ls': 't_ls', '/ttp': 'ttp', '/tsl': 'tsl', '/tbl': 'tbl'}
+SIGNED_ENDPOINTS = {'/v3/balance', '/v3/pending_count', '/v3/place_order', '/v3/query_order', '/v3/cancel_order'}
+# Signed requests older than this are rejected
+TIMESTAMP_WINDOW_MS = 60_000
+# First price of the random walk of a coin without a close series
+SYNTHETIC_PRICE = 100.0
+# Amount precision of a pair missing from the cached exchangeInfo
+DEFAULT_PAIR = {'PricePrecision': 4, 'AmountPrecision': 2, 'MiniOrder': 1}
+
+
+@dataclass
+class MockConfig:
+    host: str = '127.0.0.1'
+    port: int = 8700
+    data_folder: str = 'user_data'
+    # df_final-style file whose symbols are listed (default data_folder/data/df_final.csv)
+    config_file: str | None = None
+    api_key: str | None = None
+    secret_key: str | None = None
+    fetcher_api_key: str | None = None
+    latency: float = 0.0
+    jitter: float = 0.0
+    error_rate: float = 0.0
+    # requests per second over all endpoints (0 = unlimited)
+    rate_limit: float = 0.0
+    burst: int = 20
+    balance: float = 100_000.0
+    commission: float = 0.001
+    extend: bool = False
+    seed: int = 0
+
+
+class TokenBucket:
+    """Non-blocking token bucket: allow() answers at once whether a request fits the budget."""
+
+    def __init__(self, rate: float, burst: int) -> None:
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def allow(self) -> bool:
+        if self.rate <= 0:
+            return True
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            return False
+
+
+class MockExchange:
+    """Account, order book and series state behind the mock endpoints."""
+
+    def __init__(self, config: MockConfig) -> None:
+        self.config = config
+        self.fetcher = BinanceFetcher(folder=config.data_folder, store=FactorStore())
+        self.rng = np.random.default_rng(config.seed)
+        self.lock = threading.Lock()
+        self.trade_pairs = self._load_trade_pairs()
+        self.wallet: dict[str, float] = {'USD': config.balance}
+        self.orders: list[dict] = []
+        self._next_order_id = 1
+        self._series: dict[tuple[str, str, str], tuple[np.ndarray, np.ndarray]] = {}
+        # close series generated for coins without one; always continued up to the current bar
+        self._synthetic: set[tuple[str, str, str]] = set()
+
+    def _load_trade_pairs(self) -> dict[str, dict]:
+        """Pairs of the config's symbols, the cached exchangeInfo and the close series; precisions from the cache where known."""
+        cached = {}
+        cache_path = f'{self.config.data_folder}/exchange_info.json'
+        if os.path.exists(cache_path):
+            with open(cache_path) as f:
+                cached = json.load(f).get('TradePairs', {})
+        coins = {info['Coin'] for info in cached.values()}
+
+        config_file = self.config.config_file or f'{self.fetcher.csv_folder}/df_final.csv'
+        if os.path.exists(config_file):
+            coins.update(str(sym).split('/')[0] for sym in pd.read_csv(config_file)['sym'].unique())
+        for name in os.listdir(self.fetcher.csv_folder):
+            stem, ext = os.path.splitext(name)
+            if ext in ('.csv', '.bin') and stem.startswith('close_') and stem.endswith('_1h'):
+                coins.add(stem[len('close_'):-len('_1h')])
+
+        pairs = {}
+        for coin in sorted(coins):
+            pair = f'{coin}/USD'
+            pairs[pair] = cached.get(pair, {
+                'Coin': coin, 'CoinFullName': coin, 'Unit': 'USD', 'UnitFullName': 'USD', 'CanTrade': True, **DEFAULT_PAIR,
+            })
+        logger.info(f'Mock exchange lists {len(pairs)} pairs')
+        return pairs
+
+    def _synthetic_close(self, coin: str) -> tuple[np.ndarray, np.ndarray]:
+        """Hourly random-walk closes from ANCHOR_START for a coin without a close series, seeded by coin."""
+        step = resolution_to_seconds('1h')
+        current = last_bar_close(time.time(), '1h')
+        start = min(int(pd.Timestamp(ANCHOR_START, tz='UTC').timestamp()), current)
+        t = np.arange(start, current + 1, step, dtype=np.int64)
+        rng = np.random.default_rng([self.config.seed, zlib.crc32(coin.encode())])
+        value = SYNTHETIC_PRICE * np.exp(np.cumsum(rng.normal(0, 0.005, len(t))))
+        logger.info(f'No close series for {coin}, pricing it with a random walk from {ANCHOR_START}')
+        return t, value
+
+    def series(self, prefix: str, symbol: str, timeframe: str) -> tuple[np.ndarray, np.ndarray]:
+        """(t, value) of a cached series, continued as a random walk up to the current bar with `extend`.
+
+        A missing close_{COIN}_1h series is replaced by _synthetic_close().
+        """
+        key = (prefix, symbol, timeframe)
+        with self.lock:
+            if key not in self._series:
+                try:
+                    df = self.fetcher.load_cached_series(prefix, symbol, timeframe)
+                except FileNotFoundError:
+                    if (prefix, timeframe) != ('close', '1h'):
+                        raise
+                    self._series[key] = self._synthetic_close(symbol)
+                    self._synthetic.add(key)
+                else:
+                    if df.empty:
+                        raise FileNotFoundError(f'no cached series {prefix}_{symbol}_{timeframe}')
+                    self._series[key] = (df['t'].to_numpy(dtype=np.int64), df['value'].to_numpy(dtype=float))
+            t, value = self._series[key]
+            if (self.config.extend or key in self._synthetic) and len(t):
+                step = resolution_to_seconds(timeframe)
+                current = last_bar_close(time.time(), timeframe)
+                if t[-1] < current:
+                    new_t = np.arange(t[-1] + step, current + 1, step, dtype=np.int64)
+                    new_value = value[-1] * np.exp(np.cumsum(self.rng.normal(0, 0.005, len(new_t))))
+                    t, value = np.concatenate([t, new_t]), np.concatenate([value, new_value])
+                    self._series[key] = (t, value)
+            return t, value
+
+    def last_price(self, coin: str) -> float:
+        _, close = self.series('close', coin, '1h')
+        return float(close[-1])
+
+    def ticker(self, pair: str | None) -> dict:
+        pairs = [pair] if pair else list(self.trade_pairs)
+        data = {}
+        for p in pairs:
+            if p not in self.trade_pairs:
+                continue
+            price = self.last_price(self.trade_pairs[p]['Coin'])
+            data[p] = {'MaxBid': price, 'MinAsk': price, 'LastPrice': price, 'Change': 0.0, 'CoinTradeValue': 0.0, 'UnitTradeValue': 0.0}
+        return {'Success': True, 'ErrMsg': '', 'ServerTime': int(time.time() * 1000), 'Data': data}
+
+    def balance(self) -> dict:
+        with self.lock:
+            wallet = {coin: {'Free': amount, 'Lock': 0.0} for coin, amount in self.wallet.items()}
+        return {'Success': True, 'ErrMsg': '', 'SpotWallet': wallet}
+
+    def pending(self) -> list[dict]:
+        return [o for o in self.orders if o['Status'] == 'PENDING']
+
+    def pending_count(self) -> dict:
+        with self.lock:
+            pending = self.pending()
+        if not pending:
+            return {'Success': False, 'ErrMsg': 'no pending order under this account', 'TotalPending': 0, 'OrderPairs': {}}
+        return {'Success': True, 'ErrMsg': '', 'TotalPending': len(pending), 'OrderPairs': dict(Counter(o['Pair'] for o in pending))}
+
+    def place_order(self, params: dict) -> dict:
+        pair = params.get('pair', '')
+        side = params.get('side', '').upper()
+        order_type = params.get('type', 'MARKET').upper()
+        info = self.trade_pairs.get(pair)
+        if info is None:
+            return {'Success': False, 'ErrMsg': f'pair {pair} not found'}
+        if side not in ('BUY', 'SELL'):
+            return {'Success': False, 'ErrMsg': f'invalid side {side}'}
+        try:
+            quantity = float(params['quantity'])
+        except (KeyError, ValueError):
+            return {'Success': False, 'ErrMsg': 'invalid quantity'}
+        # deltas of rounded amounts carry float noise like 0.30000000000000004
+        if quantity <= 0 or abs(round(quantity, info['AmountPrecision']) - quantity) > 1e-9:
+            return {'Success': False, 'ErrMsg': f'quantity step size error: {quantity}'}
+        quantity = round(quantity, info['AmountPrecision'])
+
+        coin = info['Coin']
+        price = self.last_price(coin)
+        if order_type == 'LIMIT':
+            try:
+                price = float(params['price'])
+            except (KeyError, ValueError):
+                return {'Success': False, 'ErrMsg': 'LIMIT orders require a price'}
+        value = quantity * price
+        if value < info['MiniOrder']:
+            return {'Success': False, 'ErrMsg': f'order value {value:.4f} below MiniOrder {info["MiniOrder"]}'}
+
+        now_ms = int(current_time() * 1000)
+        with self.lock:
+            commission = value * self.config.commission if order_type == 'MARKET' else 0.0
+            if order_type == 'MARKET':
+                if side == 'BUY' and self.wallet.get('USD', 0.0) < value + commission:
+                    return {'Success': False, 'ErrMsg': 'insufficient balance'}
+                if side == 'SELL' and self.wallet.get(coin, 0.0) < quantity:
+                    return {'Success': False, 'ErrMsg': 'insufficient balance'}
+                sign = 1 if side == 'BUY' else -1
+                self.wallet[coin] = self.wallet.get(coin, 0.0) + sign * quantity
+                self.wallet['USD'] = self.wallet.get('USD', 0.0) - sign * value - commission
+            order = {
+                'Pair': pair, 'OrderID': self._next_order_id, 'Status': 'FILLED' if order_type == 'MARKET' else 'PENDING',
+                'Role': 'TAKER' if order_type == 'MARKET' else 'MAKER', 'ServerTimeUsage': 0.0,
+                'CreateTimestamp': now_ms, 'FinishTimestamp': now_ms if order_type == 'MARKET' else 0,
+                'Side': side, 'Type': order_type, 'StopType': 'GTC', 'Price': price, 'Quantity': quantity,
+                'FilledQuantity': quantity if order_type == 'MARKET' else 0.0,
+                'FilledAverPrice': price if order_type == 'MARKET' else 0.0,
+                'CoinChange': quantity if order_type == 'MARKET' else 0.0,
+                'UnitChange': value if order_type == 'MARKET' else 0.0,
+                'CommissionCoin': 'USD', 'CommissionChargeValue': commission,
+                'CommissionPercent': self.config.commission, 'OrderWalletType': 'SPOT', 'OrderSource': 'PUBLIC_API',
+            }
+            self._next_order_id += 1
+            self.orders.append(order)
+        return {'Success': True, 'ErrMsg': '', 'OrderDetail': order}
+
+    def query_order(self, params: dict) -> dict:
+        with self.lock:
+            orders = list(self.orders)
+        if 'order_id' in params:
+            orders = [o for o in orders if str(o['OrderID']) == params['order_id']]
+        elif 'pair' in params:
+            orders = [o for o in orders if o['Pair'] == params['pair']]
+            if params.get('pending_only') == 'TRUE':
+                orders = [o for o in orders if o['Status'] == 'PENDING']
+        if not orders:
+            return {'Success': False, 'ErrMsg': 'no order matched'}
+        return {'Success': True, 'ErrMsg': '', 'OrderMatched': orders}
+
+    def cancel_order(self, params: dict) -> dict:
+        with self.lock:
+            cancelled = []
+            for o in self.pending():
+                if ('order_id' in params and str(o['OrderID']) != params['order_id']) or ('pair' in params and o['Pair'] != params['pair']):
+                    continue
+                o['Status'] = 'CANCELED'
+                cancelled.append(o['OrderID'])
+        if not cancelled:
+            return {'Success': False, 'ErrMsg': 'no pending order matched'}
+        return {'Success': True, 'ErrMsg': '', 'CanceledList': cancelled}
+
+
+def _sign(secret: str, params: dict) -> str:
+    total_params = '&'.join(f'{k}={params[k]}' for k in sorted(params))
+    return hmac.new(secret.encode('utf-8'), total_params.encode('utf-8'), hashlib.sha256).hexdigest()
+
+
+class MockServer:
+    """ThreadingHTTPServer around a MockExchange; start() serves from a daemon thread."""
+
+    def __init__(self, config: MockConfig | None = None) -> None:
+        self.config = config or MockConfig()
+        if self.config.api_key is None:
+            self.config.api_key = os.getenv('ROOSTOO_API_KEY')
+        if self.config.secret_key is None:
+            self.config.secret_key = os.getenv('ROOSTOO_API_SECRET')
+        if self.config.fetcher_api_key is None:
+            self.config.fetcher_api_key = os.getenv('DO_FETCHER_API_KEY')
+        self.exchange = MockExchange(self.config)
+        self.bucket = TokenBucket(self.config.rate_limit, self.config.burst)
+        self.random = random.Random(self.config.seed)
+        self.stats: Counter = Counter()
+        self.stats_lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer((self.config.host, self.config.port), self._handler())
+        self.httpd.daemon_threads = True
+        self._thread: threading.Thread | None = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def start(self) -> 'MockServer':
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name='mock-server', daemon=True)
+        self._thread.start()
+        logger.info(f'Mock Roostoo/fetcher server at {self.url}')
+        return self
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def count(self, path: str, outcome: str) -> None:
+        with self.stats_lock:
+            self.stats[f'{path} {outcome}'] += 1
+
+    def _verify(self, headers, params: dict) -> str | None:
+        """Error message for a badly signed request, None when it is valid."""
+        if not self.config.secret_key:
+            return None
+        if headers.get('RST-API-KEY') != self.config.api_key:
+            return 'invalid api key'
+        signature = headers.get('MSG-SIGNATURE', '')
+        if not hmac.compare_digest(signature, _sign(self.config.secret_key, params)):
+            return 'signature mismatch'
+        try:
+            if abs(int(params.get('timestamp', 0)) - time.time() * 1000) > TIMESTAMP_WINDOW_MS:
+                return 'timestamp outside the allowed window'
+        except ValueError:
+            return 'invalid timestamp'
+        return None
+
+    def route(self, method: str, path: str, params: dict, headers) -> tuple[int, object]:
+        exchange = self.exchange
+        if path in SIGNED_ENDPOINTS:
+            error = self._verify(headers, params)
+            if error:
+                return 401, {'Success': False, 'ErrMsg': error}
+        elif path in SERIES_ENDPOINTS or path in ('/last-price', '/ohlcv-close'):
+            if self.config.fetcher_api_key and headers.get('X-API-Key') != self.config.fetcher_api_key:
+                return 401, {'detail': 'invalid api key'}
+
+        if path == '/v3/serverTime':
+            return 200, {'ServerTime': int(time.time() * 1000)}
+        if path == '/v3/exchangeInfo':
+            return 200, {'IsRunning': True, 'InitialWallet': {'USD': self.config.balance}, 'TradePairs': exchange.trade_pairs}
+        if path == '/v3/ticker':
+            return 200, exchange.ticker(params.get('pair'))
+        if path == '/v3/balance':
+            return 200, exchange.balance()
+        if path == '/v3/pending_count':
+            return 200, exchange.pending_count()
+        if path == '/v3/place_order' and method == 'POST':
+            return 200, exchange.place_order(params)
+        if path == '/v3/query_order' and method == 'POST':
+            return 200, exchange.query_order(params)
+        if path == '/v3/cancel_order' and method == 'POST':
+            return 200, exchange.cancel_order(params)
+
+        symbol = params.get('symbol', '')
+        try:
+            if path in SERIES_ENDPOINTS:
+                t, value = exchange.series(SERIES_ENDPOINTS[path], symbol, params.get('timeframe', '1h'))
+                if 'since_ms' in params:
+                    keep = t * 1000 >= int(params['since_ms'])
+                    t, value = t[keep], value[keep]
+                return 200, [{'t': int(a), 'value': float(b)} for a, b in zip(t, value)]
+            if path == '/last-price':
+                return 200, {'last': exchange.last_price(symbol)}
+            if path == '/ohlcv-close':
+                t, close = exchange.series('close', symbol, params.get('timeframe', '1h'))
+                pos = int(np.searchsorted(t * 1000, int(params.get('since_ms', 0))))
+                if pos == len(t):
+                    return 404, {'detail': 'no bar at or after since_ms'}
+                return 200, {'close': float(close[pos])}
+        except FileNotFoundError as e:
+            return 404, {'detail': str(e)}
+        return 404, {'detail': f'unknown endpoint {method} {path}'}
+
+    def _handler(self) -> type[BaseHTTPRequestHandler]:
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def _serve(self, method: str) -> None:
+                url = urlsplit(self.path)
+                params = dict(parse_qsl(url.query, keep_blank_values=True))
+                if method == 'POST':
+                    body = self.rfile.read(int(self.headers.get('Content-Length', 0) or 0)).decode('utf-8')
+                    params.update(parse_qsl(body, keep_blank_values=True))
+
+                config = server.config
+                if url.path == '/mock/stats':
+                    # answered directly, the stats must not skew themselves
+                    with server.stats_lock:
+                        self._reply(200, dict(server.stats))
+                    return
+                if config.latency or config.jitter:
+                    time.sleep(config.latency + server.random.uniform(0, config.jitter))
+                if not server.bucket.allow():
+                    status, payload = 429, {'Success': False, 'ErrMsg': 'rate limit exceeded'}
+                    server.count(url.path, 'throttled')
+                elif config.error_rate and server.random.random() < config.error_rate:
+                    status, payload = 500, {'Success': False, 'ErrMsg': 'injected error'}
+                    server.count(url.path, 'error')
+                else:
+                    status, payload = server.route(method, url.path, params, self.headers)
+                    server.count(url.path, str(status))
+                self._reply(status, payload)
+
+            def _reply(self, status: int, payload: object) -> None:
+                body = json.dumps(payload).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self) -> None:
+                self._serve('GET')
+
+            def do_POST(self) -> None:
+                self._serve('POST')
+
+            def log_message(self, format, *args) -> None:
+                pass
+
+        return Handler
+
+
+def main() -> None:
+    defaults = MockConfig()
+    parser = argparse.ArgumentParser(description='Local mock of the Roostoo API and the remote factor fetcher')
+    parser.add_argument('--host', default=defaults.host)
+    parser.add_argument('--port', type=int, default=defaults.port)
+    parser.add_argument('--data-folder', default=defaults.data_folder, help='user_data folder holding data/ with the cached series')
+    parser.add_argument('--config-file', help='df_final-style file whose symbols are listed (default <data-folder>/data/df_final.csv)')
+    parser.add_argument('--latency', type=float, default=defaults.latency, help='seconds added to every response')
+    parser.add_argument('--jitter', type=float, default=defaults.jitter, help='up to this many more seconds, uniformly')
+    parser.add_argument('--error-rate', type=float, default=defaults.error_rate, help='fraction of requests answered with HTTP 500')
+    parser.add_argument('--rate-limit', type=float, default=defaults.rate_limit, help='requests per second before HTTP 429 (0 = off)')
+    parser.add_argument('--burst', type=int, default=defaults.burst)
+    parser.add_argument('--balance', type=float, default=defaults.balance, help='initial USD of the account')
+    parser.add_argument('--extend', action='store_true', help='continue the series as a random walk up to the current bar')
+    parser.add_argument('--seed', type=int, default=defaults.seed)
+    args = parser.parse_args()
+
+    server = MockServer(MockConfig(**vars(args)))
+    logger.info(f'Serving the mock Roostoo/fetcher API at {server.url} (Ctrl+C to stop)')
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+
+
+if __name__ == '__main__':
+    main()
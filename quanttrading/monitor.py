@@ -2,10 +2,11 @@ from quanttrading.log import init_logger
 import os
 import pandas as pd
 from datetime import datetime, timezone
-import numpy as np
 from quanttrading.strategies import BaseStrat
 from quanttrading import tg
+from quanttrading import metrics
 from quanttrading.binance_fetcher import BinanceFetcher
+from quanttrading.csv_log import CsvLogFile
 
 
 logger = init_logger('monitor')
@@ -15,28 +16,16 @@ class Monitor:
         self.user_data_folder = 'user_data'
         self.csv_folder = f'{self.user_data_folder}/monitor'
         os.makedirs(self.csv_folder, exist_ok=True)
+        self._csv_logs: dict[str, CsvLogFile] = {}
         
     def _log_to_csv(self, df: pd.DataFrame, file_path: str) -> bool:
-        if not os.path.exists(file_path):
-            df.to_csv(file_path)
-            return True
-        else:
-            old_df = pd.read_csv(file_path, index_col=0)
-            if not old_df.empty:
-                # Align columns and compare last row (ignore index)
-                all_cols = sorted(set(old_df.columns) | set(df.columns))
-                last_old = old_df.tail(1).reindex(columns=all_cols)
-                new_row = df.tail(1).reindex(columns=all_cols)
-                try:
-                    old_vals = last_old.to_numpy(dtype=float)
-                    new_vals = new_row.to_numpy(dtype=float)
-                    if np.allclose(old_vals, new_vals, rtol=1e-9, atol=1e-12, equal_nan=True):
-                        return False
-                except Exception:
-                    if last_old.equals(new_row):
-                        return False
-            combined_df = pd.concat([old_df, df])
-            combined_df.to_csv(file_path)
+        with metrics.span('monitor_write', file=os.path.basename(file_path)):
+            log_file = self._csv_logs.get(file_path)
+            if log_file is None:
+                log_file = self._csv_logs[file_path] = CsvLogFile(file_path)
+            if log_file.is_duplicate(df):
+                return False
+            log_file.append(df)
             return True
             
     def _flatten_signals(self, signals: dict[tuple, float]) -> dict[str, float]:
@@ -262,32 +251,9 @@ class Monitor:
         return '\n'.join(lines)
 
     def _send_tg_message_chunked(self, message: str, max_len: int = 4000) -> None:
-        if len(message) <= max_len:
-            tg.send_message(message)
-            return
-        # Split by lines and build chunks
-        lines = message.split('\n')
-        chunk = ''
-        for line in lines:
-            # +1 for newline when re-joining
-            to_add = (line + '\n')
-            if len(chunk) + len(to_add) > max_len:
-                if chunk:
-                    tg.send_message(chunk.rstrip('\n'))
-                    chunk = ''
-                # If single line itself is longer than max, hard-split
-                if len(to_add) > max_len:
-                    start = 0
-                    while start < len(to_add):
-                        part = to_add[start:start+max_len]
-                        tg.send_message(part.rstrip('\n'))
-                        start += max_len
-                else:
-                    chunk = to_add
-            else:
-                chunk += to_add
-        if chunk:
-            tg.send_message(chunk.rstrip('\n'))
+        # The notifier batches in the background; splitting here keeps each report on its own messages
+        for chunk in tg.split_message(message, max_len):
+            tg.send_message(chunk)
 
     def send_weighted_by_strategy(self, signals: dict[tuple, float], strats: list[BaseStrat]) -> None:
         grouped = self.compute_weighted_by_strategy(signals, strats)
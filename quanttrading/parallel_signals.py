@@ -0,0 +1,116 @@
+import multiprocessing
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from quanttrading.strategies import BaseStrat
+from quanttrading.log import init_logger
+from quanttrading import metrics
+
+
+logger = init_logger('parallel')
+
+
+def _compute_shard(path: str, tasks: list[tuple[int, BaseStrat, int, int]]) -> tuple[list[tuple[int, np.ndarray]], float, int]:
+    """Worker: computes the signal matrices of one shard of strategies.
+
+    Factor values are memory-mapped from the parent's block file, not
+    pickled; only the (small, int8) signal matrices travel back.
+    """
+    start = time.perf_counter()
+    buffer = np.memmap(path, dtype=np.float64, mode='r')
+    results = []
+    for i, strat, offset, length in tasks:
+        df = pd.DataFrame({'value': buffer[offset:offset + length]}, copy=False)
+        results.append((i, strat.calculate_signal_matrix(df)))
+    return results, time.perf_counter() - start, os.getpid()
+
+
+class ParallelSignalEngine:
+    """
+    Computes full-history strategy signals on a pool of worker processes.
+
+    The parent loads every factor series (through the shared fetcher) and
+    copies the values into one memory-mapped block (under /dev/shm when
+    available); workers get a shard of strategies plus offsets into that
+    block. Signal matrices come back to
+    the parent, which keeps every side effect (signal CSVs, Telegram
+    updates, logging of the aggregated signal) and returns the same
+    {strat_key: signal} dict as position_engine.calculate_signals, in
+    strategy order.
+
+    Strategies in incremental mode are cheap per bar and are evaluated in
+    the parent as usual.
+    """
+
+    def __init__(self, max_workers: int | None = None) -> None:
+        self.max_workers = max_workers or os.cpu_count() or 1
+        # Workers are forked, and all of them right away: trade.py is a plain script that
+        # spawn/forkserver would re-run in every worker, and forking later would copy
+        # the notifier and fetcher threads' locks. Create the engine before those start.
+        self.executor = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=multiprocessing.get_context('fork'))
+        self.executor.submit(os.getpid).result()
+
+    def _shard(self, tasks: list[tuple[int, BaseStrat, int, int]]) -> list[list[tuple[int, BaseStrat, int, int]]]:
+        """Greedy longest-first split of tasks into max_workers shards of similar cost."""
+        def cost(task):
+            _, strat, _, length = task
+            return length * len(strat.param_sets)
+
+        shards: list[list] = [[] for _ in range(min(self.max_workers, len(tasks)))]
+        loads = [0] * len(shards)
+        for task in sorted(tasks, key=cost, reverse=True):
+            k = loads.index(min(loads))
+            shards[k].append(task)
+            loads[k] += cost(task)
+        return shards
+
+    def calculate_signals(self, strats: list[BaseStrat]) -> dict[tuple, float]:
+        start = time.perf_counter()
+        signals: dict[tuple, float] = {}
+        full = [(i, strat) for i, strat in enumerate(strats) if not strat.incremental]
+        dfs = {i: strat.fetch_alpha() for i, strat in full}
+
+        matrices: dict[int, np.ndarray] = {}
+        if full:
+            total = sum(len(df) for df in dfs.values())
+            # RAM-backed where available, so the "file" is just shared pages
+            fd, path = tempfile.mkstemp(prefix='factors_', suffix='.f64', dir='/dev/shm' if os.path.isdir('/dev/shm') else None)
+            os.close(fd)
+            try:
+                buffer = np.memmap(path, dtype=np.float64, mode='w+', shape=(max(total, 1),))
+                tasks = []
+                offset = 0
+                for i, strat in full:
+                    values = dfs[i]['value'].to_numpy(dtype=float)
+                    buffer[offset:offset + len(values)] = values
+                    tasks.append((i, strat, offset, len(values)))
+                    offset += len(values)
+                buffer.flush()
+                del buffer
+
+                futures = [self.executor.submit(_compute_shard, path, shard) for shard in self._shard(tasks)]
+                for future in futures:
+                    results, elapsed, pid = future.result()
+                    matrices.update(results)
+                    logger.info(f'Worker {pid} computed {len(results)} strategies in {elapsed:.3f}s')
+            finally:
+                os.remove(path)
+
+        # side effects and the result dict stay in strategy order
+        for i, strat in enumerate(strats):
+            with metrics.span('signal', strategy=strat.strat_name):
+                if i in matrices:
+                    df = strat.calculate_agg_signal_df(dfs[i], matrices[i])
+                    signals[strat.strat_key] = df['signal'].iloc[-1]
+                else:
+                    signals[strat.strat_key] = strat.generate_signal()
+        logger.info(f'Calculated {len(strats)} signals ({len(matrices)} on {self.max_workers} workers) in {time.perf_counter() - start:.3f}s')
+        return signals
+
+    def shutdown(self) -> None:
+        self.executor.shutdown()
@@ -0,0 +1,109 @@
+import hashlib
+import pickle
+from dataclasses import dataclass, field
+from typing import Any, Callable
+
+from quanttrading.log import init_logger
+from quanttrading import metrics
+
+
+logger = init_logger('pipeline')
+
+
+def fingerprint(value: Any) -> str:
+    """Content hash of a stage input or output (dicts, tuples, floats, DataFrames...)."""
+    return hashlib.blake2b(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL), digest_size=16).hexdigest()
+
+
+@dataclass
+class Stage:
+    name: str
+    fn: Callable[..., Any]
+    inputs: list[str]
+    # values passed to the stage that do not make it dirty when they change
+    reads: list[str] = field(default_factory=list)
+    hits: int = 0
+    misses: int = 0
+    # fingerprints of the inputs the cached value was computed from
+    input_fingerprints: dict[str, str] | None = None
+    dirty: bool = True
+
+
+@dataclass
+class Pipeline:
+    """
+    Dependency-aware pipeline of named stages.
+
+    Each stage declares the names it reads (external inputs set with
+    set_input, or other stages) and is called with them as keyword
+    arguments; `reads` are passed the same way but never make it dirty.
+    run() re-executes a stage only if it was invalidated or the
+    fingerprint of one of its inputs changed since its last run; otherwise
+    the cached result is returned and counted as a hit.
+    """
+
+    stages: dict[str, Stage] = field(default_factory=dict)
+    values: dict[str, Any] = field(default_factory=dict)
+    fingerprints: dict[str, str] = field(default_factory=dict)
+
+    def add_stage(self, name: str, fn: Callable[..., Any], inputs: list[str] | None = None,
+                  reads: list[str] | None = None) -> None:
+        if name in self.stages or name in self.values:
+            raise ValueError(f'Duplicate pipeline name: {name}')
+        for input_name in inputs or []:
+            if input_name not in self.stages and input_name not in self.values:
+                raise ValueError(f'Stage {name} depends on unknown input {input_name}')
+        for read_name in reads or []:
+            if read_name in self.stages or read_name not in self.values:
+                raise ValueError(f'Stage {name} reads unknown input {read_name}')
+        self.stages[name] = Stage(name=name, fn=fn, inputs=list(inputs or []), reads=list(reads or []))
+
+    def set_input(self, name: str, value: Any) -> bool:
+        """Sets an external input; returns True if its content changed."""
+        if name in self.stages:
+            raise ValueError(f'{name} is a stage, not an input')
+        fp = fingerprint(value)
+        self.values[name] = value
+        changed = self.fingerprints.get(name) != fp
+        self.fingerprints[name] = fp
+        return changed
+
+    def invalidate(self, name: str) -> None:
+        """Forces a stage to re-execute on its next run, e.g. to retry failed orders."""
+        self.stages[name].dirty = True
+
+    def run(self, *names: str, **context: Any) -> Any:
+        """Brings the given stages (and their inputs) up to date and returns their values.
+
+        `context` (e.g. the cycle timestamp) is passed to every stage that
+        executes but is not part of the inputs, so it never makes a stage
+        dirty. Each stage is evaluated at most once per call.
+        """
+        done: set[str] = set()
+        values = [self._run(name, context, done) for name in names]
+        return values[0] if len(values) == 1 else values
+
+    def _run(self, name: str, context: dict[str, Any], done: set[str]) -> Any:
+        if name not in self.stages or name in done:
+            return self.values[name]
+        stage = self.stages[name]
+        kwargs = {input_name: self._run(input_name, context, done) for input_name in stage.inputs}
+        input_fingerprints = {input_name: self.fingerprints[input_name] for input_name in stage.inputs}
+        done.add(name)
+
+        if not stage.dirty and input_fingerprints == stage.input_fingerprints:
+            stage.hits += 1
+            return self.values[name]
+
+        stage.misses += 1
+        kwargs.update({read_name: self.values[read_name] for read_name in stage.reads})
+        with metrics.span('stage', stage=name):
+            value = stage.fn(**kwargs, **context)
+        self.values[name] = value
+        self.fingerprints[name] = fingerprint(value)
+        stage.input_fingerprints = input_fingerprints
+        stage.dirty = False
+        return value
+
+    def metrics(self) -> dict[str, dict[str, int]]:
+        return {name: {'hits': stage.hits, 'misses': stage.misses} for name, stage in self.stages.items()}
@@ -1,17 +1,40 @@
+import numpy as np
+
 from quanttrading.binance_fetcher import BinanceFetcher
 from quanttrading.strategies import BaseStrat
+from quanttrading.parallel_signals import ParallelSignalEngine
 from quanttrading.symbol_manager import SymbolInfo
 from quanttrading.log import init_logger
+from quanttrading import metrics
 from quanttrading import position_engine
 
 
 logger = init_logger('pos')
 
 
-def calculate_signals(strats: list[BaseStrat]) -> dict[tuple, float]:
+def refresh_factors(strats: list[BaseStrat], binance_fetcher: BinanceFetcher, max_workers: int | None = None) -> dict[tuple, int]:
+    """Refreshes all stale factor series of strats concurrently before signals are computed."""
+    keys = [key for key in (strat.get_factor_key() for strat in strats) if key is not None]
+    return binance_fetcher.refresh_series(keys, max_workers=max_workers)
+
+
+def stale_factors(strats: list[BaseStrat], binance_fetcher: BinanceFetcher) -> list[tuple]:
+    keys = [key for key in (strat.get_factor_key() for strat in strats) if key is not None]
+    return binance_fetcher.stale_series(keys)
+
+
+def factor_versions(strats: list[BaseStrat], binance_fetcher: BinanceFetcher) -> dict[tuple, tuple]:
+    keys = [key for key in (strat.get_factor_key() for strat in strats) if key is not None]
+    return binance_fetcher.series_versions(keys)
+
+
+def calculate_signals(strats: list[BaseStrat], engine: ParallelSignalEngine | None = None) -> dict[tuple, float]:
+    if engine is not None:
+        return engine.calculate_signals(strats)
     signals = {}
     for strat in strats:
-        signal = strat.generate_signal()
+        with metrics.span('signal', strategy=strat.strat_name):
+            signal = strat.generate_signal()
         signals[strat.strat_key] = signal
     return signals
 
@@ -25,6 +48,14 @@ def _calculate_target_amount(signal: float, symbol: str, balance: float, final_w
     return target_amount
 
 
+def calculate_target_amounts(signals: np.ndarray, balance: float, final_weight: float, anchor_price: float, amount_precision: int | None = None) -> np.ndarray:
+    """_calculate_target_amount over a whole signal history (backtests); no rounding if amount_precision is None."""
+    target_amount = np.asarray(signals, dtype=float) * balance * final_weight / anchor_price
+    if amount_precision is not None:
+        target_amount = np.round(target_amount, amount_precision)
+    return target_amount
+
+
 def calculate_target_amount_by_strat(strats: list[BaseStrat], signals: dict[tuple, float], balance: float, symbols_info: dict[str, SymbolInfo]) -> float:
     target_amount_by_strat = {}
     for strat in strats:
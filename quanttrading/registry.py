@@ -0,0 +1,242 @@
+import importlib
+import pkgutil
+from dataclasses import dataclass, field, replace
+
+import pandas as pd
+
+from quanttrading.config_manager import StratConfig, compile_configs, create_config_from_df
+from quanttrading.strategies import BaseStrat
+from quanttrading.log import init_logger
+
+
+logger = init_logger('registry')
+
+# factor_id prefix in df_final.csv (e.g. 'bttp' in 'bttp_bnb') -> strategy class
+STRATEGY_REGISTRY: dict[str, type[BaseStrat]] = {}
+
+
+def register_strategy(prefix: str):
+    """Class decorator mapping the factor_id prefix `prefix` to a strategy class."""
+    def decorator(cls: type[BaseStrat]) -> type[BaseStrat]:
+        registered = STRATEGY_REGISTRY.get(prefix)
+        if registered is not None and registered is not cls:
+            raise ValueError(f'Prefix {prefix} already registered to {registered.__name__}')
+        STRATEGY_REGISTRY[prefix] = cls
+        return cls
+    return decorator
+
+
+def load_user_strategies(package: str = 'user_strategies') -> None:
+    """Imports every module of the strategies package so their @register_strategy decorators run."""
+    module = importlib.import_module(package)
+    for info in pkgutil.iter_modules(module.__path__):
+        importlib.import_module(f'{package}.{info.name}')
+
+
+def get_strategy_class(factor_id: str) -> type[BaseStrat]:
+    prefix = factor_id.rsplit('_', 1)[0]
+    cls = STRATEGY_REGISTRY.get(prefix)
+    if cls is None:
+        raise ValueError(f'No strategy registered for prefix {prefix} (factor_id {factor_id})')
+    return cls
+
+
+def _unpickle_strat(strat: BaseStrat) -> BaseStrat:
+    return strat
+
+
+class LazyStrat:
+    """
+    Stand-in for a strategy that is constructed on first real use.
+
+    The identity attributes the position engine and monitor read for every
+    strategy (key, symbol, weight, ...) come straight from the config; any
+    other attribute access builds the strategy and forwards to it. Pickling
+    a LazyStrat pickles the strategy itself.
+    """
+
+    def __init__(self, cls: type[BaseStrat], config: StratConfig, *args, **kwargs) -> None:
+        self.cls = cls
+        self.config = config
+        self.args = args
+        self.kwargs = kwargs
+        self._strat: BaseStrat | None = None
+        self._incremental: tuple[str, bool] | None = None
+
+        self.id = config.id
+        self.name = config.name
+        self.symbol = config.symbol.split('/')[0]
+        self.timeframe = config.timeframe
+        self.final_weight = config.final_weight
+        self.strat_name = f'{self.id:03d}-{self.name}'
+        self.strat_key = (self.id, self.name, self.symbol, self.timeframe)
+
+    @property
+    def strat(self) -> BaseStrat:
+        if self._strat is None:
+            self._strat = self.cls(self.config, *self.args, **self.kwargs)
+            if self._incremental is not None:
+                state_folder, verify = self._incremental
+                self._strat.enable_incremental(state_folder, verify)
+            logger.debug(f'Constructed {self._strat}')
+        return self._strat
+
+    def reweight(self, config: StratConfig) -> None:
+        """Takes a config that differs only in final_weight; signals and rolling state are kept."""
+        self.config = config
+        self.final_weight = config.final_weight
+        if self._strat is not None:
+            self._strat.config = config
+            self._strat.final_weight = config.final_weight
+
+    @property
+    def is_constructed(self) -> bool:
+        return self._strat is not None
+
+    def get_factor_key(self) -> tuple[str, str, str] | None:
+        if self.cls.factor_prefix is None:
+            return None
+        return (self.cls.factor_prefix, self.symbol, self.timeframe)
+
+    def enable_incremental(self, state_folder: str = 'user_data/state', verify: bool = False) -> None:
+        # recorded and applied on construction; forwarded if already built
+        self._incremental = (state_folder, verify)
+        if self._strat is not None:
+            self._strat.enable_incremental(state_folder, verify)
+
+    @property
+    def incremental(self) -> bool:
+        if self._strat is not None:
+            return self._strat.incremental
+        return self._incremental is not None
+
+    def __getattr__(self, name: str):
+        # only called for attributes not found on the proxy itself
+        if name.startswith('__') or name in ('cls', 'config', 'args', 'kwargs', '_strat', '_incremental'):
+            raise AttributeError(name)
+        return getattr(self.strat, name)
+
+    def __reduce_ex__(self, protocol):
+        return (_unpickle_strat, (self.strat,))
+
+    def __repr__(self):
+        return f'LazyStrat({self.strat_name}, {self.cls.__name__})'
+
+
+def build_strategies(
+    configs: list[StratConfig],
+    *args,
+    drop_zero_weight: bool = True,
+    **kwargs,
+) -> list[LazyStrat]:
+    """Maps every config to its registered class; extra args go to the strategy constructor.
+
+    Zero-weight configs can never hold a position, so they are dropped before
+    anything is built or loaded. Configs keep the ids assigned over the whole
+    file, so signal CSVs and state files keep their names.
+    """
+    strats = []
+    dropped = []
+    for config in configs:
+        if drop_zero_weight and config.final_weight == 0.0:
+            dropped.append(config.name)
+            continue
+        strats.append(LazyStrat(get_strategy_class(config.name), config, *args, **kwargs))
+    if dropped:
+        logger.info(f'Dropped {len(dropped)} zero-weight factors: {dropped}')
+    logger.info(f'Built {len(strats)} strategies from {len(configs)} configs')
+    return strats
+
+
+def build_strategies_from_df(df: pd.DataFrame, *args, drop_zero_weight: bool = True, **kwargs) -> list[LazyStrat]:
+    load_user_strategies()
+    configs, _ = compile_configs(create_config_from_df(df), drop_zero_weight=drop_zero_weight)
+    return build_strategies(configs, *args, drop_zero_weight=drop_zero_weight, **kwargs)
+
+
+def align_ids(configs: list[StratConfig], previous: list[StratConfig]) -> list[StratConfig]:
+    """Gives factors already in `previous` their old id and new factors ids after the largest one.
+
+    Ids are assigned by file position, so inserting a row group would
+    otherwise shift every later id and with it signal CSV and state file names.
+    """
+    old_ids = {c.name: c.id for c in previous}
+    next_id = max(old_ids.values(), default=0) + 1
+    aligned = []
+    for config in configs:
+        if config.name in old_ids:
+            new_id = old_ids[config.name]
+        else:
+            new_id = next_id
+            next_id += 1
+        aligned.append(config if config.id == new_id else replace(config, id=new_id))
+    return aligned
+
+
+@dataclass
+class ReloadReport:
+    added: list[str] = field(default_factory=list)
+    removed: list[str] = field(default_factory=list)
+    rebuilt: list[str] = field(default_factory=list)
+    reweighted: list[str] = field(default_factory=list)
+    unchanged: int = 0
+
+    @property
+    def strategies_changed(self) -> bool:
+        """True if the set of strategies or their signals changed, not just weights."""
+        return bool(self.added or self.removed or self.rebuilt)
+
+    def __str__(self) -> str:
+        return (
+            f'{len(self.added)} added, {len(self.removed)} removed, {len(self.rebuilt)} rebuilt, '
+            f'{len(self.reweighted)} reweighted, {self.unchanged} unchanged'
+        )
+
+
+def reload_strategies(
+    strats: list[LazyStrat],
+    configs: list[StratConfig],
+    *args,
+    drop_zero_weight: bool = True,
+    **kwargs,
+) -> tuple[list[LazyStrat], ReloadReport]:
+    """Builds the strategy list for a changed config, reusing what did not change.
+
+    Factors are matched by name (configs should go through align_ids first).
+    Same config: the strategy is kept as is. Only final_weight differs: kept
+    and reweighted in place, since weights do not enter the signal. Anything
+    else: a new strategy, whose incremental state reseeds if its parameters
+    changed. New strategies inherit the incremental mode of the old ones.
+    The old list is not modified apart from reweighting, which happens only
+    once everything was built, so the caller can swap the returned list in
+    between cycles.
+    """
+    report = ReloadReport()
+    old_by_name = {strat.name: strat for strat in strats}
+    incremental = next((strat._incremental for strat in strats if strat._incremental is not None), None)
+    new_strats = []
+    reweights = []
+    for config in configs:
+        if drop_zero_weight and config.final_weight == 0.0:
+            continue
+        old = old_by_name.pop(config.name, None)
+        if old is not None and old.config == config:
+            report.unchanged += 1
+            new_strats.append(old)
+            continue
+        if old is not None and replace(old.config, final_weight=config.final_weight) == config:
+            reweights.append((old, config))
+            report.reweighted.append(config.name)
+            new_strats.append(old)
+            continue
+        strat = LazyStrat(get_strategy_class(config.name), config, *args, **kwargs)
+        if incremental is not None:
+            strat.enable_incremental(*incremental)
+        (report.rebuilt if old is not None else report.added).append(config.name)
+        new_strats.append(strat)
+    # applied last, so a failure above leaves the running strategies untouched
+    for strat, config in reweights:
+        strat.reweight(config)
+    report.removed = list(old_by_name)
+    logger.info(f'Reloaded strategies: {report}')
+    return new_strats, report
@@ -0,0 +1,421 @@
+"""
+Replays the live trading loop over historical bars on a virtual clock.
+
+The loop of trade.py (TradingLoop: strategies, position engine, Monitor,
+pipeline, BarCloseScheduler) runs unchanged, but time comes from a
+VirtualClock that jumps to the next wake-up instead of sleeping. Bars are
+served from user_data/data up to the virtual now and enter through the
+regular refresh path (freshness check, fetch, unclosed-bar removal, merge,
+.bin append), so the incremental signals and the stage caches are exercised
+as they are live. Orders fill at once at the last closed bar's close, minus
+CommissionPercent, against a simulated wallet.
+
+Each run works in its own folder (user_data/replay/<time>/ by default):
+signal stores, incremental state, monitor CSVs and cycle metrics land there
+and Telegram is muted. The summary (throughput in bars per second, cycle
+times at bar close and in between, pipeline hits, fills) is printed and
+written to replay.json; --baseline compares it with an earlier run.
+
+Usage:
+    python -m quanttrading.replay [--days 30 | --start 2025-11-01 --end 2025-12-01]
+        [--verify] [--light-interval 300] [--baseline old/replay.json] [--verbose]
+"""
+
+import argparse
+import contextlib
+import json
+import logging
+import os
+import statistics
+import sys
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+from quanttrading import config_manager, registry, roostoo, tg
+from quanttrading.backtest import CLOSE_PREFIX
+from quanttrading.binance_fetcher import BinanceFetcher
+from quanttrading.factor_store import FactorSeries, FactorStore
+from quanttrading.helper import current_time, last_bar_close, resolution_to_seconds, set_clock
+from quanttrading.mock_server import SERIES_ENDPOINTS, MockConfig, MockExchange
+from quanttrading.monitor import Monitor
+from quanttrading.series_storage import RecordFile, binary_path, to_records
+from quanttrading.trading_loop import TradingLoop
+from quanttrading.log import init_logger
+
+
+logger = init_logger('replay')
+
+# A run is flagged when its bars/s fall more than this below the baseline's
+REGRESSION_THRESHOLD = 0.2
+
+
+class VirtualClock:
+    """Epoch seconds that only advance through sleep()."""
+
+    def __init__(self, now: float) -> None:
+        self.now = float(now)
+
+    def __call__(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float) -> None:
+        self.now += max(0.0, seconds)
+
+
+class ReplayFetcher(BinanceFetcher):
+    """
+    BinanceFetcher whose remote fetcher is the local history up to the virtual clock.
+
+    A series starts out as the bars of `source_folder` closed at the time of
+    first use, copied into this fetcher's folder. Later bars are served by
+    the remote endpoints, including the bar in progress like the real
+    fetcher, so they go through the normal refresh and merge code.
+    """
+
+    def __init__(self, source_folder: str, folder: str = 'user_data') -> None:
+        super().__init__(folder=folder, store=FactorStore())
+        self.source = BinanceFetcher(folder=source_folder, store=FactorStore())
+
+    def history(self, filename_prefix: str, symbol_short: str, timeframe: str = '1h') -> FactorSeries:
+        return self.source._get_cached_series(filename_prefix, symbol_short, timeframe)
+
+    def _read_series(self, filepath: str) -> FactorSeries:
+        if not os.path.exists(binary_path(filepath)):
+            filename_prefix, symbol_short, timeframe = os.path.splitext(os.path.basename(filepath))[0].rsplit('_', 2)
+            history = self.history(filename_prefix, symbol_short, timeframe)
+            n_closed = int(np.searchsorted(history.t, last_bar_close(current_time(), timeframe)))
+            RecordFile(binary_path(filepath)).write(to_records(history.t[:n_closed], history.value[:n_closed]))
+        return super()._read_series(filepath)
+
+    def _fetch_series_remote(self, endpoint: str, params: dict, alert_prefix: str) -> pd.DataFrame:
+        history = self.history(SERIES_ENDPOINTS[endpoint], params['symbol'], params['timeframe'])
+        start = int(np.searchsorted(history.t * 1000, int(params.get('since_ms', 0))))
+        end = int(np.searchsorted(history.t, current_time(), side='right'))
+        t = history.t[start:end]
+        index = pd.DatetimeIndex(pd.to_datetime(t, unit='s'), name='ts')
+        return pd.DataFrame({'t': t, 'value': history.value[start:end]}, index=index)
+
+    def close_at(self, coin: str) -> float:
+        """Close of the last bar closed at the virtual now."""
+        history = self.history(CLOSE_PREFIX, coin, '1h')
+        pos = int(np.searchsorted(history.t, last_bar_close(current_time(), '1h'))) - 1
+        if pos < 0:
+            raise ValueError(f'No close of {coin} before {datetime.fromtimestamp(current_time(), tz=timezone.utc)}')
+        return float(history.value[pos])
+
+    def fetch_last_price(self, symbol: str) -> float:
+        return self.close_at(symbol.split('/')[0].strip())
+
+    def fetch_anchor_close_price(self, symbol: str, start: str) -> float:
+        history = self.history(CLOSE_PREFIX, symbol.split('/')[0].strip(), '1h')
+        pos = int(np.searchsorted(history.t, pd.to_datetime(start).timestamp()))
+        if pos == len(history):
+            raise ValueError(f'No close of {symbol} at or after {start}')
+        return float(history.value[pos])
+
+
+class ReplayExchange(MockExchange):
+    """MockExchange priced at the virtual clock, called in-process through the roostoo client's interface."""
+
+    def __init__(self, fetcher: ReplayFetcher, balance: float, commission: float) -> None:
+        super().__init__(MockConfig(data_folder=fetcher.source.user_data_folder, balance=balance, commission=commission))
+        self.replay_fetcher = fetcher
+
+    def last_price(self, coin: str) -> float:
+        return self.replay_fetcher.close_at(coin)
+
+    def get_exchange_info_cached(self) -> dict:
+        return {'IsRunning': True, 'TradePairs': self.trade_pairs}
+
+    def get_current_postions(self) -> dict[str, float]:
+        with self.lock:
+            return dict(self.wallet)
+
+    def get_last_prices(self) -> dict[str, float]:
+        last_prices = {}
+        for info in self.trade_pairs.values():
+            try:
+                last_prices[info['Coin']] = self.last_price(info['Coin'])
+            except (ValueError, FileNotFoundError):
+                # not yet listed at the virtual now, or listed without a close series
+                continue
+        return last_prices
+
+    def trade(
+        self,
+        amount_by_symbol: dict[str, float],
+        binance_fetcher: BinanceFetcher,
+        last_prices: dict[str, float] | None = None,
+    ) -> tuple[list[dict], list[dict]]:
+        """roostoo.trade() without the requests: orders below MIN_ORDER_USD are skipped, sells go before buys."""
+        sells, buys = [], []
+        for symbol, amount in amount_by_symbol.items():
+            if amount == 0.0 or symbol == 'USD':
+                continue
+            if last_prices is not None and symbol in last_prices:
+                last_price = last_prices[symbol]
+            else:
+                last_price = binance_fetcher.fetch_last_price(symbol)
+            if abs(amount) * last_price < roostoo.MIN_ORDER_USD:
+                continue
+            if amount > 0:
+                buys.append({'pair': f'{symbol}/USD', 'side': 'BUY', 'type': 'MARKET', 'quantity': str(amount)})
+            else:
+                sells.append({'pair': f'{symbol}/USD', 'side': 'SELL', 'type': 'MARKET', 'quantity': str(-amount)})
+
+        success_trades, error_trades = [], []
+        for params in sells + buys:
+            response = self.place_order(params)
+            response['LatencyMs'] = 0.0
+            response['RateLimitWaitMs'] = 0.0
+            (success_trades if response['Success'] else error_trades).append(response)
+        return success_trades, error_trades
+
+    def equity(self) -> float:
+        """Wallet value in USD at the last closed bar."""
+        last_prices = self.get_last_prices()
+        with self.lock:
+            return sum(amount if coin == 'USD' else amount * last_prices.get(coin, 0.0) for coin, amount in self.wallet.items())
+
+
+class LogCounter(logging.Handler):
+    """Counts warnings and errors logged during a replay and keeps the first few."""
+
+    def __init__(self, keep: int = 20) -> None:
+        super().__init__(level=logging.WARNING)
+        self.keep = keep
+        self.counts = {'WARNING': 0, 'ERROR': 0}
+        self.first: list[str] = []
+
+    def emit(self, record: logging.LogRecord) -> None:
+        level = 'ERROR' if record.levelno >= logging.ERROR else 'WARNING'
+        self.counts[level] += 1
+        if len(self.first) < self.keep:
+            self.first.append(f'{record.levelname} {record.name}: {record.getMessage()}')
+
+
+def required_series(file_name: str, fetcher: BinanceFetcher) -> set[tuple[str, str, str]]:
+    """(prefix, symbol, timeframe) of every factor and close series the config's strategies read."""
+    configs, _ = config_manager.load_compiled_configs(file_name)
+    keys = set()
+    for strat in registry.build_strategies(configs, fetcher):
+        keys.add((CLOSE_PREFIX, strat.symbol, '1h'))
+        if strat.get_factor_key() is not None:
+            keys.add(strat.get_factor_key())
+    return keys
+
+
+def missing_series(file_name: str, fetcher: BinanceFetcher) -> list[str]:
+    """Paths of the required series that have neither a CSV nor a .bin in the fetcher's data folder."""
+    missing = []
+    for key in sorted(required_series(file_name, fetcher)):
+        path = fetcher._get_series_path(*key)
+        if not os.path.exists(path) and not os.path.exists(binary_path(path)):
+            missing.append(path)
+    return missing
+
+
+def default_end(file_name: str, fetcher: ReplayFetcher) -> float:
+    """Close time of the latest bar that every factor and close series of the config has."""
+    keys = required_series(file_name, fetcher.source)
+    return min(fetcher.history(*key).last_t + resolution_to_seconds(key[2]) for key in keys)
+
+
+def percentiles(values: list[float]) -> dict[str, float]:
+    if not values:
+        return {'count': 0}
+    values = sorted(values)
+    return {
+        'count': len(values),
+        'p50_ms': round(statistics.median(values), 3),
+        'p95_ms': round(values[min(len(values) - 1, int(0.95 * len(values)))], 3),
+        'max_ms': round(values[-1], 3),
+    }
+
+
+def replay(
+    file_name: str,
+    source_folder: str,
+    workdir: str,
+    start: float | None = None,
+    end: float | None = None,
+    days: float = 30,
+    balance: float = 100000,
+    max_leverage: float = 0.99,
+    commission: float = 0.001,
+    verify: bool = False,
+    bar_close_delay: float = 2.0,
+    light_interval: float = 300.0,
+    verbose: bool = False,
+) -> dict:
+    """Runs TradingLoop from start to end on a virtual clock inside workdir; returns the summary."""
+    file_name, source_folder = os.path.abspath(file_name), os.path.abspath(source_folder)
+    # imported before leaving the repository folder, which may be how they are found
+    registry.load_user_strategies()
+    missing = missing_series(file_name, BinanceFetcher(folder=source_folder, store=FactorStore()))
+    if missing:
+        raise FileNotFoundError(
+            f'Replay needs {len(missing)} series missing from {source_folder}/data: {", ".join(os.path.basename(p) for p in missing)}. '
+            'Close prices can be filled with `python -m quanttrading.backtest --fetch-closes`; '
+            'factor series come from the remote fetcher.'
+        )
+
+    os.makedirs(workdir, exist_ok=True)
+    if os.listdir(workdir):
+        raise ValueError(f'Replay folder {workdir} is not empty')
+    cwd = os.getcwd()
+    clock = VirtualClock(0)
+    counter = LogCounter()
+    loggers = [l for l in logging.Logger.manager.loggerDict.values() if isinstance(l, logging.Logger)]
+    levels = [l.level for l in loggers]
+    logging.getLogger().addHandler(counter)
+    tg_enabled, tg.notifier.enabled = tg.notifier.enabled, False
+    os.chdir(workdir)
+    try:
+        if not verbose:
+            for l in loggers:
+                l.setLevel(logging.WARNING)
+        with open('replay.out', 'w') as out, contextlib.redirect_stdout(sys.stdout if verbose else out):
+            fetcher = ReplayFetcher(source_folder)
+            if end is None:
+                end = default_end(file_name, fetcher)
+            if start is None:
+                start = end - days * 86400
+            if start >= end:
+                raise ValueError(f'Replay start {start} is not before its end {end}')
+            clock.now = start
+            set_clock(clock)
+
+            exchange = ReplayExchange(fetcher, balance, commission)
+            loop = TradingLoop(
+                file_name,
+                fetcher,
+                Monitor(),
+                exchange=exchange,
+                balance=balance,
+                max_leverage=max_leverage,
+                incremental=True,
+                verify_incremental=verify,
+                config_reload=False,
+                bar_close_delay=bar_close_delay,
+                light_interval=light_interval,
+                clock=clock,
+                sleep=clock.sleep,
+                echo=print if verbose else (lambda *args, **kwargs: None),
+            )
+
+            # the first cycle seeds the incremental state from the whole history; it is reported on its own
+            first = loop.first_cycle()['elapsed_ms']
+            wall_start = time.perf_counter()
+            bar_cycles, light_cycles = [], []
+            while loop.scheduler.next_wakeup(clock())[0] <= end:
+                at_bar_close, record = loop.next_cycle()
+                (bar_cycles if at_bar_close else light_cycles).append(record['elapsed_ms'])
+            wall = time.perf_counter() - wall_start
+    finally:
+        os.chdir(cwd)
+        set_clock(None)
+        tg.notifier.enabled = tg_enabled
+        logging.getLogger().removeHandler(counter)
+        for l, level in zip(loggers, levels):
+            l.setLevel(level)
+
+    orders = exchange.orders
+    summary = {
+        'start': datetime.fromtimestamp(start, tz=timezone.utc).isoformat(),
+        'end': datetime.fromtimestamp(end, tz=timezone.utc).isoformat(),
+        'strategies': len(loop.strats),
+        'bars': len(bar_cycles),
+        'wall_s': round(wall, 3),
+        'bars_per_s': round(len(bar_cycles) / wall, 3) if wall > 0 else None,
+        'first_cycle_ms': first,
+        'bar_cycles': percentiles(bar_cycles),
+        'light_cycles': percentiles(light_cycles),
+        'pipeline': loop.pipeline.metrics(),
+        'orders': len(orders),
+        'commission': round(sum(o['CommissionChargeValue'] for o in orders), 6),
+        'equity': round(exchange.equity(), 2),
+        'telegram_muted': tg.notifier.muted,
+        'log_counts': counter.counts,
+        'log_first': counter.first,
+    }
+    with open(os.path.join(workdir, 'replay.json'), 'w') as f:
+        json.dump(summary, f, indent=1)
+    return summary
+
+
+def compare(summary: dict, baseline: dict, threshold: float = REGRESSION_THRESHOLD) -> bool:
+    """Logs the throughput and cycle times against a baseline run; returns True if bars/s regressed."""
+    ratio = summary['bars_per_s'] / baseline['bars_per_s']
+    logger.info(f"bars/s {baseline['bars_per_s']} -> {summary['bars_per_s']} ({ratio:.2f}x)")
+    for kind in ('bar_cycles', 'light_cycles'):
+        for stat in ('p50_ms', 'p95_ms'):
+            if stat in summary[kind] and stat in baseline[kind]:
+                logger.info(f'{kind} {stat} {baseline[kind][stat]} -> {summary[kind][stat]}')
+    regressed = ratio < 1 - threshold
+    if regressed:
+        logger.error(f'Replay throughput regressed by {1 - ratio:.0%} (threshold {threshold:.0%})')
+    return regressed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Replay the live trading loop over historical bars on a virtual clock.')
+    parser.add_argument('--config', default='user_data/data/df_final.csv')
+    parser.add_argument('--data-folder', default='user_data', help='user_data folder holding data/ with the history')
+    parser.add_argument('--out', help='working folder of the run (default user_data/replay/<time>)')
+    parser.add_argument('--start', help='first cycle, e.g. 2025-11-01; default --days before --end')
+    parser.add_argument('--end', help='default: the last bar every series of the config has')
+    parser.add_argument('--days', type=float, default=30)
+    parser.add_argument('--balance', type=float, default=100000)
+    parser.add_argument('--max-leverage', type=float, default=0.99)
+    parser.add_argument('--commission', type=float, default=MockConfig.commission, help='CommissionPercent of a fill')
+    parser.add_argument('--verify', action='store_true', help='check every incremental signal against a full recompute')
+    parser.add_argument('--bar-close-delay', type=float, default=2.0)
+    parser.add_argument('--light-interval', type=float, default=300.0, help='seconds between light cycles, as LIGHT_CYCLE_INTERVAL')
+    parser.add_argument('--baseline', help='replay.json of an earlier run; exits with 1 if bars/s regressed')
+    parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD)
+    parser.add_argument('--verbose', action='store_true', help='keep the INFO logs and the loop output on the console')
+    args = parser.parse_args()
+
+    def parse_time(value: str | None) -> float | None:
+        return None if value is None else pd.Timestamp(value, tz='UTC').timestamp()
+
+    workdir = args.out or f'user_data/replay/{datetime.now(timezone.utc):%Y%m%d-%H%M%S}'
+    try:
+        summary = replay(
+            args.config,
+            args.data_folder,
+            workdir,
+            start=parse_time(args.start),
+            end=parse_time(args.end),
+            days=args.days,
+            balance=args.balance,
+            max_leverage=args.max_leverage,
+            commission=args.commission,
+            verify=args.verify,
+            bar_close_delay=args.bar_close_delay,
+            light_interval=args.light_interval,
+            verbose=args.verbose,
+        )
+    except FileNotFoundError as e:
+        logger.error(e)
+        sys.exit(1)
+    logger.info(
+        f"Replayed {summary['bars']} bars of {summary['strategies']} strategies ({summary['start']} to {summary['end']}) "
+        f"in {summary['wall_s']:.1f}s: {summary['bars_per_s']} bars/s"
+    )
+    logger.info(f"Bar-close cycles {summary['bar_cycles']}, light cycles {summary['light_cycles']}")
+    logger.info(f"{summary['orders']} orders, commission {summary['commission']:.2f}, equity {summary['equity']:.2f}")
+    logger.info(f"Warnings/errors during the replay: {summary['log_counts']}; summary in {workdir}/replay.json")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            if compare(summary, json.load(f), args.threshold):
+                sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -13,9 +13,13 @@ import hmac
 import hashlib
 from dotenv import load_dotenv
 import os
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
 from quanttrading.log import init_logger
 from quanttrading import tg
-import time
+from quanttrading import metrics
 from quanttrading.binance_fetcher import BinanceFetcher
 
 
@@ -23,10 +27,55 @@ logger = init_logger('roostoo')
 
 # --- API Configuration ---
 load_dotenv()
-BASE_URL = "https://mock-api.roostoo.com"
+BASE_URL = os.getenv("ROOSTOO_BASE_URL", "https://mock-api.roostoo.com").rstrip("/")
 API_KEY = os.getenv('ROOSTOO_API_KEY')
 SECRET_KEY = os.getenv('ROOSTOO_API_SECRET')
 MIN_ORDER_USD = 2.0
+REQUEST_TIMEOUT = 10
+# Request budget shared by every call to the exchange (token bucket)
+RATE_LIMIT_PER_SEC = 2.0
+RATE_LIMIT_BURST = 4
+ORDER_WORKERS = 4
+
+
+class RateLimiter:
+    """Thread-safe token bucket: `rate` requests per second with bursts of up to `burst`."""
+
+    def __init__(self, rate: float, burst: int) -> None:
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+        self.local = threading.local()
+
+    def acquire(self) -> float:
+        """Blocks until a request may be sent; returns the time waited in seconds."""
+        waited = 0.0
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    self.local.waited = self.thread_waited() + waited
+                    return waited
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+            waited += wait
+
+    def thread_waited(self) -> float:
+        """Total seconds the calling thread has waited in acquire."""
+        return getattr(self.local, 'waited', 0.0)
+
+
+rate_limiter = RateLimiter(RATE_LIMIT_PER_SEC, RATE_LIMIT_BURST)
+
+session = requests.Session()
+session.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=ORDER_WORKERS))
+session.mount('http://', HTTPAdapter(pool_connections=1, pool_maxsize=ORDER_WORKERS))
+metrics.instrument_session(session, 'roostoo')
 
 
 # ------------------------------
@@ -41,7 +90,10 @@ def _get_timestamp():
 def _get_signed_headers(payload: dict = {}):
     """
     Generate signed headers and totalParams for RCL_TopLevelCheck endpoints.
+
+    Waits for the rate limiter first, so the signed timestamp is fresh when the request goes out.
     """
+    rate_limiter.acquire()
     payload['timestamp'] = _get_timestamp()
     sorted_keys = sorted(payload.keys())
     total_params = "&".join(f"{k}={payload[k]}" for k in sorted_keys)
@@ -68,7 +120,8 @@ def check_server_time():
     """Check API server time."""
     url = f"{BASE_URL}/v3/serverTime"
     try:
-        res = requests.get(url)
+        rate_limiter.acquire()
+        res = session.get(url, timeout=REQUEST_TIMEOUT)
         res.raise_for_status()
         return res.json()
     except requests.exceptions.RequestException as e:
@@ -80,7 +133,8 @@ def get_exchange_info():
     """Get exchange trading pairs and info."""
     url = f"{BASE_URL}/v3/exchangeInfo"
     try:
-        res = requests.get(url)
+        rate_limiter.acquire()
+        res = session.get(url, timeout=REQUEST_TIMEOUT)
         res.raise_for_status()
         return res.json()
     except requests.exceptions.RequestException as e:
@@ -88,14 +142,45 @@ def get_exchange_info():
         return None
 
 
+def get_exchange_info_cached(ttl_seconds: int = 24 * 60 * 60, cache_path: str = 'user_data/exchange_info.json'):
+    """Get exchange info from a local cache younger than ttl_seconds, refreshing it otherwise.
+
+    Falls back to an expired cache if the refresh fails.
+    """
+    cached = None
+    if os.path.exists(cache_path):
+        try:
+            with open(cache_path) as f:
+                cached = json.load(f)
+        except Exception as e:
+            logger.error(f"Failed to read exchange info cache {cache_path}: {e}")
+        if cached is not None and time.time() - os.path.getmtime(cache_path) < ttl_seconds:
+            logger.info(f"Exchange info loaded from {cache_path}")
+            return cached
+
+    info = get_exchange_info()
+    if info is None:
+        if cached is not None:
+            logger.warning(f"Exchange info refresh failed, using expired cache {cache_path}")
+        return cached
+
+    os.makedirs(os.path.dirname(cache_path) or '.', exist_ok=True)
+    tmp_path = f"{cache_path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(info, f)
+    os.replace(tmp_path, cache_path)
+    return info
+
+
 def get_ticker(pair=None):
     """Get ticker for one or all pairs."""
     url = f"{BASE_URL}/v3/ticker"
+    rate_limiter.acquire()
     params = {'timestamp': _get_timestamp()}
     if pair:
         params['pair'] = pair
     try:
-        res = requests.get(url, params=params)
+        res = session.get(url, params=params, timeout=REQUEST_TIMEOUT)
         res.raise_for_status()
         return res.json()
     except requests.exceptions.RequestException as e:
@@ -103,6 +188,19 @@ def get_ticker(pair=None):
         return None
 
 
+def get_last_prices() -> dict[str, float]:
+    """Get the last price of every USD pair in one ticker request, keyed by coin."""
+    ticker = get_ticker()
+    if not ticker or not ticker.get('Success', True):
+        return {}
+    last_prices = {}
+    for pair, data in ticker.get('Data', {}).items():
+        coin, _, unit = pair.partition('/')
+        if unit == 'USD' and 'LastPrice' in data:
+            last_prices[coin] = float(data['LastPrice'])
+    return last_prices
+
+
 # ------------------------------
 # Signed Endpoints
 # ------------------------------
@@ -112,7 +210,7 @@ def get_balance():
     url = f"{BASE_URL}/v3/balance"
     headers, payload, _ = _get_signed_headers({})
     try:
-        res = requests.get(url, headers=headers, params=payload)
+        res = session.get(url, headers=headers, params=payload, timeout=REQUEST_TIMEOUT)
         res.raise_for_status()
         return res.json()
     except requests.exceptions.RequestException as e:
@@ -126,7 +224,7 @@ def get_pending_count():
     url = f"{BASE_URL}/v3/pending_count"
     headers, payload, _ = _get_signed_headers({})
     try:
-        res = requests.get(url, headers=headers, params=payload)
+        res = session.get(url, headers=headers, params=payload, timeout=REQUEST_TIMEOUT)
         res.raise_for_status()
         return res.json()
     except requests.exceptions.RequestException as e:
@@ -163,7 +261,7 @@ def place_order(pair_or_coin, side, quantity, price=None, order_type=None):
     headers['Content-Type'] = 'application/x-www-form-urlencoded'
 
     try:
-        res = requests.post(url, headers=headers, data=total_params)
+        res = session.post(url, headers=headers, data=total_params, timeout=REQUEST_TIMEOUT)
         res.raise_for_status()
         logger.info(f"Order placed: {res.json()}")
         # tg.send_message(f"Order placed: {res.json()}")
@@ -190,7 +288,7 @@ def query_order(order_id=None, pair=None, pending_only=None):
     headers['Content-Type'] = 'application/x-www-form-urlencoded'
 
     try:
-        res = requests.post(url, headers=headers, data=total_params)
+        res = session.post(url, headers=headers, data=total_params, timeout=REQUEST_TIMEOUT)
         res.raise_for_status()
         return res.json()
     except requests.exceptions.RequestException as e:
@@ -212,7 +310,7 @@ def cancel_order(order_id=None, pair=None):
     headers['Content-Type'] = 'application/x-www-form-urlencoded'
 
     try:
-        res = requests.post(url, headers=headers, data=total_params)
+        res = session.post(url, headers=headers, data=total_params, timeout=REQUEST_TIMEOUT)
         res.raise_for_status()
         return res.json()
     except requests.exceptions.RequestException as e:
@@ -221,6 +319,7 @@ def cancel_order(order_id=None, pair=None):
         return None
 
 
+@metrics.timed('get_current_postions')
 def get_current_postions() -> dict[str, float]:
     data = get_balance()
 
@@ -241,10 +340,65 @@ def get_free_usd() -> float:
     return spot_wallet['USD']['Free']
 
 
-def trade(amount_by_symbol: dict[str, float], binance_fetcher: BinanceFetcher, last_prices: dict[str, float] | None = None) -> tuple[list[dict], list[dict]]:
-    has_trade = False
+def _place_order_timed(symbol: str, side: str, quantity: float) -> dict:
+    """Places a market order and records its round-trip latency in the response.
+
+    The time spent queued in the rate limiter is reported apart (`RateLimitWaitMs`), so
+    `LatencyMs` is the request itself.
+    """
+    waited = rate_limiter.thread_waited()
+    start = time.perf_counter()
+    with metrics.span('order', symbol=symbol, side=side):
+        response = place_order(symbol, side, quantity)
+    wait_ms = (rate_limiter.thread_waited() - waited) * 1000
+    latency_ms = (time.perf_counter() - start) * 1000 - wait_ms
+    if response is None:
+        response = {'Success': False, 'ErrMsg': f'{side} {quantity} {symbol}: request failed'}
+    response['LatencyMs'] = round(latency_ms, 1)
+    response['RateLimitWaitMs'] = round(wait_ms, 1)
+    logger.info(f"{side} {quantity} {symbol} took {latency_ms:.1f} ms (+{wait_ms:.1f} ms rate limit wait)")
+    return response
+
+
+def _report_order(response: dict, success_trades: list[dict], error_trades: list[dict]) -> None:
+    # {'Success': True, 'ErrMsg': '', 'OrderDetail': {'Pair': 'ETH/USD', 'OrderID': 2344053, 'Status': 'FILLED', 'Role': 'TAKER', 'ServerTimeUsage': 0.008577462, 'CreateTimestamp': 1762438851040, 'FinishTimestamp': 1762438851048, 'Side': 'SELL', 'Type': 'MARKET', 'StopType': 'GTC', 'Price': 3367.13, 'Quantity': 0.01, 'FilledQuantity': 0.01, 'FilledAverPrice': 3367.13, 'CoinChange': 0.01, 'UnitChange': 33.6713, 'CommissionCoin': 'USD', 'CommissionChargeValue': 0.033671, 'CommissionPercent': 0.001, 'OrderWalletType': 'SPOT', 'OrderSource': 'PUBLIC_API'}}
+    if response['Success']:
+        msg = '[TRADE SUCCESS] \n'
+        msg += f'Status: {response['OrderDetail']['Status']} \n'
+        msg += f'Symbol: {response['OrderDetail']['Pair']} \n'
+        msg += f'Amount: {response['OrderDetail']['Quantity']} \n'
+        msg += f'Side: {response['OrderDetail']['Side']} \n'
+        msg += f'Type: {response['OrderDetail']['Type']} \n'
+        msg += f'Price: {response['OrderDetail']['Price']} \n'
+        msg += f'Latency: {response['LatencyMs']} ms \n'
+        msg += f'Rate limit wait: {response['RateLimitWaitMs']} ms \n'
+        tg.send_message(msg)
+        success_trades.append(response)
+    else:
+        msg = '[TRADE ERROR] \n'
+        msg += f'Status: {response['ErrMsg']} \n'
+        tg.send_message(msg)
+        error_trades.append(response)
+
+
+def trade(
+    amount_by_symbol: dict[str, float],
+    binance_fetcher: BinanceFetcher,
+    last_prices: dict[str, float] | None = None,
+    max_workers: int = ORDER_WORKERS,
+) -> tuple[list[dict], list[dict]]:
+    """
+    Places one market order per symbol to move positions by amount_by_symbol.
+
+    All sells are placed before any buy so that their proceeds are free USD
+    for the buys. Within each side, orders for different symbols are
+    independent and sent concurrently (max_workers=1 sends them one by one);
+    the shared rate limiter keeps the request rate within the exchange budget.
+    """
     success_trades = []
     error_trades = []
+    sells: list[tuple[str, str, float]] = []
+    buys: list[tuple[str, str, float]] = []
     
     for symbol, amount in amount_by_symbol.items():
         if amount == 0.0:
@@ -270,41 +424,22 @@ def trade(amount_by_symbol: dict[str, float], binance_fetcher: BinanceFetcher, l
                 logger.info(f"Skip {pair} amount {amount} below min USD {MIN_ORDER_USD}")
                 continue
         
-        # Place order based on amount sign
         if amount > 0:
-            response = place_order(symbol, 'BUY', amount)
-            has_trade = True
-        elif amount < 0:
-            response = place_order(symbol, 'SELL', -amount)
-            has_trade = True
-        else:
-            continue
-        
-        # # Check if order placement was successful
-        # if response is None:
-        #     logger.error(f"Failed to place order for {symbol}")
-        #     continue
-        # {'Success': True, 'ErrMsg': '', 'OrderDetail': {'Pair': 'ETH/USD', 'OrderID': 2344053, 'Status': 'FILLED', 'Role': 'TAKER', 'ServerTimeUsage': 0.008577462, 'CreateTimestamp': 1762438851040, 'FinishTimestamp': 1762438851048, 'Side': 'SELL', 'Type': 'MARKET', 'StopType': 'GTC', 'Price': 3367.13, 'Quantity': 0.01, 'FilledQuantity': 0.01, 'FilledAverPrice': 3367.13, 'CoinChange': 0.01, 'UnitChange': 33.6713, 'CommissionCoin': 'USD', 'CommissionChargeValue': 0.033671, 'CommissionPercent': 0.001, 'OrderWalletType': 'SPOT', 'OrderSource': 'PUBLIC_API'}}
-        
-        if response['Success']:
-            msg = '[TRADE SUCCESS] \n'
-            msg += f'Status: {response['OrderDetail']['Status']} \n'
-            msg += f'Symbol: {response['OrderDetail']['Pair']} \n'
-            msg += f'Amount: {response['OrderDetail']['Quantity']} \n'
-            msg += f'Side: {response['OrderDetail']['Side']} \n'
-            msg += f'Type: {response['OrderDetail']['Type']} \n'
-            msg += f'Price: {response['OrderDetail']['Price']} \n'
-            tg.send_message(msg)
-            success_trades.append(response)
+            buys.append((symbol, 'BUY', amount))
         else:
-            msg = '[TRADE ERROR] \n'
-            msg += f'Status: {response['ErrMsg']} \n'
-            tg.send_message(msg)
-            error_trades.append(response)
-        time.sleep(2)
-    if not has_trade:
+            sells.append((symbol, 'SELL', -amount))
+
+    if not sells and not buys:
         return success_trades, error_trades
 
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        for orders in (sells, buys):
+            # map keeps the submission order, so reports and logs stay deterministic
+            for response in executor.map(lambda order: _place_order_timed(*order), orders):
+                _report_order(response, success_trades, error_trades)
+    logger.info(f"Placed {len(sells)} sells and {len(buys)} buys in {time.perf_counter() - start:.2f}s")
+
     pending_count = get_pending_count()
     if pending_count['ErrMsg'] == 'no pending order under this account':
         logger.info("No pending orders")
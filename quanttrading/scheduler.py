@@ -0,0 +1,88 @@
+import time
+from typing import Callable
+
+from quanttrading.helper import next_bar_close, resolution_to_seconds
+from quanttrading.log import init_logger
+
+
+logger = init_logger('scheduler')
+
+
+class BarCloseScheduler:
+    """
+    Paces the trading loop on bar boundaries instead of a fixed sleep.
+
+    wait() sleeps until `delay` seconds after the next boundary of any of the
+    given resolutions, or until `light_interval` seconds after the previous
+    cycle if that comes first, and tells the caller which of the two it was.
+    After a boundary, poll() keeps refreshing with exponential backoff until
+    the new bar is available upstream.
+    """
+
+    def __init__(
+        self,
+        resolutions: list[str],
+        delay: float = 2.0,
+        light_interval: float = 300.0,
+        poll_initial: float = 2.0,
+        poll_max: float = 60.0,
+        poll_timeout: float = 600.0,
+        clock: Callable[[], float] = time.time,
+        sleep: Callable[[float], None] = time.sleep,
+    ) -> None:
+        self.set_resolutions(resolutions)
+        self.delay = delay
+        self.light_interval = light_interval
+        self.poll_initial = poll_initial
+        self.poll_max = poll_max
+        self.poll_timeout = poll_timeout
+        self.clock = clock
+        self.sleep = sleep
+        self.last_cycle = clock()
+
+    def set_resolutions(self, resolutions: list[str]) -> None:
+        self.resolutions = sorted(set(resolutions), key=resolution_to_seconds)
+
+    def next_wakeup(self, now: float) -> tuple[float, bool]:
+        """Next wake-up time and whether it follows a bar boundary."""
+        # shifting by delay keeps a boundary that closed less than `delay` ago as the next one
+        boundary = min(next_bar_close(now - self.delay, r) for r in self.resolutions) + self.delay
+        light = self.last_cycle + self.light_interval
+        # a light cycle just before a boundary is redundant, the bar-close cycle refreshes positions anyway
+        if boundary <= light + self.light_interval / 2:
+            return boundary, True
+        return light, False
+
+    def wait(self) -> bool:
+        """Sleeps until the next cycle; returns True if it follows a bar boundary."""
+        wakeup, at_bar_close = self.next_wakeup(self.clock())
+        remaining = wakeup - self.clock()
+        if remaining > 0:
+            logger.info(f'Sleeping {remaining:.1f}s until next {"bar close" if at_bar_close else "light"} cycle')
+            self.sleep(remaining)
+        self.last_cycle = self.clock()
+        return at_bar_close
+
+    def poll(self, refresh: Callable[[], dict], pending: Callable[[], list]) -> dict:
+        """Calls refresh() until pending() is empty, backing off between attempts.
+
+        Gives up after poll_timeout seconds. Returns the changed-bar counts
+        from all attempts, summed per key.
+        """
+        changed: dict = {}
+        start = self.clock()
+        backoff = self.poll_initial
+        while True:
+            for key, n in refresh().items():
+                changed[key] = changed.get(key, 0) + n
+            missing = pending()
+            if not missing:
+                break
+            if self.clock() + backoff - start > self.poll_timeout:
+                logger.warning(f'{len(missing)} series still missing their latest bar after {self.clock() - start:.0f}s: {missing}')
+                break
+            logger.info(f'{len(missing)} series not updated yet, retrying in {backoff:.0f}s')
+            self.sleep(backoff)
+            backoff = min(backoff * 2, self.poll_max)
+        logger.info(f'Poll finished in {self.clock() - start:.1f}s, {sum(1 for n in changed.values() if n)} series updated')
+        return changed
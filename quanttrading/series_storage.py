@@ -0,0 +1,169 @@
+"""
+Binary storage for factor series.
+
+Each series lives in one `.bin` file: a short JSON header describing the
+record dtype, followed by fixed-width little-endian records. New bars are
+appended in place, and reads memory-map the records without parsing.
+
+Usage:
+    python -m quanttrading.series_storage migrate [folder]
+    python -m quanttrading.series_storage export <file.bin> [out.csv]
+"""
+
+import glob
+import json
+import os
+import struct
+import sys
+
+import numpy as np
+import pandas as pd
+
+from quanttrading.log import init_logger
+
+
+logger = init_logger('storage')
+
+MAGIC = b'QTREC\x00\x01\x00'
+SERIES_DTYPE = np.dtype([('t', '<i8'), ('value', '<f8')])
+
+
+class RecordFile:
+    def __init__(self, path: str, dtype: np.dtype = SERIES_DTYPE) -> None:
+        self.path = path
+        self.dtype = np.dtype(dtype)
+        self._header_len: int | None = None
+
+    def exists(self) -> bool:
+        return os.path.exists(self.path)
+
+    def _header(self) -> bytes:
+        meta = json.dumps({'descr': self.dtype.descr}).encode('utf-8')
+        return MAGIC + struct.pack('<I', len(meta)) + meta
+
+    def _read_header(self) -> int:
+        with open(self.path, 'rb') as f:
+            magic = f.read(len(MAGIC))
+            if magic != MAGIC:
+                raise ValueError(f'{self.path} is not a record file')
+            (meta_len,) = struct.unpack('<I', f.read(4))
+            meta = json.loads(f.read(meta_len))
+        dtype = np.dtype([tuple(field) for field in meta['descr']])
+        if dtype != self.dtype:
+            raise ValueError(f'{self.path} has dtype {dtype}, expected {self.dtype}')
+        return len(MAGIC) + 4 + meta_len
+
+    @property
+    def header_len(self) -> int:
+        if self._header_len is None:
+            self._header_len = self._read_header()
+        return self._header_len
+
+    def __len__(self) -> int:
+        if not self.exists():
+            return 0
+        return (os.path.getsize(self.path) - self.header_len) // self.dtype.itemsize
+
+    def _repair(self) -> None:
+        """Drops a trailing partial record left by an interrupted append."""
+        size = os.path.getsize(self.path)
+        excess = (size - self.header_len) % self.dtype.itemsize
+        if excess:
+            logger.warning(f'Truncating {excess} trailing bytes of partial record in {self.path}')
+            with open(self.path, 'r+b') as f:
+                f.truncate(size - excess)
+
+    def read(self) -> np.ndarray:
+        """Memory-maps all records read-only (no copy, no parsing)."""
+        self._repair()
+        n = len(self)
+        if n == 0:
+            return np.empty(0, dtype=self.dtype)
+        return np.memmap(self.path, dtype=self.dtype, mode='r', offset=self.header_len, shape=(n,))
+
+    def tail(self, n: int) -> np.ndarray:
+        """Reads only the last n records."""
+        total = len(self)
+        n = min(n, total)
+        if n == 0:
+            return np.empty(0, dtype=self.dtype)
+        with open(self.path, 'rb') as f:
+            f.seek(self.header_len + (total - n) * self.dtype.itemsize)
+            return np.frombuffer(f.read(n * self.dtype.itemsize), dtype=self.dtype)
+
+    def append(self, records: np.ndarray) -> None:
+        records = np.asarray(records, dtype=self.dtype)
+        if not self.exists():
+            self.write(records)
+            return
+        self._repair()
+        with open(self.path, 'ab') as f:
+            f.write(records.tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+
+    def write(self, records: np.ndarray) -> None:
+        """Atomically replaces the whole file."""
+        records = np.asarray(records, dtype=self.dtype)
+        tmp_path = f'{self.path}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(self._header())
+            f.write(records.tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        self._header_len = None
+
+
+def to_records(t: np.ndarray, value: np.ndarray) -> np.ndarray:
+    records = np.empty(len(t), dtype=SERIES_DTYPE)
+    records['t'] = t
+    records['value'] = value
+    return records
+
+
+def binary_path(csv_path: str) -> str:
+    return f'{os.path.splitext(csv_path)[0]}.bin'
+
+
+def migrate_csv(csv_path: str) -> str:
+    """Converts one {t, ts, value} factor CSV into a .bin record file."""
+    df = pd.read_csv(csv_path, usecols=['t', 'value'])
+    df = df.sort_values(by='t', ascending=True).drop_duplicates(subset=['t'], keep='last')
+    path = binary_path(csv_path)
+    RecordFile(path).write(to_records(df['t'].to_numpy(), df['value'].to_numpy()))
+    logger.info(f'Migrated {len(df)} rows from {csv_path} to {path}')
+    return path
+
+
+def migrate_csv_folder(folder: str = 'user_data/data') -> list[str]:
+    """One-shot migration of every factor CSV (files with t/value columns) in folder."""
+    migrated = []
+    for csv_path in sorted(glob.glob(f'{folder}/*.csv')):
+        columns = pd.read_csv(csv_path, nrows=0).columns
+        if 't' not in columns or 'value' not in columns:
+            continue
+        migrated.append(migrate_csv(csv_path))
+    return migrated
+
+
+def export_csv(path: str, csv_path: str | None = None) -> str:
+    """Writes a .bin series back out in the original {t, ts, value} CSV shape."""
+    records = RecordFile(path).read()
+    df = pd.DataFrame({'t': records['t'], 'value': records['value']})
+    df.index = pd.to_datetime(df['t'], unit='s')
+    df.index.name = 'ts'
+    if csv_path is None:
+        csv_path = f'{os.path.splitext(path)[0]}.csv'
+    df.to_csv(csv_path)
+    logger.info(f'Exported {len(df)} rows from {path} to {csv_path}')
+    return csv_path
+
+
+if __name__ == '__main__':
+    if len(sys.argv) >= 2 and sys.argv[1] == 'migrate':
+        migrate_csv_folder(sys.argv[2] if len(sys.argv) > 2 else 'user_data/data')
+    elif len(sys.argv) >= 3 and sys.argv[1] == 'export':
+        export_csv(sys.argv[2], sys.argv[3] if len(sys.argv) > 3 else None)
+    else:
+        print(__doc__)
@@ -0,0 +1,199 @@
+import numpy as np
+import pandas as pd
+from dataclasses import dataclass
+from typing import Callable
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+@dataclass(frozen=True)
+class SignalSpec:
+    model: str
+    window1: int
+    window2: int
+    threshold: float
+
+
+# Bars per block of the rank kernel's (bars x window) comparison matrix
+RANK_CHUNK = 1024
+# A single window above this is left to pandas' skiplist, which wins there
+RANK_SINGLE_MAX = 512
+
+
+def rolling_rank_pct(x: np.ndarray, windows: list[int], chunk: int = RANK_CHUNK) -> dict[int, np.ndarray]:
+    """Rolling percentile rank of x for several windows at once.
+
+    Matches Series.rolling(w).rank(pct=True) exactly: ties get their
+    average rank, and a bar is NaN unless its whole window is non-NaN.
+    Values are replaced by their dense rank (int16 when they fit), and each
+    bar is compared against its last max(windows) bars in blocks of
+    `chunk` bars. Windows are taken in increasing order and each one only
+    counts the lags beyond the previous window, so a batch costs about as
+    much as its largest window.
+    """
+    x = np.asarray(x, dtype=float)
+    n = len(x)
+    windows = sorted(set(int(w) for w in windows))
+    nan = np.isnan(x)
+    uniq, inv = np.unique(x[~nan], return_inverse=True)
+    ties = len(uniq) < len(inv)
+    dtype = np.int16 if len(uniq) < np.iinfo(np.int16).max else np.int32
+    # NaN and the padding get a rank above every value; their bars are masked below
+    dense = np.full(n, len(uniq), dtype=dtype)
+    dense[~nan] = inv
+
+    w_max = windows[-1]
+    padded = np.concatenate([np.full(w_max - 1, len(uniq), dtype=dtype), dense])
+    # row i holds bars i - w_max + 1 .. i
+    view = sliding_window_view(padded, w_max)
+    less = np.empty((len(windows), n), dtype=np.int64)
+    equal = np.ones((len(windows), n), dtype=np.int64)
+    for start in range(0, n, chunk):
+        stop = min(n, start + chunk)
+        current = dense[start:stop, None]
+        n_less = np.zeros(stop - start, dtype=np.int64)
+        n_equal = np.zeros(stop - start, dtype=np.int64)
+        hi = w_max
+        for k, w in enumerate(windows):
+            block = view[start:stop, w_max - w:hi]
+            n_less += np.count_nonzero(block < current, axis=1)
+            less[k, start:stop] = n_less
+            if ties:
+                n_equal += np.count_nonzero(block == current, axis=1)
+                equal[k, start:stop] = n_equal
+            hi = w_max - w
+
+    nan_count = np.concatenate([[0], np.cumsum(nan)])
+    pos = np.arange(n)
+    result = {}
+    for k, w in enumerate(windows):
+        # same average-rank arithmetic as pandas' roll_rank
+        rank_min = less[k] + 1.0
+        rank = (less[k] + equal[k]).astype(float)
+        pct = ((rank * (rank + 1) / 2) - ((rank_min - 1) * rank_min / 2)) / (rank - rank_min + 1) / w
+        pct[(pos < w - 1) | (nan_count[pos + 1] - nan_count[np.maximum(pos + 1 - w, 0)] > 0)] = np.nan
+        result[w] = pct
+    return result
+
+
+def rolling_rank(x: np.ndarray | pd.Series, window: int) -> np.ndarray:
+    """Series.rolling(window).rank(pct=True) of one window, as an array."""
+    if window > RANK_SINGLE_MAX:
+        return pd.Series(np.asarray(x, dtype=float)).rolling(window).rank(pct=True).to_numpy()
+    return rolling_rank_pct(x, [window])[window]
+
+
+class RollingStats:
+    """Rolling statistics of one factor series, cached by window.
+
+    Parameter sets that share a window reuse the same rolling mean/std/rank
+    instead of recomputing it on a fresh DataFrame copy.
+    """
+
+    def __init__(self, x: np.ndarray) -> None:
+        self.x = np.asarray(x, dtype=float)
+        self._series = pd.Series(self.x, copy=False)
+        self._mean: dict[int, np.ndarray] = {}
+        self._std: dict[int, np.ndarray] = {}
+        self._zscore: dict[tuple[int, int], np.ndarray] = {}
+        self._rank: dict[tuple[int, int], np.ndarray] = {}
+
+    def mean(self, window: int) -> np.ndarray:
+        if window not in self._mean:
+            self._mean[window] = self._series.rolling(window).mean().to_numpy()
+        return self._mean[window]
+
+    def std(self, window: int) -> np.ndarray:
+        if window not in self._std:
+            self._std[window] = self._series.rolling(window).std().to_numpy()
+        return self._std[window]
+
+    def zscore(self, window1: int, window2: int) -> np.ndarray:
+        key = (window1, window2)
+        if key not in self._zscore:
+            self._zscore[key] = (self.x - self.mean(window1)) / self.std(window2)
+        return self._zscore[key]
+
+    def rank(self, window1: int, window2: int) -> np.ndarray:
+        """Percentile rank of the window1 mean over the last window2 bars."""
+        key = (window1, window2)
+        if key not in self._rank:
+            self._rank[key] = rolling_rank(self.mean(window1), window2)
+        return self._rank[key]
+
+    def ranks(self, window1: int, windows2: list[int]) -> None:
+        """Fills the rank cache for several window2 of one window1 in one kernel pass."""
+        missing = sorted({w for w in windows2 if (window1, w) not in self._rank})
+        if len(missing) == 1:
+            self.rank(window1, missing[0])
+        elif missing:
+            for window2, values in rolling_rank_pct(self.mean(window1), missing).items():
+                self._rank[(window1, window2)] = values
+
+    def drop_pairs(self) -> None:
+        """Frees the per-(window1, window2) z-score/rank caches; per-window means/stds are kept."""
+        self._zscore.clear()
+        self._rank.clear()
+
+
+def batch_ranks(stats: RollingStats, specs: list[SignalSpec]) -> None:
+    """Precomputes the ranks of all 'R' specs, batching the window2 values of each window1."""
+    windows2: dict[int, set[int]] = {}
+    for spec in specs:
+        if spec.model == 'R':
+            windows2.setdefault(spec.window1, set()).add(spec.window2)
+    for window1, ws in windows2.items():
+        stats.ranks(window1, sorted(ws))
+
+
+def compute_signal_matrix(
+    x: np.ndarray,
+    specs: list[SignalSpec],
+    b_condition: Callable[[np.ndarray, np.ndarray], np.ndarray],
+    r_condition: Callable[[np.ndarray, np.ndarray], np.ndarray],
+    stats: RollingStats | None = None,
+) -> np.ndarray:
+    """Computes the signals of all parameter sets of a strategy in one pass.
+
+    Returns an int8 matrix with one row per bar and one column per spec.
+    Specs sharing (model, window1, window2) are evaluated together by
+    broadcasting their thresholds against the shared z-score/rank column.
+    """
+    if stats is None:
+        stats = RollingStats(x)
+    signals = np.zeros((len(stats.x), len(specs)), dtype=np.int8)
+
+    groups: dict[tuple[str, int, int], list[int]] = {}
+    for j, spec in enumerate(specs):
+        groups.setdefault((spec.model, spec.window1, spec.window2), []).append(j)
+    batch_ranks(stats, specs)
+
+    for (model, window1, window2), cols in groups.items():
+        thresholds = np.array([specs[j].threshold for j in cols], dtype=float)
+        if model == 'B':
+            values = stats.zscore(window1, window2)
+            condition = b_condition
+        elif model == 'R':
+            values = stats.rank(window1, window2)
+            condition = r_condition
+        else:
+            raise ValueError(f'Invalid model: {model}')
+        signals[:, cols] = condition(values[:, None], thresholds[None, :])
+
+    return signals
+
+
+def apply_conditions(
+    values: np.ndarray,
+    specs: list[SignalSpec],
+    b_condition: Callable[[np.ndarray, np.ndarray], np.ndarray],
+    r_condition: Callable[[np.ndarray, np.ndarray], np.ndarray],
+) -> np.ndarray:
+    """Turns per-spec z-scores ('B') or ranks ('R') into signals (columns = specs)."""
+    models = np.array([spec.model for spec in specs])
+    thresholds = np.array([spec.threshold for spec in specs], dtype=float)
+    signals = np.zeros(values.shape, dtype=np.int8)
+    is_b = models == 'B'
+    is_r = models == 'R'
+    signals[..., is_b] = b_condition(values[..., is_b], thresholds[is_b])
+    signals[..., is_r] = r_condition(values[..., is_r], thresholds[is_r])
+    return signals
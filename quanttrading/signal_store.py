@@ -0,0 +1,114 @@
+"""
+Append-only signal history of a strategy.
+
+One RecordFile per strategy with a record per bar: the bar time, one int8
+column per parameter set and the aggregated signal. The last stored bar
+is kept in memory, so a cycle only appends its new bars instead of
+reading and rewriting the whole history.
+
+Usage:
+    python -m quanttrading.signal_store export <file.bin> [out.csv]
+"""
+
+import json
+import os
+import struct
+import sys
+
+import numpy as np
+import pandas as pd
+
+from quanttrading.log import init_logger
+from quanttrading.series_storage import MAGIC, RecordFile
+
+
+logger = init_logger('signals')
+
+
+def signal_dtype(columns: list[str]) -> np.dtype:
+    return np.dtype([('t', '<i8')] + [(c, 'i1') for c in columns] + [('signal', '<f8')])
+
+
+def _index_to_t(index: pd.Index) -> np.ndarray:
+    return np.asarray(index.values, dtype='datetime64[s]').astype(np.int64)
+
+
+class SignalStore:
+    def __init__(self, path: str, columns: list[str]) -> None:
+        self.path = path
+        self.columns = list(columns)
+        self.file = RecordFile(path, signal_dtype(self.columns))
+        # the file holds other columns (param sets changed): replaced on the next write
+        self._stale = False
+        self.last_t = self._read_last_t()
+
+    def _read_last_t(self) -> int | None:
+        if not self.file.exists():
+            return None
+        try:
+            tail = self.file.tail(1)
+        except ValueError as e:
+            logger.warning(f'{e}; the signal history will be restarted')
+            self._stale = True
+            return None
+        return int(tail['t'][0]) if len(tail) else None
+
+    def last_timestamp(self) -> pd.Timestamp | None:
+        return None if self.last_t is None else pd.to_datetime(self.last_t, unit='s')
+
+    def _to_records(self, signals_df: pd.DataFrame) -> np.ndarray:
+        records = np.empty(len(signals_df), dtype=self.file.dtype)
+        records['t'] = _index_to_t(signals_df.index)
+        for c in self.columns:
+            records[c] = signals_df[c].to_numpy()
+        records['signal'] = signals_df['signal'].to_numpy()
+        return records
+
+    def append(self, signals_df: pd.DataFrame) -> int:
+        """Stores the bars of signals_df after the last stored one; returns how many were written."""
+        records = self._to_records(signals_df)
+        if self.last_t is not None:
+            records = records[records['t'] > self.last_t]
+        if len(records) == 0:
+            return 0
+        if self._stale:
+            self.file.write(records)
+            self._stale = False
+        else:
+            self.file.append(records)
+        self.last_t = int(records['t'][-1])
+        logger.debug(f'Appended {len(records)} signal rows to {self.path}')
+        return len(records)
+
+    def to_frame(self) -> pd.DataFrame:
+        """The stored history in the shape of the old signal CSVs (ts index, one column per param set, signal)."""
+        records = self.file.read() if self.file.exists() and not self._stale else np.empty(0, dtype=self.file.dtype)
+        df = pd.DataFrame({c: records[c] for c in self.columns + ['signal']})
+        df.index = pd.to_datetime(records['t'], unit='s')
+        df.index.name = 'ts'
+        return df
+
+    def export_csv(self, csv_path: str | None = None) -> str:
+        if csv_path is None:
+            csv_path = f'{os.path.splitext(self.path)[0]}.csv'
+        df = self.to_frame()
+        df.to_csv(csv_path)
+        logger.info(f'Exported {len(df)} signal rows from {self.path} to {csv_path}')
+        return csv_path
+
+    @classmethod
+    def open(cls, path: str) -> 'SignalStore':
+        """Opens an existing store, taking the columns from its header."""
+        with open(path, 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f'{path} is not a record file')
+            (meta_len,) = struct.unpack('<I', f.read(4))
+            descr = json.loads(f.read(meta_len))['descr']
+        return cls(path, [name for name, _ in descr[1:-1]])
+
+
+if __name__ == '__main__':
+    if len(sys.argv) >= 3 and sys.argv[1] == 'export':
+        SignalStore.open(sys.argv[2]).export_csv(sys.argv[3] if len(sys.argv) > 3 else None)
+    else:
+        print(__doc__)
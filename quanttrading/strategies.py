@@ -1,9 +1,14 @@
 import pandas as pd
+import numpy as np
 import os
 
 from abc import ABC, abstractmethod
 
-from quanttrading.config_manager import StratConfig
+from quanttrading.config_manager import StratConfig, StratParams, signal_col_name
+from quanttrading.signal_engine import SignalSpec, RollingStats, compute_signal_matrix, apply_conditions
+from quanttrading.rolling_state import IncrementalSignalState, full_signal_values, history_digests
+from quanttrading.signal_store import SignalStore
+from quanttrading.series_storage import binary_path
 from quanttrading.log import init_logger
 from quanttrading import tg
 
@@ -12,6 +17,8 @@ logger = init_logger('strats')
 
 
 class BaseStrat(ABC):
+    factor_prefix: str | None = None  # filename prefix of the factor series loaded by fetch_alpha
+
     def __init__(self, config: StratConfig) -> None:
         self.config = config
         
@@ -26,67 +33,217 @@ class BaseStrat(ABC):
         self.strat_name = f'{self.id:03d}-{self.name}'
         self.csv_folder = f'user_data/data'
         self.strat_key = self._generate_key()
+
+        self.incremental = False
+        self.verify_incremental = False
+        self.state_folder = 'user_data/state'
+        self._state: IncrementalSignalState | None = None
+        self._signal_store: SignalStore | None = None
     
     
+    def __getstate__(self) -> dict:
+        # Strategies are sent to signal worker processes without their fetcher or rolling state
+        state = self.__dict__.copy()
+        state.pop('binance_fetcher', None)
+        state['_state'] = None
+        state['_signal_store'] = None
+        return state
+
     def _generate_key(self) -> tuple:
         return (self.id, self.name, self.symbol, self.timeframe)
 
+    def get_factor_key(self) -> tuple[str, str, str] | None:
+        if self.factor_prefix is None:
+            return None
+        return (self.factor_prefix, self.symbol, self.timeframe)
 
-    def calculate_agg_signal_df(self, df: pd.DataFrame) -> pd.DataFrame:
-        """Calculates the aggregated signals for multiple parameter sets and adds them to DataFrame."""
-        df = df.copy()
-        signals_df = pd.DataFrame(index=df.index)
-        
-        for _, p in enumerate(self.param_sets):
-            param_dict = {f'param_{i+1}': v for i, v in enumerate(p.param)}
 
-            df_temp = self.calculate_signal_df(df, param_dict, p.model)
-            signal = df_temp['signal'].iloc[-1]
+    def get_param_dict(self, p: StratParams) -> dict:
+        return {f'param_{i+1}': v for i, v in enumerate(p.param)}
+
+    def get_signal_col_name(self, p: StratParams) -> str:
+        return signal_col_name(p)
+
+    def unpack_params(self, params: dict) -> tuple[int, int, float]:
+        """Maps a param dict to (window1, window2, threshold) for the b/r models."""
+        return params['param_1'], params['param_2'], params['param_3']
+
+    @classmethod
+    def pack_params(cls, window1: int, window2: int, threshold: float) -> list[float | int]:
+        """Inverse of unpack_params: the `p` list of df_final.csv for (window1, window2, threshold)."""
+        return [window1, window2, threshold]
+
+    def get_signal_specs(self) -> list[SignalSpec]:
+        specs = []
+        for p in self.param_sets:
+            window1, window2, threshold = self.unpack_params(self.get_param_dict(p))
+            specs.append(SignalSpec(model=p.model, window1=int(window1), window2=int(window2), threshold=float(threshold)))
+        return specs
+
+    def transform_alpha(self, values: np.ndarray) -> np.ndarray:
+        """Series the b/r models run on, derived from the raw factor values."""
+        return values
+
+    def b_condition(self, z, threshold):
+        """Entry condition of model 'B' on the rolling z-score (reversion by default)."""
+        return z < -threshold
+
+    def r_condition(self, rank, threshold):
+        """Entry condition of model 'R' on the rolling percentile rank (reversion by default)."""
+        return rank < (1 - threshold)
+
+    def calculate_signal_matrix(self, df: pd.DataFrame) -> np.ndarray:
+        """Calculates the signals of every parameter set at once (rows = bars, columns = param sets)."""
+        x = self.transform_alpha(df['value'].to_numpy(dtype=float))
+        return compute_signal_matrix(x, self.get_signal_specs(), self.b_condition, self.r_condition)
+
+    def _build_signals_df(self, matrix: np.ndarray, index: pd.Index) -> pd.DataFrame:
+        columns = {}
+        
+        for j, p in enumerate(self.param_sets):
+            param_dict = self.get_param_dict(p)
+            signal = matrix[-1, j]
             logger.info(f'{self.id:03d} {self.symbol} {self.timeframe} {param_dict} Signal: {signal}')
             
-            col_name = f"{p.model}_" + '-'.join(f'{v}' for v in param_dict.values())
-            signals_df[col_name] = df_temp['signal']
+            col_name = self.get_signal_col_name(p)
+            columns[col_name] = matrix[:, j]
             
+        signals_df = pd.DataFrame(columns, index=index)
         signals_df['signal'] = signals_df.mean(axis=1)
         signal = signals_df['signal'].iloc[-1]
         logger.info(f'{self.id:03d} {self.symbol} {self.timeframe} Signal(agg): {signal}')
-        
-        file_path = self.get_signal_csv_path(self.strat_name)
-        if os.path.exists(file_path):
-            df_csv = pd.read_csv(file_path, index_col=0, parse_dates=True)
-            csv_last_timestamp = df_csv.index.max()
-        else:
-            csv_last_timestamp = None
-            
+        return signals_df
+
+    def _send_signal_update(self, last_timestamp, signal: float) -> None:
+        msg = f'SIGNAL UPDATED\n'
+        msg += f'{self.strat_name}\n'
+        msg += f'Last timestamp: {last_timestamp} \n'
+        msg += f'Last signal: {signal}'
+        tg.send_message(msg)
+
+    def calculate_agg_signal_df(self, df: pd.DataFrame, matrix: np.ndarray | None = None) -> pd.DataFrame:
+        """Calculates the aggregated signals for multiple parameter sets and adds them to DataFrame.
+
+        `matrix` is the precomputed result of calculate_signal_matrix(df), e.g. from a worker process.
+        """
+        if matrix is None:
+            matrix = self.calculate_signal_matrix(df)
+        signals_df = self._build_signals_df(matrix, df.index)
+
+        store = self.get_signal_store()
         last_timestamp = signals_df.index.max()
-        if last_timestamp != csv_last_timestamp:
-            msg = f'SIGNAL UPDATED\n'
-            msg += f'{self.strat_name}\n'
-            msg += f'Last timestamp: {last_timestamp} \n'
-            msg += f'Last signal: {signal}'
-            tg.send_message(msg)
-        
-        self.to_signal_csv(signals_df, self.strat_name)
-        
+        if last_timestamp != store.last_timestamp():
+            self._send_signal_update(last_timestamp, signals_df['signal'].iloc[-1])
+
+        store.append(signals_df)
+
         return signals_df
-    
+
+    # ========== Incremental last-bar evaluation ==========
+    def enable_incremental(self, state_folder: str = 'user_data/state', verify: bool = False) -> None:
+        """Evaluates only newly appended bars on persisted rolling state.
+
+        With verify=True every incremental bar is also recomputed over the full
+        history and compared bit for bit; a mismatch reseeds the state.
+        """
+        self.incremental = True
+        self.verify_incremental = verify
+        self.state_folder = state_folder
+        os.makedirs(self.state_folder, exist_ok=True)
+
+    def get_state_path(self) -> str:
+        return f'{self.state_folder}/{self.strat_name}.json'
+
+    def _seed_incremental_state(self, df: pd.DataFrame, specs: list[SignalSpec]) -> IncrementalSignalState:
+        state = IncrementalSignalState(specs)
+        x = self.transform_alpha(df['value'].to_numpy(dtype=float))
+        values = np.full(len(specs), np.nan)
+        for t, v in zip(df['t'].to_numpy(), x):
+            values = state.update(t, v)
+        state.last_signals = apply_conditions(values, specs, self.b_condition, self.r_condition).tolist()
+        state.history_digest = history_digests(df['t'].to_numpy(), df['value'].to_numpy())[1]
+        state.save(self.get_state_path())
+        logger.info(f'{self.strat_name} incremental state seeded from {state.n_bars} bars')
+        return state
+
+    def _reseed_from_full(self, df: pd.DataFrame, specs: list[SignalSpec]) -> pd.DataFrame:
+        self._state = self._seed_incremental_state(df, specs)
+        return self.calculate_agg_signal_df(df)
+
+    def calculate_agg_signal_df_incremental(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Incremental counterpart of calculate_agg_signal_df.
+
+        Returns the aggregated signals of the bars appended since the last call
+        (or the last known bar when nothing is new). Falls back to a full
+        recompute and reseeds the state whenever the history no longer lines up
+        with the stored state.
+        """
+        specs = self.get_signal_specs()
+        if self._state is None:
+            self._state = IncrementalSignalState.load(self.get_state_path())
+        state = self._state
+
+        t = df['t'].to_numpy()
+        raw = df['value'].to_numpy()
+        start = None
+        if state is not None and state.matches(specs) and state.last_t is not None:
+            pos = int(np.searchsorted(t, state.last_t))
+            if pos < len(t) and t[pos] == state.last_t and pos + 1 == state.n_bars:
+                start = pos + 1
+        if start is not None:
+            fed_digest, digest = history_digests(t, raw, start)
+            if fed_digest != state.history_digest:
+                # a refetch revised bars the rolling windows have already seen
+                logger.info(f'{self.strat_name} bars fed to the incremental state were revised')
+                start = None
+        if start is None:
+            logger.info(f'{self.strat_name} incremental state missing or out of sync, recomputing full history')
+            return self._reseed_from_full(df, specs)
+
+        if start == len(t):
+            matrix = np.array([state.last_signals], dtype=np.int8)
+            return self._build_signals_df(matrix, df.index[-1:])
+
+        x = self.transform_alpha(df['value'].to_numpy(dtype=float))
+        values = np.array([state.update(t[i], x[i]) for i in range(start, len(t))])
+        state.history_digest = digest
+
+        if self.verify_incremental:
+            expected = full_signal_values(RollingStats(x), specs)[start:]
+            if not np.array_equal(values, expected, equal_nan=True):
+                msg = f'{self.strat_name} incremental signal mismatch vs full recompute, reseeding'
+                logger.error(msg)
+                tg.send_message(msg)
+                return self._reseed_from_full(df, specs)
+            logger.info(f'{self.strat_name} incremental signal verified for {len(values)} bars')
+
+        matrix = apply_conditions(values, specs, self.b_condition, self.r_condition)
+        state.last_signals = matrix[-1].tolist()
+        state.save(self.get_state_path())
+
+        signals_df = self._build_signals_df(matrix, df.index[start:])
+        self._send_signal_update(signals_df.index.max(), signals_df['signal'].iloc[-1])
+        self.get_signal_store().append(signals_df)
+        return signals_df
+
     def get_signal_csv_path(self, strat_name: str) -> str:
         return f'{self.csv_folder}/{strat_name}.csv'
-    
-    def to_signal_csv(self, df: pd.DataFrame, strat_name: str) -> None:
-        file_path = self.get_signal_csv_path(strat_name)
-        
-        if df is None or df.empty:
-            logger.debug(f'No data to save for {strat_name} strategy')
-            df =pd.DataFrame()
-            
-        df.to_csv(file_path)
-        logger.debug(f'Saved {len(df)} rows for {strat_name} strategy')
+
+    def get_signal_store(self) -> SignalStore:
+        """Signal history in user_data/data/{id-name}.bin; export_csv() writes the {id-name}.csv shape."""
+        if self._signal_store is None:
+            # identical param sets share a column, as in _build_signals_df
+            columns = list(dict.fromkeys(self.get_signal_col_name(p) for p in self.param_sets))
+            self._signal_store = SignalStore(binary_path(self.get_signal_csv_path(self.strat_name)), columns)
+        return self._signal_store
 
 
     def generate_signal(self) -> float:
         df_alpha = self.fetch_alpha()
-        df = self.calculate_agg_signal_df(df_alpha)
+        if self.incremental:
+            df = self.calculate_agg_signal_df_incremental(df_alpha)
+        else:
+            df = self.calculate_agg_signal_df(df_alpha)
         
         return df['signal'].iloc[-1]
     
@@ -94,10 +251,6 @@ class BaseStrat(ABC):
     @abstractmethod
     def fetch_alpha(self) -> pd.DataFrame:
         pass
-    
-    @abstractmethod
-    def calculate_signal_df(self, df: pd.DataFrame, params: dict, model: str) -> pd.DataFrame:
-        pass
 
     def __repr__(self):
         return f'Strategy({self.strat_name})'
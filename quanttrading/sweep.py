@@ -0,0 +1,302 @@
+import argparse
+import hashlib
+import itertools
+import json
+import multiprocessing
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import replace
+
+import numpy as np
+import pandas as pd
+
+from quanttrading import config_manager, registry
+from quanttrading.backtest import CHUNK_SIZE, CLOSE_PREFIX, FEE_RATE, align_closes, backtest_series, backtest_strategy, load_close_prices
+from quanttrading.binance_fetcher import BinanceFetcher
+from quanttrading.config_manager import StratConfig, StratParams
+from quanttrading.helper import resolution_to_seconds
+from quanttrading.strategies import BaseStrat
+from quanttrading.log import init_logger
+
+try:
+    from pypfopt import EfficientFrontier, objective_functions
+except ImportError:
+    EfficientFrontier = None
+
+
+logger = init_logger('sweep')
+
+# (window1, window2, threshold) grid per model; window1 < window2 combinations only
+DEFAULT_GRID = {
+    'B': {
+        'window1': [4, 8, 12, 24, 48, 72, 96, 120, 168],
+        'window2': [24, 48, 72, 96, 124, 168, 192, 240, 336, 504, 720],
+        'threshold': [0.4, 0.6, 0.8, 1.0, 1.2, 1.4, 1.6, 1.8, 2.0, 2.2, 2.4],
+    },
+    'R': {
+        'window1': [4, 8, 12, 24, 48, 72, 96, 120, 168],
+        'window2': [24, 48, 72, 96, 124, 168, 192, 240, 336, 504, 720],
+        'threshold': [0.6, 0.7, 0.8, 0.9, 0.95],
+    },
+}
+
+
+def load_grid(file_path: str | None) -> dict[str, dict]:
+    """Grid per factor prefix from a JSON file: {"default": {"B": {...}, "R": {...}}, "bttp": {...}}."""
+    if file_path is None:
+        return {'default': DEFAULT_GRID}
+    with open(file_path) as f:
+        grid = json.load(f)
+    grid.setdefault('default', DEFAULT_GRID)
+    return grid
+
+
+def grid_params(model_grids: dict[str, dict], cls: type[BaseStrat]) -> list[StratParams]:
+    """Parameter sets of a grid, laid out as cls.pack_params expects them."""
+    params = []
+    for model, grid in model_grids.items():
+        for window1, window2, threshold in itertools.product(grid['window1'], grid['window2'], grid['threshold']):
+            if window1 < window2:
+                param = cls.pack_params(int(window1), int(window2), float(threshold))
+                params.append(StratParams(strategy_id='sweep', model=model, param=param))
+    return params
+
+
+def _sweep_factor(path: str, strat: BaseStrat, offset: int, length: int, fee: float, chunk_size: int) -> tuple[str, pd.DataFrame | None, float, int]:
+    """Worker: backtests the whole grid of one factor on the memory-mapped arrays of the parent."""
+    start = time.perf_counter()
+    buffer = np.memmap(path, dtype=np.float64, mode='r')
+    t = buffer[offset:offset + length].astype(np.int64)
+    values = np.array(buffer[offset + length:offset + 2 * length])
+    close = np.array(buffer[offset + 2 * length:offset + 3 * length])
+    result = backtest_series(strat, t, values, close, balance=1.0, fee=fee, chunk_size=chunk_size)
+    return strat.name, None if result is None else result.params, time.perf_counter() - start, os.getpid()
+
+
+class SweepRunner:
+    """
+    Backtests a parameter grid for every factor on a pool of worker processes.
+
+    The parent loads every factor series and its aligned closes once and
+    copies them into one memory-mapped block (under /dev/shm when available),
+    like ParallelSignalEngine; each task is one factor, so all rolling
+    statistics of a series are computed once, in one worker. Finished
+    factors are checkpointed as CSVs in a folder keyed by the grid, fee and
+    data, and skipped when an interrupted run is started again.
+    """
+
+    def __init__(
+        self,
+        configs: list[StratConfig],
+        grid: dict[str, dict],
+        binance_fetcher: BinanceFetcher,
+        checkpoint_folder: str = 'user_data/sweep',
+        max_workers: int | None = None,
+        fee: float = FEE_RATE,
+        chunk_size: int = CHUNK_SIZE,
+    ) -> None:
+        self.binance_fetcher = binance_fetcher
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.fee = fee
+        self.chunk_size = chunk_size
+
+        registry.load_user_strategies()
+        self.configs = []
+        for config in configs:
+            prefix = config.name.rsplit('_', 1)[0]
+            params = grid_params(grid.get(prefix, grid['default']), registry.get_strategy_class(config.name))
+            self.configs.append(replace(config, params=params, final_weight=1.0))
+        self.strats = registry.build_strategies(self.configs, binance_fetcher, drop_zero_weight=False)
+        self.checkpoint_folder = f'{checkpoint_folder}/run_{self._run_key()}'
+        os.makedirs(self.checkpoint_folder, exist_ok=True)
+
+    def _run_key(self) -> str:
+        keys = [strat.get_factor_key() for strat in self.strats] + [(CLOSE_PREFIX, strat.symbol, strat.timeframe) for strat in self.strats]
+        versions = []
+        for key in keys:
+            try:
+                versions.append((key, self.binance_fetcher.series_versions([key])[key]))
+            except FileNotFoundError:
+                versions.append((key, None))
+        key = {
+            'configs': [(c.name, [(p.model, p.param) for p in c.params]) for c in self.configs],
+            'fee': self.fee,
+            'data': versions,
+        }
+        return hashlib.sha256(json.dumps(key, default=str).encode()).hexdigest()[:16]
+
+    def checkpoint_path(self, factor_id: str) -> str:
+        return f'{self.checkpoint_folder}/{factor_id}.csv'
+
+    def _save_checkpoint(self, factor_id: str, params: pd.DataFrame) -> None:
+        path = self.checkpoint_path(factor_id)
+        params.to_csv(f'{path}.tmp', index=False)
+        os.replace(f'{path}.tmp', path)
+
+    def run(self) -> pd.DataFrame:
+        """Backtests all factors without a checkpoint; returns the per-parameter results of all factors."""
+        start = time.perf_counter()
+        pending = [strat for strat in self.strats if not os.path.exists(self.checkpoint_path(strat.name))]
+        logger.info(f'Sweep {self.checkpoint_folder}: {len(self.strats) - len(pending)} factors checkpointed, {len(pending)} to run on {self.max_workers} workers')
+
+        tasks = []
+        blocks = []
+        offset = 0
+        for strat in pending:
+            try:
+                closes = load_close_prices(self.binance_fetcher, strat.symbol, strat.timeframe)
+            except FileNotFoundError as e:
+                logger.warning(f'{strat.name}: {e}, skipped')
+                continue
+            df = self.binance_fetcher.load_cached_series(*strat.get_factor_key())
+            t = df['t'].to_numpy()
+            blocks.append(np.concatenate([t.astype(np.float64), df['value'].to_numpy(dtype=np.float64), align_closes(t, closes)]))
+            tasks.append((strat, offset, len(t)))
+            offset += 3 * len(t)
+
+        if tasks:
+            fd, path = tempfile.mkstemp(prefix='sweep_', suffix='.f64', dir='/dev/shm' if os.path.isdir('/dev/shm') else None)
+            os.close(fd)
+            try:
+                buffer = np.memmap(path, dtype=np.float64, mode='w+', shape=(offset,))
+                buffer[:] = np.concatenate(blocks)
+                buffer.flush()
+                del buffer, blocks
+                # largest grids first, so the pool does not end on one long task
+                tasks.sort(key=lambda task: task[2] * len(task[0].param_sets), reverse=True)
+                with ProcessPoolExecutor(max_workers=self.max_workers, mp_context=multiprocessing.get_context('fork')) as executor:
+                    futures = [executor.submit(_sweep_factor, path, strat, o, n, self.fee, self.chunk_size) for strat, o, n in tasks]
+                    for future in as_completed(futures):
+                        factor_id, params, elapsed, pid = future.result()
+                        if params is None:
+                            continue
+                        self._save_checkpoint(factor_id, params)
+                        logger.info(f'Worker {pid} swept {factor_id}: {len(params)} parameter sets in {elapsed:.2f}s')
+            finally:
+                os.remove(path)
+
+        results = [pd.read_csv(self.checkpoint_path(s.name)) for s in self.strats if os.path.exists(self.checkpoint_path(s.name))]
+        logger.info(f'Sweep finished in {time.perf_counter() - start:.2f}s, {len(results)} factors')
+        return pd.concat(results, ignore_index=True) if results else pd.DataFrame()
+
+
+def select_params(params: pd.DataFrame, top_k: int = 20, min_trades: int = 10, mdd_limit: float = 0.3) -> pd.DataFrame:
+    """Ensemble per factor: the top_k parameter sets by Sharpe among those that
+    trade, stay within mdd_limit and have a positive Sharpe in both halves."""
+    eligible = params[(params['n_trades'] >= min_trades) & (params['max_drawdown'] <= mdd_limit) & (params['sharpe_min_half'] > 0)]
+    return eligible.sort_values('sharpe', ascending=False).groupby('factor_id', sort=False).head(top_k)
+
+
+def optimize_weights(returns: pd.DataFrame, periods_per_year: float, max_weight: float = 0.1, risk_aversion: float = 1.0, gamma: float = 0.1) -> pd.Series:
+    """Long-only mean-variance weights of the factor ensembles, summing to 1.
+
+    Uses PyPortfolioOpt (max quadratic utility with L2 regularization and a
+    max_weight box) when installed; otherwise mean / variance per factor,
+    ignoring correlations, capped at max_weight.
+    """
+    max_weight = max(max_weight, 1 / len(returns.columns))
+    mu = returns.mean() * periods_per_year
+    if EfficientFrontier is not None:
+        ef = EfficientFrontier(mu, returns.cov() * periods_per_year, weight_bounds=(0, max_weight))
+        ef.add_objective(objective_functions.L2_reg, gamma=gamma)
+        ef.max_quadratic_utility(risk_aversion=risk_aversion)
+        return pd.Series(ef.clean_weights(), dtype=float)
+
+    raw = (mu.clip(lower=0) / (returns.var() * periods_per_year)).fillna(0.0)
+    if raw.sum() == 0:
+        return pd.Series(0.0, index=returns.columns)
+    weights = raw / raw.sum()
+    # water-filling: cap, then hand the excess to the uncapped factors in proportion
+    for _ in range(len(weights)):
+        capped = weights >= max_weight
+        excess = (weights[capped] - max_weight).sum()
+        weights[capped] = max_weight
+        free = ~capped & (weights > 0)
+        if excess <= 1e-12 or not free.any():
+            break
+        weights[free] += excess * weights[free] / weights[free].sum()
+    return weights
+
+
+def ensemble_returns(configs: list[StratConfig], selected: pd.DataFrame, binance_fetcher: BinanceFetcher) -> pd.DataFrame:
+    """Per-bar returns on unit capital of each factor's averaged ensemble signal."""
+    strats = []
+    for config in configs:
+        rows = selected[selected['factor_id'] == config.name]
+        if rows.empty:
+            continue
+        params = [StratParams(strategy_id='sweep', model=m, param=json.loads(p)) for m, p in zip(rows['m'], rows['p'])]
+        strats.append(replace(config, params=params, final_weight=1.0))
+    returns = {}
+    for strat in registry.build_strategies(strats, binance_fetcher, drop_zero_weight=False):
+        result = backtest_strategy(strat, binance_fetcher, load_close_prices(binance_fetcher, strat.symbol, strat.timeframe), balance=1.0)
+        if result is not None:
+            returns[strat.name] = result.pnl
+    return pd.DataFrame(returns).sort_index().fillna(0.0)
+
+
+def to_df_final(configs: list[StratConfig], selected: pd.DataFrame, weights: pd.Series) -> pd.DataFrame:
+    """The selected ensembles in the df_final.csv schema read by config_manager."""
+    rows = []
+    for config in configs:
+        group = selected[selected['factor_id'] == config.name]
+        for k, (m, p) in enumerate(zip(group['m'], group['p']), start=1):
+            rows.append({
+                'strategy': f'{config.name}_{k:03d}',
+                'weight': round(float(weights.get(config.name, 0.0)), 4),
+                'sym': config.symbol,
+                'dir': 'R' if config.type == 'reversal' else 'M',
+                'm': m,
+                'res': config.timeframe,
+                'factor_id': config.name,
+                'p': p,
+            })
+    return pd.DataFrame(rows, columns=['strategy', 'weight', 'sym', 'dir', 'm', 'res', 'factor_id', 'p'])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Sweep a parameter grid per factor and write a new df_final.csv.')
+    parser.add_argument('--config', default='user_data/data/df_final.csv', help='factor universe (factor_id, sym, dir, res) to sweep')
+    parser.add_argument('--grid', default=None, help='JSON grid per factor prefix; DEFAULT_GRID otherwise')
+    parser.add_argument('--factors', nargs='*', default=None, help='only these factor_ids')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+    parser.add_argument('--fee', type=float, default=FEE_RATE)
+    parser.add_argument('--top-k', type=int, default=20)
+    parser.add_argument('--min-trades', type=int, default=10)
+    parser.add_argument('--max-weight', type=float, default=0.1)
+    parser.add_argument('--checkpoint', default='user_data/sweep')
+    parser.add_argument('--out', default='user_data/sweep/df_final.csv')
+    args = parser.parse_args()
+
+    configs = config_manager.create_config_from_df(pd.read_csv(args.config))
+    if args.factors:
+        configs = [c for c in configs if c.name in args.factors]
+    binance_fetcher = BinanceFetcher()
+
+    runner = SweepRunner(configs, load_grid(args.grid), binance_fetcher, args.checkpoint, args.workers, args.fee, args.chunk_size)
+    params = runner.run()
+    if params.empty:
+        logger.error('Nothing was swept: no factor has local close prices')
+        return
+
+    mdd_limit = min(c.mdd_limit for c in configs)
+    selected = select_params(params, args.top_k, args.min_trades, mdd_limit)
+    returns = ensemble_returns(configs, selected, binance_fetcher)
+    if returns.empty:
+        logger.error('No parameter set passed the selection')
+        return
+    periods_per_year = 365 * 86400 / resolution_to_seconds(configs[0].timeframe)
+    weights = optimize_weights(returns, periods_per_year, args.max_weight)
+
+    df_final = to_df_final(configs, selected, weights)
+    os.makedirs(os.path.dirname(args.out) or '.', exist_ok=True)
+    df_final.to_csv(f'{args.out}.tmp', index=False)
+    os.replace(f'{args.out}.tmp', args.out)
+    logger.info(f'Wrote {len(df_final)} parameter sets of {df_final["factor_id"].nunique()} factors ({int((weights > 0).sum())} weighted) to {args.out}')
+
+
+if __name__ == '__main__':
+    main()
@@ -26,13 +26,18 @@ class SymbolInfo:
     anchor_price: float
 
 
-def build_symbols_info(exchange_info: dict, symbol_names: list[str], binance_fetcher: BinanceFetcher) -> dict[str, SymbolInfo]:
+ANCHOR_START = '2025-11-09 00:00:00'
+
+
+def build_symbols_info(exchange_info: dict, symbol_names: list[str], binance_fetcher: BinanceFetcher, anchor_start: str = ANCHOR_START) -> dict[str, SymbolInfo]:
     symbols_info = {}
     
-    for _, symbol_info in exchange_info['TradePairs'].items():
+    trade_pairs = [symbol_info for symbol_info in exchange_info['TradePairs'].values() if symbol_info['Coin'] in symbol_names]
+    pair_names = [symbol_info['Coin'] + '/' + symbol_info['Unit'] for symbol_info in trade_pairs]
+    anchor_prices = binance_fetcher.fetch_anchor_close_prices(pair_names, anchor_start)
+    
+    for symbol_info, pair_name in zip(trade_pairs, pair_names):
         coin = symbol_info['Coin']
-        if coin not in symbol_names:
-            continue
         coin_full_name = symbol_info['CoinFullName']
         unit = symbol_info['Unit']
         unit_full_name = symbol_info['UnitFullName']
@@ -40,8 +45,7 @@ def build_symbols_info(exchange_info: dict, symbol_names: list[str], binance_fet
         price_precision = symbol_info['PricePrecision']
         amount_precision = symbol_info['AmountPrecision']
         mini_order = symbol_info['MiniOrder']
-        start = '2025-11-09 00:00:00'
-        anchor_price = binance_fetcher.fetch_anchor_close_price(coin + '/' + unit, start)
+        anchor_price = anchor_prices[pair_name]
 
         symbols_info[coin] = SymbolInfo(
             coin=coin,
@@ -54,4 +58,4 @@ def build_symbols_info(exchange_info: dict, symbol_names: list[str], binance_fet
             mini_order=mini_order,
             anchor_price=anchor_price
         )
-    return symbols_info
\ No newline at end of file
+    return symbols_info
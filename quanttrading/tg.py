@@ -1,15 +1,215 @@
 import requests
 from dotenv import load_dotenv
 import os
+import atexit
+import queue
+import threading
+import time
+from quanttrading import metrics
+from quanttrading.log import init_logger
 
 
+logger = init_logger('tg')
+
 load_dotenv()
 
 API_KEY = os.getenv("TG_API_KEY")
 CHAT_ID = os.getenv("TG_CHAT_ID")
 
+MAX_MESSAGE_LEN = 4000
+
+
+def split_message(message: str, max_len: int = MAX_MESSAGE_LEN) -> list[str]:
+    """Splits a message into chunks of at most max_len characters, on line breaks where possible."""
+    if len(message) <= max_len:
+        return [message]
+    chunks = []
+    chunk = ''
+    for line in message.split('\n'):
+        # +1 for newline when re-joining
+        to_add = line + '\n'
+        if len(chunk) + len(to_add) > max_len:
+            if chunk:
+                chunks.append(chunk.rstrip('\n'))
+                chunk = ''
+            # If single line itself is longer than max, hard-split
+            if len(to_add) > max_len:
+                for start in range(0, len(to_add), max_len):
+                    chunks.append(to_add[start:start + max_len].rstrip('\n'))
+            else:
+                chunk = to_add
+        else:
+            chunk += to_add
+    if chunk:
+        chunks.append(chunk.rstrip('\n'))
+    return chunks
+
+
+class Notifier:
+    """
+    Background Telegram sender.
+
+    send() only enqueues, so a slow or unreachable Telegram API never blocks
+    the caller. A worker thread coalesces queued messages into batches of at
+    most MAX_MESSAGE_LEN characters, keeps at least min_interval seconds
+    between requests, retries failures with exponential backoff (honouring
+    Telegram's retry_after on 429) and drops the oldest message when the
+    queue is full. A batch that fails with an unexpected error is logged and
+    counted as dropped. Pending messages are flushed at interpreter exit.
+    With enabled=False messages are only counted (replays).
+    """
+
+    def __init__(
+        self,
+        max_queue: int = 1000,
+        min_interval: float = 1.0,
+        max_retries: int = 5,
+        timeout: float = 10.0,
+        enabled: bool = True,
+    ) -> None:
+        self.queue: queue.Queue[str] = queue.Queue(maxsize=max_queue)
+        self.min_interval = min_interval
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.enabled = enabled
+        self.session = requests.Session()
+        metrics.instrument_session(self.session, 'telegram')
+
+        self.sent = 0
+        self.batches = 0
+        self.dropped = 0
+        self.failed = 0
+        self.muted = 0
+
+        self._last_request = 0.0
+        self._carry: str | None = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._worker: threading.Thread | None = None
+
+    @property
+    def queue_depth(self) -> int:
+        return self.queue.qsize()
+
+    def metrics(self) -> dict[str, int]:
+        return {
+            'queue_depth': self.queue_depth,
+            'sent': self.sent,
+            'batches': self.batches,
+            'dropped': self.dropped,
+            'failed': self.failed,
+            'muted': self.muted,
+        }
+
+    def _ensure_worker(self) -> None:
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._stop.clear()
+                self._worker = threading.Thread(target=self._run, name='tg-notifier', daemon=True)
+                self._worker.start()
+
+    def send(self, message: str) -> None:
+        if not self.enabled:
+            self.muted += 1
+            return
+        self._ensure_worker()
+        while True:
+            try:
+                self.queue.put_nowait(str(message))
+                return
+            except queue.Full:
+                try:
+                    self.queue.get_nowait()
+                    self.queue.task_done()
+                    self.dropped += 1
+                except queue.Empty:
+                    pass
+
+    def _next_batch(self, first: str) -> list[str]:
+        """Coalesces queued messages behind `first` into one batch that fits a Telegram message."""
+        messages = [first]
+        size = len(first)
+        while size < MAX_MESSAGE_LEN:
+            try:
+                message = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            if size + len(message) + 2 > MAX_MESSAGE_LEN:
+                # doesn't fit, starts the next batch instead
+                self._carry = message
+                break
+            messages.append(message)
+            size += len(message) + 2
+        return messages
+
+    def _post(self, text: str) -> None:
+        url = f'https://api.telegram.org/bot{API_KEY}/sendMessage'
+        for attempt in range(self.max_retries + 1):
+            wait = self._last_request + self.min_interval - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+            self._last_request = time.monotonic()
+            try:
+                res = self.session.post(url, data={'chat_id': CHAT_ID, 'text': text}, timeout=self.timeout)
+                if res.status_code == 429:
+                    try:
+                        retry_after = float(res.json()['parameters']['retry_after'])
+                    except (ValueError, KeyError, TypeError):
+                        retry_after = 2 ** attempt
+                    time.sleep(retry_after)
+                    continue
+                res.raise_for_status()
+                self.sent += 1
+                return
+            except requests.exceptions.RequestException:
+                if attempt < self.max_retries:
+                    time.sleep(min(2 ** attempt, 30))
+        self.failed += 1
+
+    def _run(self) -> None:
+        while not self._stop.is_set() or self.queue.unfinished_tasks:
+            if self._carry is not None:
+                first, self._carry = self._carry, None
+            else:
+                try:
+                    first = self.queue.get(timeout=0.5)
+                except queue.Empty:
+                    continue
+            messages = self._next_batch(first)
+            try:
+                for chunk in split_message('\n\n'.join(messages)):
+                    self._post(chunk)
+                self.batches += 1
+            except Exception:
+                logger.exception(f'Dropping {len(messages)} Telegram messages')
+                self.dropped += len(messages)
+            finally:
+                for _ in messages:
+                    self.queue.task_done()
+
+    def flush(self, timeout: float | None = 30.0) -> bool:
+        """Waits until every queued message has been handled; returns False on timeout."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.queue.unfinished_tasks:
+            if deadline is not None and time.monotonic() > deadline:
+                return False
+            if self._worker is None or not self._worker.is_alive():
+                return False
+            time.sleep(0.05)
+        return True
+
+    def close(self, timeout: float | None = 30.0) -> None:
+        self.flush(timeout)
+        self._stop.set()
+
+
+notifier = Notifier()
+atexit.register(notifier.close)
+metrics.gauge('qt_telegram_queue_depth', lambda: notifier.queue_depth)
+metrics.gauge('qt_telegram_dropped', lambda: notifier.dropped)
+metrics.gauge('qt_telegram_failed', lambda: notifier.failed)
+
+
 def send_message(message: str):
-    base_url = 'https://api.telegram.org/bot'
-    
-    url = f'{base_url}{API_KEY}/sendMessage?chat_id={CHAT_ID}&text={message}'
-    requests.get(url)
+    notifier.send(message)
+
@@ -0,0 +1,236 @@
+"""
+The trading cycle of trade.py, independent of where prices, bars and fills come from.
+
+TradingLoop wires the strategies, the position engine, the monitor and an
+exchange into the dirty-tracking pipeline and paces it with a
+BarCloseScheduler. trade.py runs it live against the Roostoo client and the
+remote fetcher; quanttrading/replay.py runs the same loop on a virtual
+clock over historical bars with a simulated exchange.
+
+`exchange` is anything with the roostoo module's trade(),
+get_current_postions(), get_last_prices() and get_exchange_info_cached().
+"""
+
+import time
+from typing import Callable
+
+import pandas as pd
+from rich import print
+
+from quanttrading import config_manager
+from quanttrading import metrics
+from quanttrading import position_engine
+from quanttrading import registry
+from quanttrading import roostoo
+from quanttrading import symbol_manager
+from quanttrading import tg
+from quanttrading.binance_fetcher import BinanceFetcher
+from quanttrading.monitor import Monitor
+from quanttrading.parallel_signals import ParallelSignalEngine
+from quanttrading.pipeline import Pipeline
+from quanttrading.scheduler import BarCloseScheduler
+
+
+class TradingLoop:
+    def __init__(
+        self,
+        file_name: str,
+        binance_fetcher: BinanceFetcher,
+        monitor: Monitor,
+        exchange=roostoo,
+        balance: float = 100000,
+        max_leverage: float = 0.99,
+        incremental: bool = True,
+        verify_incremental: bool = False,
+        signal_engine: ParallelSignalEngine | None = None,
+        config_reload: bool = True,
+        bar_close_delay: float = 2.0,
+        light_interval: float = 300.0,
+        clock: Callable[[], float] = time.time,
+        sleep: Callable[[float], None] = time.sleep,
+        echo: Callable[..., None] = print,
+    ) -> None:
+        self.file_name = file_name
+        self.binance_fetcher = binance_fetcher
+        self.monitor = monitor
+        self.exchange = exchange
+        self.balance = balance
+        self.max_leverage = max_leverage
+        self.signal_engine = signal_engine
+        self.config_reload = config_reload
+        self.echo = echo
+
+        df = pd.read_csv(file_name)
+        self.echo(config_manager.get_weights(df))
+
+        self.exchange_info = exchange.get_exchange_info_cached()
+        symbol_names = df['sym'].unique().tolist()
+        self.symbols_info = symbol_manager.build_symbols_info(self.exchange_info, symbol_names, binance_fetcher)
+        self.echo(self.symbols_info)
+
+        self.configs, compile_report = config_manager.load_compiled_configs(file_name)
+        self.echo(f'Config: {compile_report}')
+        registry.load_user_strategies()
+        self.strats = registry.build_strategies(self.configs, binance_fetcher)
+        if incremental:
+            for strat in self.strats:
+                strat.enable_incremental(verify=verify_incremental)
+
+        self.config_watcher = config_manager.ConfigWatcher(file_name)
+        self.scheduler = BarCloseScheduler(
+            resolutions=[strat.timeframe for strat in self.strats],
+            delay=bar_close_delay,
+            light_interval=light_interval,
+            clock=clock,
+            sleep=sleep,
+        )
+
+        self.pipeline = Pipeline()
+        self.pipeline.set_input('factors', position_engine.factor_versions(self.strats, binance_fetcher))
+        self.pipeline.set_input('last_prices', {})
+        self.pipeline.set_input('positions', {})
+        self.pipeline.add_stage('signals', self.signals_stage, inputs=['factors'])
+        self.pipeline.add_stage('targets', self.targets_stage, inputs=['signals'])
+        self.pipeline.add_stage('leverage', self.leverage_stage, inputs=['targets', 'last_prices'])
+        self.pipeline.add_stage('deltas', self.deltas_stage, inputs=['targets', 'positions'])
+        # prices are passed but not an input: a price move alone must not re-send orders
+        self.pipeline.add_stage('trades', self.trades_stage, inputs=['deltas'], reads=['last_prices'])
+        self.pipeline.add_stage('balance', self.balance_stage, inputs=['positions', 'last_prices'])
+
+    def signals_stage(self, factors: dict, now: int) -> dict[tuple, float]:
+        signals = position_engine.calculate_signals(self.strats, self.signal_engine)
+        self.monitor.log_signals(signals, now=now)
+        self.monitor.send_weighted_by_strategy(signals, self.strats)
+        self.monitor.send_weighted_by_symbol(signals, self.strats)
+        self.echo(f'Signals: {signals}')
+        return signals
+
+    def targets_stage(self, signals: dict[tuple, float], now: int) -> dict[str, float]:
+        target_amount_by_strat = position_engine.calculate_target_amount_by_strat(self.strats, signals, self.balance, self.symbols_info)
+        self.monitor.log_target_amount_by_strat(target_amount_by_strat, now=now)
+        self.echo(f'Target amount by strat: {target_amount_by_strat}')
+
+        target_amount_by_symbol = position_engine.aggregate_target_amount_by_symbol(target_amount_by_strat)
+        self.monitor.log_target_amount_by_symbol(target_amount_by_symbol, now=now)
+        self.echo(f'Target amount by symbol: {target_amount_by_symbol}')
+        return target_amount_by_symbol
+
+    def leverage_stage(self, targets: dict[str, float], last_prices: dict[str, float], now: int) -> tuple:
+        leverage_real = position_engine.calculate_leverage_real(targets, self.binance_fetcher, self.balance, last_prices)
+        self.echo(f'Leverage real: {leverage_real}')
+
+        leverage_ref = position_engine.calculate_leverage_ref(targets, self.symbols_info, self.balance)
+        self.echo(f'Leverage ref: {leverage_ref}')
+
+        if leverage_ref > self.max_leverage:
+            deleveraged = position_engine.deleverage(targets, leverage_ref, self.max_leverage, self.symbols_info)
+            self.echo(f'Deleveraged: {deleveraged}')
+        else:
+            deleveraged = leverage_ref
+
+        self.monitor.log_leverage(leverage_real, leverage_ref, deleveraged, now=now)
+        self.echo(f'Leverage: {leverage_real}, {leverage_ref}, {deleveraged}')
+        return leverage_real, leverage_ref, deleveraged
+
+    def deltas_stage(self, targets: dict[str, float], positions: dict[str, float], now: int) -> dict[str, float]:
+        self.echo(f'Current positions: {positions}')
+        delta_amounts = position_engine.calculate_delta_amount(targets, positions)
+        self.monitor.log_delta_amounts(delta_amounts, now=now)
+        self.echo(f'Delta amounts: {delta_amounts}')
+        return delta_amounts
+
+    def trades_stage(self, deltas: dict[str, float], last_prices: dict[str, float], now: int) -> tuple[list[dict], list[dict]]:
+        success_trades, error_trades = self.exchange.trade(deltas, self.binance_fetcher, last_prices)
+        self.monitor.log_success_trades(success_trades, now=now)
+        self.monitor.log_error_trades(error_trades, now=now)
+        if success_trades or error_trades:
+            self.pipeline.set_input('positions', self.exchange.get_current_postions())
+        if error_trades:
+            # retry the remaining deltas next cycle even if nothing else changed
+            self.pipeline.invalidate('trades')
+        return success_trades, error_trades
+
+    def balance_stage(self, positions: dict[str, float], last_prices: dict[str, float], now: int) -> None:
+        self.monitor.log_current_positions(positions, now=now)
+        self.monitor.log_current_balance(positions, self.binance_fetcher, now=now, last_prices=last_prices)
+
+    def run_cycle(self, now: int) -> dict:
+        """Runs every stage whose inputs changed since the previous cycle; returns the cycle's metrics record."""
+        self.pipeline.set_input('factors', position_engine.factor_versions(self.strats, self.binance_fetcher))
+        # fills, partial fills and manual trades on the exchange show up here; unchanged holdings keep the cache
+        self.pipeline.set_input('positions', self.exchange.get_current_postions())
+        last_prices = self.binance_fetcher.fetch_all_last_prices(self.symbols_info, ticker_fn=self.exchange.get_last_prices)
+        self.echo(f'Last prices fetched: {len(last_prices)} symbols')
+        self.pipeline.set_input('last_prices', last_prices)
+
+        self.pipeline.run('leverage', 'trades', 'balance', now=now)
+        self.echo(f'Pipeline: {self.pipeline.metrics()}')
+        self.echo(f'Telegram notifier: {tg.notifier.metrics()}')
+        cycle_metrics = metrics.end_cycle(now)
+        self.echo(f"Cycle took {cycle_metrics['elapsed_ms']:.0f} ms")
+        return cycle_metrics
+
+    def reload_config(self) -> None:
+        """Swaps in the strategies of a changed file_name; called between cycles only."""
+        if not self.config_watcher.changed():
+            return
+        try:
+            new_configs, report = config_manager.load_compiled_configs(self.file_name)
+            new_configs = registry.align_ids(new_configs, self.configs)
+            new_symbols = sorted({c.symbol.split('/')[0] for c in new_configs} - self.symbols_info.keys())
+            if new_symbols:
+                new_symbols_info = symbol_manager.build_symbols_info(self.exchange_info, new_symbols, self.binance_fetcher)
+                missing = sorted(set(new_symbols) - new_symbols_info.keys())
+                if missing:
+                    raise ValueError(f'Symbols not tradable on the exchange: {missing}')
+                self.symbols_info.update(new_symbols_info)
+            new_strats, reload_report = registry.reload_strategies(self.strats, new_configs, self.binance_fetcher)
+        except Exception as e:
+            msg = f'Config reload failed, keeping the current strategies: {e}'
+            self.echo(msg)
+            tg.send_message(msg)
+            return
+
+        self.strats, self.configs = new_strats, new_configs
+        self.scheduler.set_resolutions([strat.timeframe for strat in self.strats])
+        if reload_report.strategies_changed:
+            self.pipeline.invalidate('signals')
+        # weights only enter the targets
+        self.pipeline.invalidate('targets')
+        msg = f'Config reloaded ({report}): {reload_report}'
+        self.echo(msg)
+        tg.send_message(msg)
+
+    def first_cycle(self) -> dict:
+        """Refreshes every factor series and runs the startup cycle."""
+        metrics.start_cycle()
+        with metrics.span('refresh_factors'):
+            position_engine.refresh_factors(self.strats, self.binance_fetcher)
+        return self.run_cycle(int(self.scheduler.clock()))
+
+    def next_cycle(self) -> tuple[bool, dict]:
+        """Waits for the next bar close or light cycle and runs it; returns whether it was a bar close and its metrics."""
+        at_bar_close = self.scheduler.wait()
+        metrics.start_cycle()
+        now = int(self.scheduler.clock())
+
+        if self.config_reload:
+            self.reload_config()
+
+        with metrics.span('refresh_factors'):
+            if at_bar_close:
+                self.scheduler.poll(
+                    lambda: position_engine.refresh_factors(self.strats, self.binance_fetcher),
+                    lambda: position_engine.stale_factors(self.strats, self.binance_fetcher),
+                )
+            else:
+                # picks up bars that arrived after the last poll gave up; no requests when all series are latest
+                position_engine.refresh_factors(self.strats, self.binance_fetcher)
+
+        # stages whose inputs did not change return their cached results
+        return at_bar_close, self.run_cycle(now)
+
+    def run_forever(self) -> None:
+        self.first_cycle()
+        while True:
+            self.next_cycle()
@@ -0,0 +1,44 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from quanttrading import tg
+from quanttrading.config_manager import StratConfig, StratParams, compile_configs
+from quanttrading.strategies import BaseStrat
+
+
+class FrameStrat(BaseStrat):
+    def fetch_alpha(self) -> pd.DataFrame:
+        raise NotImplementedError
+
+
+def make_bars(n: int, seed: int = 1) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    t = 1_700_000_000 + 3600 * np.arange(n, dtype=np.int64)
+    value = np.round(np.cumsum(rng.normal(size=n)) * 1e3, 2)
+    return pd.DataFrame({'t': t, 'value': value}, index=pd.to_datetime(t, unit='s').rename('ts'))
+
+
+@pytest.fixture(autouse=True)
+def quiet_tg(monkeypatch):
+    monkeypatch.setattr(tg.notifier, 'enabled', False)
+
+
+def test_folding_keeps_the_aggregated_signal():
+    params = [
+        StratParams('t', 'B', [6, 20, 0.8]),
+        StratParams('t', 'B', [6.0, 20, 0.8]),
+        StratParams('t', 'B', [6, 20, 0.8]),
+        StratParams('t', 'R', [4, 12, 0.7]),
+    ]
+    config = StratConfig(id=1, name='test', type='t', symbol='BTC/USD', timeframe='1h', side='long',
+                         final_weight=1.0, params=params, order_type='MARKET', mdd_limit=1.0)
+    (compiled,), report = compile_configs([config])
+    assert report.duplicates_removed == 1
+    assert [p.param for p in compiled.params] == [[6, 20, 0.8], [6.0, 20, 0.8], [4, 12, 0.7]]
+
+    df = make_bars(200)
+    unfolded, folded = FrameStrat(config), FrameStrat(compiled)
+    expected = unfolded._build_signals_df(unfolded.calculate_signal_matrix(df), df.index)
+    actual = folded._build_signals_df(folded.calculate_signal_matrix(df), df.index)
+    pd.testing.assert_frame_equal(actual, expected)
@@ -0,0 +1,36 @@
+import pandas as pd
+import pytest
+
+from quanttrading.config_manager import _parse_params, parse_param_column
+
+
+CELLS = [
+    '[96, 124, 0.6]',
+    '[8, 192, 2.0]',
+    '[007, 1, 2]',
+    '[00, 1, 2]',
+    '[0, -3, +4]',
+    '[007.5, 1e3, 2E-2, .5, 5.]',
+    '[07e2, 1]',
+    '[1, 2,]',
+    '[ ]',
+    '[]',
+    '[9007199254740993, 1]',
+    "['1', 2]",
+    '[[1, 2], 3]',
+    '[True, 1]',
+    '[1_000, 2]',
+    '1, 2',
+    '',
+    None,
+    3.5,
+]
+
+
+@pytest.mark.parametrize('cell', CELLS)
+def test_vectorized_parse_matches_per_row(cell):
+    parsed = parse_param_column(pd.Series([cell, '[1, 2, 3]'], dtype=object))
+    expected = _parse_params(cell)
+    assert parsed[0] == expected
+    assert [type(v) for v in parsed[0]] == [type(v) for v in expected]
+    assert parsed[1] == [1, 2, 3]
@@ -0,0 +1,27 @@
+import numpy as np
+import pandas as pd
+
+from quanttrading.csv_log import CsvLogFile
+
+
+def frame(index: str, **values) -> pd.DataFrame:
+    return pd.DataFrame([values], index=[index])
+
+
+def test_new_columns_widen_the_header(tmp_path):
+    path = str(tmp_path / 'signals.csv')
+    log = CsvLogFile(path)
+    log.append(frame('t0', a=1.0, b=2.0))
+    log.append(frame('t1', b=3.0, c=4.0))
+    log.append(frame('t2', a=5.0, b=6.0, c=7.0))
+
+    df = pd.read_csv(path, index_col=0)
+    assert list(df.columns) == ['a', 'b', 'c']
+    np.testing.assert_array_equal(df.to_numpy(), [[1.0, 2.0, np.nan], [np.nan, 3.0, 4.0], [5.0, 6.0, 7.0]])
+
+    reopened = CsvLogFile(path)
+    assert reopened.columns == ['a', 'b', 'c']
+    assert reopened.is_duplicate(frame('t3', a=5.0, b=6.0, c=7.0))
+    reopened.append(frame('t3', d=8.0))
+    assert list(pd.read_csv(path, index_col=0).columns) == ['a', 'b', 'c', 'd']
+    assert not (tmp_path / 'signals.csv.tmp').exists()
@@ -0,0 +1,109 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from quanttrading import tg
+from quanttrading.config_manager import StratConfig, StratParams
+from quanttrading.rolling_state import IncrementalSignalState, full_signal_values
+from quanttrading.signal_engine import RollingStats, SignalSpec
+from quanttrading.strategies import BaseStrat
+
+
+SPECS = [
+    SignalSpec(model='B', window1=5, window2=10, threshold=1.0),
+    SignalSpec(model='B', window1=12, window2=12, threshold=0.5),
+    SignalSpec(model='R', window1=3, window2=8, threshold=0.7),
+    SignalSpec(model='R', window1=5, window2=24, threshold=0.9),
+]
+
+
+def make_bars(n: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    value = np.cumsum(rng.normal(size=n)) * 1e3
+    # repeated values exercise the rank ties and the constant-window branches
+    value[40:46] = value[40]
+    value = np.round(value, 2)
+    t = 1_700_000_000 + 3600 * np.arange(n, dtype=np.int64)
+    return pd.DataFrame({'t': t, 'value': value}, index=pd.to_datetime(t, unit='s').rename('ts'))
+
+
+class FrameStrat(BaseStrat):
+    def __init__(self, config: StratConfig) -> None:
+        super().__init__(config)
+        self.df: pd.DataFrame | None = None
+
+    def fetch_alpha(self) -> pd.DataFrame:
+        return self.df
+
+
+@pytest.fixture
+def strat_factory(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(tg.notifier, 'enabled', False)
+    (tmp_path / 'user_data' / 'data').mkdir(parents=True)
+    params = [StratParams('t', s.model, [s.window1, s.window2, s.threshold]) for s in SPECS]
+    config = StratConfig(id=1, name='test', type='t', symbol='BTC/USD', timeframe='1h', side='long',
+                         final_weight=1.0, params=params, order_type='MARKET', mdd_limit=1.0)
+
+    def factory() -> FrameStrat:
+        strat = FrameStrat(config)
+        strat.enable_incremental(state_folder=str(tmp_path / 'state'))
+        return strat
+    return factory
+
+
+def test_state_updates_match_full_recompute_across_save_and_load(tmp_path):
+    df = make_bars(300)
+    x = df['value'].to_numpy()
+    expected = full_signal_values(RollingStats(x), SPECS)
+
+    state = IncrementalSignalState(SPECS)
+    rows = []
+    for i, (t, v) in enumerate(zip(df['t'].to_numpy(), x)):
+        rows.append(state.update(t, v))
+        if i % 37 == 0:
+            state.save(str(tmp_path / 'state.json'))
+            state = IncrementalSignalState.load(str(tmp_path / 'state.json'))
+
+    assert np.array_equal(np.array(rows), expected, equal_nan=True)
+
+
+def test_incremental_signals_match_full_recompute(strat_factory):
+    df = make_bars(200)
+    strat = strat_factory()
+    strat.df = df.iloc[:150]
+    strat.generate_signal()
+
+    for end in range(151, 201):
+        # a fresh instance per bar reloads the JSON state, like a restart
+        strat = strat_factory()
+        strat.df = df.iloc[:end]
+        incremental = strat.calculate_agg_signal_df_incremental(strat.df)
+        full = strat._build_signals_df(strat.calculate_signal_matrix(strat.df), strat.df.index)
+        assert len(incremental) == 1
+        pd.testing.assert_frame_equal(incremental, full.iloc[-1:], check_exact=True)
+
+
+def test_revised_bar_reseeds_state(strat_factory):
+    df = make_bars(120)
+    strat = strat_factory()
+    strat.df = df.iloc[:100]
+    strat.generate_signal()
+
+    revised = df.copy()
+    revised.iloc[95, revised.columns.get_loc('value')] += 5e4
+    strat.df = revised
+    result = strat.calculate_agg_signal_df_incremental(revised)
+
+    full = strat._build_signals_df(strat.calculate_signal_matrix(revised), revised.index)
+    pd.testing.assert_frame_equal(result, full, check_exact=True)
+    assert strat._state.n_bars == len(revised)
+
+    # the reseeded state carries on incrementally
+    more = make_bars(121).iloc[120:].copy()
+    more.iloc[0, more.columns.get_loc('value')] = 1.0
+    extended = pd.concat([revised, more])
+    result = strat.calculate_agg_signal_df_incremental(extended)
+    full = strat._build_signals_df(strat.calculate_signal_matrix(extended), extended.index)
+    assert len(result) == 1
+    pd.testing.assert_frame_equal(result, full.iloc[-1:], check_exact=True)
@@ -0,0 +1,32 @@
+from quanttrading import metrics, tg
+
+
+class FlakySession:
+    def __init__(self) -> None:
+        self.texts: list[str] = []
+
+    def post(self, url, data, timeout):
+        if data['text'] == 'boom':
+            raise ValueError('not JSON')
+        self.texts.append(data['text'])
+        return type('Response', (), {'status_code': 200, 'raise_for_status': lambda self: None})()
+
+
+def test_worker_survives_unexpected_errors():
+    notifier = tg.Notifier(min_interval=0.0)
+    notifier.session = FlakySession()
+    notifier.send('boom')
+    assert notifier.flush(5.0)
+    notifier.send('hello')
+    assert notifier.flush(5.0)
+    notifier.close()
+    assert notifier.session.texts == ['hello']
+    assert (notifier.dropped, notifier.sent) == (1, 1)
+
+
+def test_gauges_are_exported():
+    collector = metrics.Metrics()
+    depth = [3]
+    collector.gauge('qt_test_depth', lambda: depth[0], queue='tg')
+    depth[0] = 5
+    assert '# TYPE qt_test_depth gauge\nqt_test_depth{queue="tg"} 5\n' in collector.prometheus_text()
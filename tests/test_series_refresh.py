@@ -0,0 +1,47 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from quanttrading import tg
+from quanttrading.binance_fetcher import BinanceFetcher
+from quanttrading.factor_store import FactorStore
+from quanttrading.helper import current_time
+from quanttrading.series_storage import RecordFile, binary_path, to_records
+
+
+def closed_bars(n: int) -> pd.DataFrame:
+    last_open = int(current_time()) // 3600 * 3600 - 3600
+    t = last_open - 3600 * np.arange(n - 1, -1, -1, dtype=np.int64)
+    df = pd.DataFrame({'t': t, 'value': np.arange(n, dtype=float)})
+    df['ts'] = pd.to_datetime(df['t'], unit='s')
+    return df.set_index('ts')
+
+
+@pytest.fixture
+def fetcher(tmp_path, monkeypatch):
+    monkeypatch.setattr(tg.notifier, 'enabled', False)
+    fetcher = BinanceFetcher(folder=str(tmp_path), store=FactorStore())
+    fetcher.calls = []
+
+    def fetch(symbol, timeframe, since=None):
+        fetcher.calls.append(since)
+        return closed_bars(48)
+
+    fetcher.series_fetchers['oi'] = fetch
+    path = binary_path(fetcher._get_series_path('oi', 'BTC', '1h'))
+    RecordFile(path).write(to_records(np.empty(0, dtype=np.int64), np.empty(0)))
+    return fetcher
+
+
+def test_empty_series_is_stale_and_fully_fetched(fetcher):
+    key = ('oi', 'BTC', '1h')
+    assert fetcher.stale_series([key]) == [key]
+    assert fetcher.refresh_series([key]) == {key: 48}
+    assert fetcher.calls == [None]
+    assert fetcher.stale_series([key]) == []
+
+
+def test_loading_an_empty_series_fetches_it(fetcher):
+    df = fetcher._load_series('BTC/USD', '1h', 'oi', fetcher.series_fetchers['oi'], update_msg_title=None)
+    assert len(df) == 48
+    assert fetcher.calls == [None]